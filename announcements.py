@@ -0,0 +1,158 @@
+"""NSE announcement fields, identity and timestamps.
+
+Shared by the scraper, the alert pipeline and the archive: NSE's
+announcement JSON is mapped to the scraper's column names, timestamps are
+parsed from (and rendered back to) NSE's `an_dt` format, and
+`announcement_id` fingerprints a filing so the same one is recognised
+wherever it was read from.
+"""
+
+import hashlib
+import re
+from datetime import datetime
+
+import pandas as pd
+
+
+# Format of NSE's `an_dt` field, e.g. 07-Nov-2025 23:43:18
+NSE_TIME_FORMAT = '%d-%b-%Y %H:%M:%S'
+
+
+def parse_announcement_time(value):
+    """Parse an NSE announcement timestamp; returns None if it can't be parsed."""
+    if isinstance(value, datetime):
+        # pandas NaT is a datetime too; Timestamps become plain datetimes
+        if pd.isna(value):
+            return None
+        return value.to_pydatetime() if isinstance(value, pd.Timestamp) else value
+    if not isinstance(value, str) or not value:
+        return None
+    try:
+        return datetime.strptime(str(value).strip(), NSE_TIME_FORMAT)
+    except ValueError:
+        return None
+
+
+def format_announcement_time(value):
+    """Render a parsed Timestamp back in NSE's format ('' for missing values)."""
+    if isinstance(value, datetime):
+        return '' if pd.isna(value) else value.strftime(NSE_TIME_FORMAT)
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return ''
+    return value
+
+
+def parse_file_size(value):
+    """Parse NSE attachment sizes ('245 KB', '1.2 MB', 1024) into bytes; NaN if unknown."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _FILE_SIZE_RE.match(str(value or ''))
+    if not match:
+        return float('nan')
+    return float(match.group(1)) * _FILE_SIZE_UNITS.get((match.group(2) or 'B').upper(), 1)
+
+
+_FILE_SIZE_RE = re.compile(r'^\s*([0-9]+(?:\.[0-9]+)?)\s*([KMG]?B)?\s*$', re.IGNORECASE)
+_FILE_SIZE_UNITS = {'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+
+
+def announcement_id(record):
+    """Stable fingerprint for an announcement (symbol, time, subject, attachment)."""
+    timestamp = format_announcement_time(record.get('Timestamp') or record.get('an_dt') or '')
+    parts = [
+        record.get('Symbol') or record.get('symbol') or '',
+        timestamp,
+        record.get('Subject') or record.get('desc') or '',
+        record.get('Attachment_URL') or record.get('attchmntFile') or '',
+    ]
+    return hashlib.sha1('|'.join(str(p) for p in parts).encode('utf-8')).hexdigest()
+
+
+def build_announcement(record, scraped_at=None):
+    """Build the announcement sub-document stored in company-map / last_hour.
+
+    Timestamp and File_Size are stored as NSE sent them, taken from the raw
+    `an_dt` / `sm_size` values that DataFrame rows carry next to the typed
+    columns. `announced_at` holds the time as a BSON date (None if it can't
+    be parsed) for sorting and range queries.
+    """
+    file_size = record.get('sm_size')
+    if file_size is None:
+        file_size = record.get('File_Size')
+        if isinstance(file_size, float) and pd.isna(file_size):
+            file_size = ''
+    timestamp = record.get('an_dt')
+    if timestamp is None:
+        timestamp = format_announcement_time(record.get('Timestamp'))
+    return {
+        'Symbol': record.get('Symbol') or record.get('symbol', ''),
+        'Subject': record.get('Subject') or record.get('desc', ''),
+        'Description': record.get('Description') or record.get('attchmntText', ''),
+        'Attachment_URL': record.get('Attachment_URL') or record.get('attchmntFile', ''),
+        'File_Size': file_size if file_size is not None else '',
+        'Timestamp': timestamp if timestamp is not None else '',
+        'announced_at': parse_announcement_time(record.get('Timestamp')) or parse_announcement_time(record.get('an_dt')),
+        'XBRL_Link': record.get('XBRL_Link') or record.get('xbrl', ''),
+        'scraped_at': scraped_at or datetime.now()
+    }
+
+
+# Scraper column -> field in NSE's announcement JSON
+ANNOUNCEMENT_FIELDS = {
+    'Symbol': 'symbol',
+    'Company': 'sm_name',
+    'Subject': 'desc',
+    'Description': 'attchmntText',
+    'Attachment_URL': 'attchmntFile',
+    'File_Size': 'sm_size',
+    'Timestamp': 'an_dt',
+    'XBRL_Link': 'xbrl',
+}
+# Columns produced by parse_to_dataframe / normalize_announcement
+ANNOUNCEMENT_COLUMNS = list(ANNOUNCEMENT_FIELDS)
+CATEGORY_COLUMNS = ['Symbol', 'Company', 'Subject']
+# Typed column -> column keeping NSE's original string (what gets persisted)
+RAW_COLUMNS = {'Timestamp': 'an_dt', 'File_Size': 'sm_size'}
+# Columns that identify an announcement (see announcement_id)
+ANNOUNCEMENT_KEY_COLUMNS = ['Symbol', 'Timestamp', 'Subject', 'Attachment_URL']
+
+
+def normalize_announcement(item):
+    """Map a raw NSE announcement to the scraper's column names."""
+    return {col: item.get(field, '') for col, field in ANNOUNCEMENT_FIELDS.items()}
+
+
+def announcements_frame(columns):
+    """Build a typed DataFrame from {column: list of raw values}.
+
+    Symbol/Company/Subject become categoricals, Timestamp datetime64 (NaT
+    when unparseable) and File_Size float bytes. The original Timestamp and
+    File_Size strings are kept in the `an_dt` / `sm_size` columns (see
+    RAW_COLUMNS), so stored documents don't change.
+    """
+    typed = {}
+    for col in ANNOUNCEMENT_COLUMNS:
+        values = columns.get(col, [])
+        if col == 'Timestamp':
+            typed[col] = pd.to_datetime(pd.Series(values, dtype=object), format=NSE_TIME_FORMAT, errors='coerce')
+        elif col == 'File_Size':
+            typed[col] = pd.Series([parse_file_size(v) for v in values], dtype='float64')
+        elif col in CATEGORY_COLUMNS:
+            typed[col] = pd.Series(values, dtype=object).fillna('').astype('category')
+        else:
+            typed[col] = pd.Series(values, dtype=object).fillna('')
+    for col, raw_col in RAW_COLUMNS.items():
+        typed[raw_col] = pd.Series(columns.get(col, []), dtype=object).fillna('')
+    return pd.DataFrame(typed)
+
+
+def records_to_frame(records):
+    """Typed DataFrame from normalized records (e.g. from iter_corporate_filings).
+
+    Records are consumed one at a time straight into the column lists.
+    """
+    columns = {col: [] for col in ANNOUNCEMENT_COLUMNS}
+    for record in records:
+        for col, values in columns.items():
+            values.append(record.get(col, ''))
+    return announcements_frame(columns)
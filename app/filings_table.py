@@ -0,0 +1,134 @@
+"""Extraction of the NSE corporate filings table from a scraped page.
+
+The table is recognised by its header signature (SYMBOL, COMPANY NAME,
+SUBJECT) and each data row with at least 7 cells becomes a filing dict.
+
+Backends (FILINGS_TABLE_PARSER, default `lxml` when installed):
+
+- `lxml`: a single streaming pass with `lxml.etree.iterparse`. Rows are
+  handled as they close and then cleared, only the header rows of other
+  tables are inspected, and filings are yielded lazily.
+- `html.parser`: BeautifulSoup with the standard library parser.
+"""
+
+import io
+import os
+import re
+
+from bs4 import BeautifulSoup
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+
+SIGNATURE = ('SYMBOL', 'COMPANY NAME', 'SUBJECT')
+MIN_CELLS = 7
+_SIZE_RE = re.compile(r'\((.+?)\)')
+
+
+def _filing(symbol, company_name, subject, details, attachment_link, attachment_text, broadcast_date):
+    attachment_size = None
+    if attachment_link:
+        size_match = _SIZE_RE.search(attachment_text)
+        if size_match:
+            attachment_size = size_match.group(1)
+    return {
+        'symbol': symbol,
+        'company_name': company_name,
+        'subject': subject,
+        'details': details,
+        'attachment_link': attachment_link,
+        'attachment_size': attachment_size,
+        'broadcast_date': broadcast_date,
+    }
+
+
+def _is_target(header_texts):
+    return all(h in header_texts for h in SIGNATURE)
+
+
+def _iter_soup(html_content):
+    soup = BeautifulSoup(html_content, 'html.parser')
+    for table in soup.find_all('table'):
+        header_texts = [h.get_text(strip=True) for h in table.find_all('th')]
+        if not _is_target(header_texts):
+            continue
+        # Skip header row
+        for row in table.find_all('tr')[1:]:
+            cells = row.find_all('td')
+            if len(cells) < MIN_CELLS:
+                continue
+            symbol_link = cells[0].find('a')
+            attachment_tag = cells[4].find('a')
+            attachment_link = attachment_tag['href'] if attachment_tag and attachment_tag.has_attr('href') else None
+            yield _filing(
+                (symbol_link or cells[0]).get_text(strip=True),
+                cells[1].get_text(strip=True),
+                cells[2].get_text(strip=True),
+                cells[3].get_text(strip=True),
+                attachment_link,
+                cells[4].get_text(strip=True),
+                cells[6].get_text(strip=True),
+            )
+
+
+def _text(element):
+    # Same as BeautifulSoup's get_text(strip=True)
+    return ''.join(t.strip() for t in element.itertext())
+
+
+def _iter_lxml(html_content):
+    if isinstance(html_content, str):
+        html_content = html_content.encode('utf-8')
+    target = None  # the filings <table> element, once its header row is seen
+    for _, row in etree.iterparse(io.BytesIO(html_content), events=('end',), tag='tr',
+                                  html=True, recover=True, encoding='utf-8'):
+        table = next(row.iterancestors('table'), None)
+        if table is None:
+            continue
+        if target is None or table is not target:
+            headers = [_text(th) for th in row.iter('th')]
+            if headers and _is_target(headers):
+                target = table
+            row.clear()
+            continue
+        cells = row.findall('td')
+        if len(cells) >= MIN_CELLS:
+            symbol_link = cells[0].find('.//a')
+            attachment_tag = cells[4].find('.//a')
+            yield _filing(
+                _text(symbol_link if symbol_link is not None else cells[0]),
+                _text(cells[1]),
+                _text(cells[2]),
+                _text(cells[3]),
+                attachment_tag.get('href') if attachment_tag is not None else None,
+                _text(cells[4]),
+                _text(cells[6]),
+            )
+        row.clear()
+
+
+BACKENDS = {'html.parser': _iter_soup}
+if etree is not None:
+    BACKENDS['lxml'] = _iter_lxml
+
+
+def default_backend():
+    name = os.environ.get('FILINGS_TABLE_PARSER')
+    if name in BACKENDS:
+        return name
+    return 'lxml' if 'lxml' in BACKENDS else 'html.parser'
+
+
+def iter_filings_table(html_content, backend=None):
+    """Yield filing dicts from the corporate filings table, row by row."""
+    if not html_content:
+        return iter(())
+    return BACKENDS[backend or default_backend()](html_content)
+
+
+def parse_filings_table(html_content, backend=None):
+    """Extract only the corporate filings table data from the HTML content."""
+    return list(iter_filings_table(html_content, backend))
@@ -0,0 +1,113 @@
+"""In-process TTL cache for the /stock Firecrawl proxy.
+
+Entries are keyed by target URL and hold the parsed /stock response body.
+A fresh entry (younger than `ttl`) is served as is. A stale one (up to
+`ttl + stale` old) is still served, while a single background request
+refreshes it. Concurrent misses for one URL share one upstream call
+(single flight) instead of each POSTing to Firecrawl.
+
+Failed upstream calls are not cached; when a background refresh fails
+the stale entry keeps being served until it expires.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from metrics import Counter, stage
+
+
+CACHE_REQUESTS = Counter('stock_cache_requests_total', '/stock cache lookups by result.', ['result'])
+
+
+class StockCache:
+    """TTL cache with stale-while-revalidate and single-flight loads."""
+
+    def __init__(self, ttl=300, stale=3600, max_entries=128, clock=time.monotonic):
+        self.ttl = ttl
+        self.stale = stale
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (value, fetched_at)
+        self._inflight = {}  # key -> Future of the running upstream call
+        self._lock = threading.Lock()
+        self.counts = {'hit': 0, 'stale': 0, 'miss': 0, 'coalesced': 0}
+        self.upstream = {'calls': 0, 'errors': 0, 'seconds_total': 0.0, 'seconds_max': 0.0, 'seconds_last': None}
+
+    def _count(self, result):
+        self.counts[result] += 1
+        CACHE_REQUESTS.inc(result=result)
+
+    def get(self, key, loader):
+        """Return (value, result) where result is hit/stale/miss/coalesced.
+
+        `loader()` is called at most once per key at a time; its exception
+        propagates to every caller waiting on that miss.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            age = None if entry is None else self._clock() - entry[1]
+            if age is not None and age < self.ttl:
+                self._entries.move_to_end(key)
+                self._count('hit')
+                return entry[0], 'hit'
+            if age is not None and age < self.ttl + self.stale:
+                self._count('stale')
+                if key not in self._inflight:
+                    future = self._inflight[key] = Future()
+                    threading.Thread(target=self._load, args=(key, loader, future),
+                                     name='stock-cache-refresh', daemon=True).start()
+                return entry[0], 'stale'
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+            self._count('miss' if owner else 'coalesced')
+        if owner:
+            self._load(key, loader, future)
+        return future.result(), 'miss' if owner else 'coalesced'
+
+    def _load(self, key, loader, future):
+        started = time.perf_counter()
+        try:
+            with stage('firecrawl_scrape'):
+                value = loader()
+        except BaseException as e:
+            with self._lock:
+                self._record_upstream(time.perf_counter() - started, error=True)
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            return
+        with self._lock:
+            self._record_upstream(time.perf_counter() - started)
+            self._entries[key] = (value, self._clock())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._inflight.pop(key, None)
+        future.set_result(value)
+
+    def _record_upstream(self, seconds, error=False):
+        up = self.upstream
+        up['calls'] += 1
+        up['errors'] += int(error)
+        up['seconds_total'] += seconds
+        up['seconds_max'] = max(up['seconds_max'], seconds)
+        up['seconds_last'] = seconds
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+            upstream = dict(self.upstream)
+            entries = len(self._entries)
+        lookups = sum(counts.values())
+        served = counts['hit'] + counts['stale'] + counts['coalesced']
+        upstream['seconds_avg'] = upstream['seconds_total'] / upstream['calls'] if upstream['calls'] else None
+        return {
+            'entries': entries,
+            'lookups': lookups,
+            'hit_ratio': served / lookups if lookups else None,
+            'results': counts,
+            'upstream': upstream,
+        }
@@ -0,0 +1,90 @@
+"""Fixtures for the hot-path benchmarks, built from the checked-in recordings.
+
+- the largest `nse_filings_*.csv` snapshot, turned back into an NSE API
+  payload (`parse_to_dataframe`, bulk upserts) and into an NSE filings
+  table page (`app.parse_filings_table`)
+- `debug_response.html`, a mangled NSE response with no filings table
+- `IXIGO_announcement.pdf` (`extract_text_from_pdf`)
+
+Run from the repo root (see README_SERVER.md, "Benchmarks"); the options
+in `benchmarks/pytest.ini` compare against the checked-in baseline:
+
+    python -m pytest benchmarks
+"""
+
+import glob
+import html
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'scripts')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from announcements import ANNOUNCEMENT_FIELDS  # noqa: E402
+
+try:
+    import pytest_benchmark  # noqa: F401
+except ImportError:
+    # Without the plugin there is no `benchmark` fixture; skip the suite
+    collect_ignore_glob = ['test_*.py']
+
+
+@pytest.fixture(scope='session')
+def snapshot_frame():
+    """Largest recorded scrape, as raw strings."""
+    paths = sorted(glob.glob(os.path.join(ROOT, 'nse_filings_*.csv')), key=os.path.getsize)
+    if not paths:
+        pytest.skip('no nse_filings_*.csv snapshot in the repo root')
+    return pd.read_csv(paths[-1], dtype=str, encoding='utf-8-sig', keep_default_na=False)
+
+
+@pytest.fixture(scope='session')
+def nse_payload(snapshot_frame):
+    """The snapshot in the shape of an /api/corporate-announcements response."""
+    return [
+        {field: row.get(col, '') for col, field in ANNOUNCEMENT_FIELDS.items()}
+        for row in snapshot_frame.to_dict('records')
+    ]
+
+
+@pytest.fixture(scope='session')
+def filings_table_html(snapshot_frame):
+    """The snapshot rendered like the NSE corporate filings table Firecrawl returns."""
+    rows = []
+    for rec in snapshot_frame.to_dict('records'):
+        cells = [
+            f'<a href="/get-quotes/equity?symbol={html.escape(rec["Symbol"])}">{html.escape(rec["Symbol"])}</a>',
+            html.escape(rec['Company']),
+            html.escape(rec['Subject']),
+            html.escape(rec['Description']),
+            f'<a href="{html.escape(rec["Attachment_URL"])}">PDF</a>(597.28 KB)' if rec['Attachment_URL'] else '-',
+            f'<a href="{html.escape(rec["XBRL_Link"])}">XBRL</a>' if rec['XBRL_Link'] else '-',
+            html.escape(rec['Timestamp']),
+        ]
+        rows.append('<tr>' + ''.join(f'<td>{c}</td>' for c in cells) + '</tr>')
+    header = ''.join(f'<th>{h}</th>' for h in (
+        'SYMBOL', 'COMPANY NAME', 'SUBJECT', 'DETAILS', 'ATTACHMENT', 'XBRL', 'BROADCAST DATE/TIME'))
+    return (
+        '<!DOCTYPE html><html><body><nav><table><tr><td>menu</td></tr></table></nav>'
+        f'<table><tr>{header}</tr>{"".join(rows)}</table></body></html>'
+    )
+
+
+@pytest.fixture(scope='session')
+def debug_response_html():
+    with open(os.path.join(ROOT, 'debug_response.html'), encoding='utf-8', errors='replace') as fh:
+        return fh.read()
+
+
+@pytest.fixture(scope='session')
+def announcement_pdf():
+    path = os.path.join(ROOT, 'IXIGO_announcement.pdf')
+    if not os.path.exists(path):
+        pytest.skip('IXIGO_announcement.pdf not found')
+    return path
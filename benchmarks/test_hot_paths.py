@@ -0,0 +1,82 @@
+"""Benchmarks for the scrape -> summarize -> send hot paths."""
+
+import os
+
+import pytest
+
+from announcements import records_to_frame
+from app import parse_filings_table
+from app.filings_table import BACKENDS as TABLE_BACKENDS
+from nse_scrapper import NSEScraper
+from pdf_text import extract_text
+from summarize_hour import build_template_payload
+from summarize_last_hour import extract_text_from_pdf
+
+
+@pytest.fixture
+def scraper():
+    return NSEScraper(use_shared_client=False)
+
+
+def test_parse_to_dataframe(benchmark, scraper, nse_payload):
+    df = benchmark(scraper.parse_to_dataframe, {'data': nse_payload})
+    assert len(df) == len(nse_payload)
+
+
+@pytest.mark.parametrize('backend', sorted(TABLE_BACKENDS))
+def test_parse_filings_table(benchmark, filings_table_html, snapshot_frame, backend):
+    filings = benchmark(parse_filings_table, filings_table_html, backend)
+    assert len(filings) == len(snapshot_frame)
+    assert filings[0]['symbol'] == snapshot_frame['Symbol'].iloc[0]
+
+
+@pytest.mark.parametrize('backend', sorted(TABLE_BACKENDS))
+def test_parse_filings_table_without_table(benchmark, debug_response_html, backend):
+    # The recorded debug response is a mangled body with no filings table
+    assert benchmark(parse_filings_table, debug_response_html, backend) == []
+
+
+def test_extract_text_from_pdf(benchmark, announcement_pdf):
+    text = benchmark.pedantic(extract_text_from_pdf, args=(announcement_pdf,), rounds=3, iterations=1)
+    assert text
+
+
+def test_build_template_payloads(benchmark, snapshot_frame):
+    rows = snapshot_frame.to_dict('records')
+
+    def build_all():
+        return [
+            build_template_payload('alert_notification_v5', '919999999999', 'Subscriber',
+                                   f"REF-{row['Symbol']}", 'N/A', row['Description'])
+            for row in rows
+        ]
+
+    payloads = benchmark(build_all)
+    assert len(payloads) == len(rows)
+
+
+def _bench_collection():
+    uri = os.environ.get('BENCH_MONGO_URI')
+    if uri:
+        from pymongo import MongoClient
+        return MongoClient(uri, serverSelectionTimeoutMS=2000)['nse_bench']['company-map']
+    mongomock = pytest.importorskip('mongomock', reason='set BENCH_MONGO_URI or install mongomock')
+    return mongomock.MongoClient()['nse_bench']['company-map']
+
+
+def test_mongo_bulk_upserts(benchmark, scraper, snapshot_frame):
+    scraper.collection = _bench_collection()
+    records = records_to_frame(snapshot_frame.to_dict('records')).to_dict('records')
+
+    result = benchmark.pedantic(scraper.save_records_to_mongodb, args=(records,),
+                                setup=scraper.collection.drop, rounds=5, iterations=1)
+    assert result['errors'] == 0
+    assert result['upserted'] == scraper.collection.count_documents({})
+
+
+@pytest.mark.parametrize('backend', ['pypdfium2', 'pdfminer', 'pypdf2'])
+def test_pdf_text_backend(benchmark, announcement_pdf, backend):
+    pytest.importorskip({'pypdfium2': 'pypdfium2', 'pdfminer': 'pdfminer', 'pypdf2': 'PyPDF2'}[backend])
+    result = benchmark.pedantic(extract_text, args=(announcement_pdf,), kwargs={'backends': [backend]},
+                                rounds=3, iterations=1)
+    assert result['backend'] == backend and result['text']
@@ -0,0 +1,154 @@
+"""Per-company announcement history in monthly buckets.
+
+`/scrape` used to `$push` every announcement into one `company` document
+per company, without dedup or bound, so busy companies grew toward the
+16 MB document limit and every update rewrote the whole array. History
+now lives in the `company_history` collection, one document per company
+per month of announcement time:
+
+    {_id: 'Infosys Limited|2025-11', company, symbol, month: '2025-11',
+     ids: [fingerprint, ...], announcements: [...], count, first_at, last_at}
+
+Each announcement is appended with a conditional upsert that only matches
+while its fingerprint (`announcements.announcement_id`) is missing from
+`ids`, so re-scraping the same window adds nothing. Such an upsert also
+collides when another writer creates the same bucket first; collisions
+are retried once (`mongo_bulk.conditional_upserts`) and only those that
+collide again are duplicates. The last N
+announcements of a company are read with one query on the
+(company, month) or (symbol, month) index, newest bucket first.
+
+    python company_history.py migrate   # copy the old `company` collection in
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime
+
+from pymongo import DESCENDING, UpdateOne
+
+from announcements import announcement_id, build_announcement
+from mongo_bulk import conditional_upserts
+
+
+COLLECTION_NAME = 'company_history'
+LEGACY_COLLECTION_NAME = 'company'
+
+
+def bucket_month(announced_at):
+    return announced_at.strftime('%Y-%m')
+
+
+class CompanyHistory:
+    """Bucketed, deduplicated announcement history stored in MongoDB."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def ensure_indexes(self):
+        self.collection.create_index([('company', 1), ('month', DESCENDING)])
+        self.collection.create_index([('symbol', 1), ('month', DESCENDING)])
+
+    def _append_op(self, company, symbol, announcement):
+        fingerprint = announcement['id']
+        announced_at = announcement['announced_at']
+        month = bucket_month(announced_at)
+        return UpdateOne(
+            {'_id': f'{company}|{month}', 'ids': {'$ne': fingerprint}},
+            {
+                '$setOnInsert': {'company': company, 'month': month},
+                '$set': {'symbol': symbol},
+                '$push': {'ids': fingerprint, 'announcements': announcement},
+                '$inc': {'count': 1},
+                '$min': {'first_at': announced_at},
+                '$max': {'last_at': announced_at},
+            },
+            upsert=True,
+        )
+
+    def record(self, records, scraped_at=None):
+        """Append scraped `records` (API or DataFrame rows) to their buckets.
+
+        Returns {'saved', 'duplicates', 'errors', 'batches'}. An announcement
+        already in its bucket makes the conditional upsert collide with the
+        existing _id even after the retry; those are counted as duplicates.
+        """
+        scraped_at = scraped_at or datetime.utcnow()
+        ops, companies, seen = [], [], set()
+        for rec in records:
+            company = rec.get('Company') or rec.get('sm_name') or rec.get('Symbol') or rec.get('symbol')
+            if not company:
+                continue
+            fingerprint = announcement_id(rec)
+            if fingerprint in seen:
+                continue
+            seen.add(fingerprint)
+            announcement = build_announcement(rec, scraped_at)
+            announcement['id'] = fingerprint
+            announcement['announced_at'] = announcement['announced_at'] or scraped_at
+            ops.append(self._append_op(company, announcement['Symbol'], announcement))
+            companies.append(company)
+
+        result = conditional_upserts(self.collection, ops)
+        errors = [{'company': companies[err['index']], 'error': err['errmsg']} for err in result['errors']]
+        return {
+            'saved': len(ops) - len(result['skipped']) - len(errors),
+            'duplicates': len(result['skipped']),
+            'errors': errors,
+            'batches': [{k: b[k] for k in ('size', 'upserted', 'modified', 'errors')} for b in result['batches']],
+        }
+
+    def latest(self, company=None, symbol=None, limit=20):
+        """The `limit` most recent announcements of a company, newest first."""
+        if company:
+            query = {'company': company}
+        elif symbol:
+            query = {'symbol': symbol}
+        else:
+            raise ValueError('company or symbol is required')
+        cursor = self.collection.find(query, {'announcements': 1}).sort('month', DESCENDING)
+        result = []
+        for bucket in cursor:
+            result.extend(sorted(bucket.get('announcements', []), key=lambda a: a['announced_at'], reverse=True))
+            if len(result) >= limit:
+                cursor.close()
+                break
+        return result[:limit]
+
+    def import_legacy(self, legacy_collection):
+        """Copy the `announcements` arrays of the old `company` collection in."""
+        totals = {'saved': 0, 'duplicates': 0, 'errors': 0}
+        for doc in legacy_collection.find({}, {'announcements': 1, 'symbol': 1}):
+            records = [dict(a, Company=doc['_id'], Symbol=a.get('Symbol') or doc.get('symbol'))
+                       for a in doc.get('announcements', [])]
+            result = self.record(records)
+            totals['saved'] += result['saved']
+            totals['duplicates'] += result['duplicates']
+            totals['errors'] += len(result['errors'])
+        return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Manage the company_history collection')
+    parser.add_argument('command', choices=['migrate'])
+    args = parser.parse_args(argv)
+
+    uri = os.environ.get('MONGODB_URI')
+    if not uri:
+        print('✗ MONGODB_URI is not set')
+        return 1
+    from pymongo import MongoClient
+
+    db = MongoClient(uri, serverSelectionTimeoutMS=5000)[os.environ.get('MONGODB_DB', 'stockalert')]
+    history = CompanyHistory(db[COLLECTION_NAME])
+    history.ensure_indexes()
+    if args.command == 'migrate':
+        totals = history.import_legacy(db[LEGACY_COLLECTION_NAME])
+        print(f"✓ Migrated {totals['saved']} announcements "
+              f"({totals['duplicates']} duplicates, {totals['errors']} errors)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
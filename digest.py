@@ -0,0 +1,114 @@
+"""Per-subscriber digests of filing alerts.
+
+Instead of one WhatsApp template per (filing, subscriber), digest mode
+collects every filing a subscriber matched and sends one message per
+subscriber per time window (filings are bucketed by announcement time,
+DIGEST_WINDOW_MINUTES, default 60). Filings whose subject is high
+priority (DIGEST_PRIORITY_SUBJECTS, default "Outcome of Board Meeting")
+are still sent on their own, as is a window with a single filing.
+
+Every (filing, subscriber) pair is queued as its own outbound message,
+tagged with its digest group (phone + window) and held in the queue
+until the window ends (`not_before`). The digest is composed when the
+queue is drained after that, from the group's still-pending messages, so
+filings picked up by separate runs within one window go out together. A
+filing that only arrives after its window was sent goes out on its own
+(or in a digest of the newcomers) instead of re-sending the filings
+already delivered.
+
+Template parameters are limited in length and may not contain newlines,
+tabs or long runs of spaces, so the digest text is flattened and
+truncated with a "+N more" note.
+"""
+
+import os
+import re
+from datetime import datetime, timedelta
+
+from announcements import parse_announcement_time
+
+
+DEFAULT_PRIORITY_SUBJECTS = ('Outcome of Board Meeting',)
+# WhatsApp rejects template parameters over 1024 characters
+PARAM_LIMIT = 1000
+ITEM_SEPARATOR = ' | '
+
+
+def priority_subjects_from_env():
+    value = os.environ.get('DIGEST_PRIORITY_SUBJECTS')
+    if value is None:
+        return list(DEFAULT_PRIORITY_SUBJECTS)
+    return [s.strip() for s in value.split(',') if s.strip()]
+
+
+def is_priority(subject, priority_subjects):
+    subject = (subject or '').lower()
+    return any(p.lower() in subject for p in priority_subjects)
+
+
+def clean_param(text):
+    """Make text safe for a template parameter (no newlines/tabs, <= 4 spaces in a row)."""
+    return re.sub(r'\s+', ' ', str(text or '')).strip()
+
+
+def format_digest(items, limit=PARAM_LIMIT):
+    """One-line digest text ('SYM: summary | SYM: summary (+N more)') within `limit`."""
+    parts = [clean_param(f"{item['symbol']}: {item['summary']}") for item in items]
+    text = ''
+    for i, part in enumerate(parts):
+        remaining = len(parts) - i - 1
+        more = f' (+{remaining} more)' if remaining else ''
+        candidate = f'{text}{ITEM_SEPARATOR}{part}' if text else part
+        if len(candidate) + len(more) <= limit:
+            text = candidate
+        elif not text:
+            # The first item alone is too long: shorten it
+            return part[:max(0, limit - len(more) - 3)].rstrip() + '...' + more
+        else:
+            # The previous iteration left room for exactly this note
+            return f'{text} (+{len(parts) - i} more)'
+    return text
+
+
+def window_start(when, window_minutes):
+    """Start of the digest window containing `when`."""
+    minutes = max(1, int(window_minutes))
+    epoch_minutes = int(when.timestamp() // 60)
+    return datetime.fromtimestamp((epoch_minutes - epoch_minutes % minutes) * 60)
+
+
+def digest_window(match, window_minutes=60, priority_subjects=DEFAULT_PRIORITY_SUBJECTS, now=None):
+    """(group key 'phone|window start', window end) of a match; (None, None) for priority filings.
+
+    A match is a dict with filing_id, phone, name, symbol, subject,
+    summary, price and timestamp.
+    """
+    if is_priority(match.get('subject'), priority_subjects):
+        return None, None
+    when = parse_announcement_time(match.get('timestamp')) or now or datetime.now()
+    start = window_start(when, window_minutes)
+    return f"{match['phone']}|{start.isoformat()}", start + timedelta(minutes=max(1, int(window_minutes)))
+
+
+def digest_group(match, window_minutes=60, priority_subjects=DEFAULT_PRIORITY_SUBJECTS, now=None):
+    """Digest group key ('phone|window start') of a match, or None for priority filings."""
+    return digest_window(match, window_minutes, priority_subjects, now)[0]
+
+
+def group_claimed(docs):
+    """Split claimed queue docs into send units: lists of docs sent as one message.
+
+    Docs whose `digest` item shares a group and template form one unit,
+    ordered by symbol; docs without a group are units of their own.
+    """
+    units, groups = [], {}
+    for doc in docs:
+        group = (doc.get('digest') or {}).get('group')
+        if group is None:
+            units.append([doc])
+        elif (doc['template'], group) in groups:
+            groups[(doc['template'], group)].append(doc)
+        else:
+            groups[(doc['template'], group)] = unit = [doc]
+            units.append(unit)
+    return [sorted(unit, key=lambda d: d['digest']['symbol']) if len(unit) > 1 else unit for unit in units]
@@ -0,0 +1,244 @@
+"""Date-partitioned Parquet archive of scraped NSE announcements.
+
+Replaces the `nse_filings_YYYYMMDD_HHMMSS.csv/.xlsx` snapshots that used
+to pile up in the repo root. Each scrape is appended to
+
+    <root>/date=YYYY-MM-DD/part-<HHMMSS>-<id>.parquet
+
+partitioned by announcement date. Every row carries a `content_hash`
+(all announcement columns), and rows already present in their partition
+are skipped, so re-archiving an overlapping scrape adds nothing. Files are
+dictionary encoded and zstd compressed, which keeps repeated Company,
+Subject and Description text small.
+
+    python filings_archive.py import nse_filings_*.csv nse_filings_*.xlsx
+    python filings_archive.py read --from 2025-11-07 --to 2025-11-08
+
+Environment variables:
+- FILINGS_ARCHIVE_DIR (default archive/filings)
+"""
+
+import argparse
+import glob
+import hashlib
+import os
+import sys
+import uuid
+from datetime import date, datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from announcements import (ANNOUNCEMENT_COLUMNS, CATEGORY_COLUMNS, announcements_frame,
+                           format_announcement_time)
+
+
+DEFAULT_ARCHIVE_DIR = os.path.join('archive', 'filings')
+UNKNOWN_PARTITION = 'unknown'
+
+SCHEMA = pa.schema([
+    ('Symbol', pa.string()),
+    ('Company', pa.string()),
+    ('Subject', pa.string()),
+    ('Description', pa.string()),
+    ('Attachment_URL', pa.string()),
+    ('File_Size', pa.float64()),
+    ('Timestamp', pa.timestamp('us')),
+    ('XBRL_Link', pa.string()),
+    ('content_hash', pa.string()),
+    ('archived_at', pa.timestamp('us')),
+])
+
+
+def content_hash(record):
+    """Hash of every announcement column, so edited re-filings are kept."""
+    parts = []
+    for col in ANNOUNCEMENT_COLUMNS:
+        value = record.get(col)
+        if col == 'Timestamp':
+            value = format_announcement_time(value)
+        elif value is None or (isinstance(value, float) and pd.isna(value)):
+            value = ''
+        parts.append(str(value))
+    return hashlib.sha1('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+def _partition_name(ts):
+    return UNKNOWN_PARTITION if pd.isna(ts) else ts.strftime('%Y-%m-%d')
+
+
+def _as_date(value):
+    if value is None or isinstance(value, date) and not isinstance(value, datetime):
+        return value
+    if isinstance(value, datetime):
+        return value.date()
+    return datetime.strptime(str(value), '%Y-%m-%d').date()
+
+
+class FilingsArchive:
+    """Append-only Parquet dataset of announcements with content-hash dedup."""
+
+    def __init__(self, root=None):
+        self.root = root or os.environ.get('FILINGS_ARCHIVE_DIR') or DEFAULT_ARCHIVE_DIR
+        self._hashes = {}
+
+    def _partition_dir(self, name):
+        return os.path.join(self.root, f'date={name}')
+
+    def _known_hashes(self, name):
+        """Hashes already stored in a partition (reads only that column)."""
+        if name not in self._hashes:
+            hashes = set()
+            for path in glob.glob(os.path.join(self._partition_dir(name), '*.parquet')):
+                hashes.update(pq.read_table(path, columns=['content_hash']).column(0).to_pylist())
+            self._hashes[name] = hashes
+        return self._hashes[name]
+
+    def append(self, df, archived_at=None):
+        """Archive a typed announcements DataFrame (see announcements_frame).
+
+        Returns {'written', 'duplicates', 'files'}.
+        """
+        result = {'written': 0, 'duplicates': 0, 'files': []}
+        if df is None or df.empty:
+            return result
+        archived_at = archived_at or datetime.now()
+        df = df[ANNOUNCEMENT_COLUMNS].copy()
+        for col in CATEGORY_COLUMNS:
+            df[col] = df[col].astype(str)
+        df['content_hash'] = [content_hash(rec) for rec in df.to_dict('records')]
+        df = df.drop_duplicates(subset=['content_hash'])
+        df['archived_at'] = archived_at
+        partitions = df['Timestamp'].map(_partition_name)
+
+        for name, part in df.groupby(partitions, sort=True):
+            known = self._known_hashes(name)
+            new = part[~part['content_hash'].isin(known)]
+            result['duplicates'] += len(part) - len(new)
+            if new.empty:
+                continue
+            directory = self._partition_dir(name)
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"part-{archived_at.strftime('%H%M%S')}-{uuid.uuid4().hex[:8]}.parquet")
+            table = pa.Table.from_pandas(new.reset_index(drop=True), schema=SCHEMA, preserve_index=False)
+            pq.write_table(table, path, compression='zstd', use_dictionary=True)
+            known.update(new['content_hash'])
+            result['written'] += len(new)
+            result['files'].append(path)
+        return result
+
+    def dataset(self, start=None, end=None):
+        """pyarrow Dataset over the partitions between `start` and `end` (inclusive).
+
+        Nothing is read until the dataset is scanned; the undated partition
+        is only included when no range is given.
+        """
+        start, end = _as_date(start), _as_date(end)
+        paths = []
+        for directory in sorted(glob.glob(os.path.join(self.root, 'date=*'))):
+            name = os.path.basename(directory)[len('date='):]
+            if name == UNKNOWN_PARTITION:
+                if start is None and end is None:
+                    paths.extend(sorted(glob.glob(os.path.join(directory, '*.parquet'))))
+                continue
+            day = _as_date(name)
+            if (start and day < start) or (end and day > end):
+                continue
+            paths.extend(sorted(glob.glob(os.path.join(directory, '*.parquet'))))
+        return ds.dataset(paths, schema=SCHEMA, format='parquet')
+
+    def iter_frames(self, start=None, end=None, columns=None, batch_size=65536):
+        """Yield DataFrames batch by batch for a date range."""
+        for batch in self.dataset(start, end).to_batches(columns=columns, batch_size=batch_size):
+            yield self._typed(batch.to_pandas())
+
+    def read(self, start=None, end=None, columns=None):
+        """Load a date range into one DataFrame, sorted by Timestamp."""
+        table = self.dataset(start, end).to_table(columns=columns)
+        df = self._typed(table.to_pandas())
+        if 'Timestamp' in df:
+            df = df.sort_values('Timestamp', kind='stable').reset_index(drop=True)
+        return df
+
+    @staticmethod
+    def _typed(df):
+        for col in CATEGORY_COLUMNS:
+            if col in df:
+                df[col] = df[col].astype('category')
+        return df
+
+    def import_snapshots(self, paths):
+        """One-shot import of old nse_filings_*.csv / .xlsx snapshots.
+
+        Byte-identical files are read once. Returns per-file results.
+        """
+        seen_files = set()
+        results = []
+        for path in paths:
+            with open(path, 'rb') as fh:
+                digest = hashlib.sha256(fh.read()).hexdigest()
+            if digest in seen_files:
+                print(f"→ Skipping {path} (identical to an earlier file)")
+                results.append({'path': path, 'skipped': True, 'written': 0, 'duplicates': 0})
+                continue
+            seen_files.add(digest)
+            df = read_snapshot(path)
+            res = self.append(df, archived_at=snapshot_time(path))
+            print(f"✓ {path}: {res['written']} archived, {res['duplicates']} already present")
+            results.append({'path': path, 'skipped': False, 'written': res['written'],
+                            'duplicates': res['duplicates']})
+        return results
+
+
+def snapshot_time(path):
+    """Scrape time encoded in an nse_filings_YYYYMMDD_HHMMSS file name (or now)."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    try:
+        return datetime.strptime(stem[-15:], '%Y%m%d_%H%M%S')
+    except ValueError:
+        return datetime.now()
+
+
+def read_snapshot(path):
+    """Read an old CSV/XLSX snapshot into a typed announcements DataFrame."""
+    if path.lower().endswith(('.xlsx', '.xls')):
+        raw = pd.read_excel(path, dtype=str)
+    else:
+        raw = pd.read_csv(path, dtype=str, encoding='utf-8-sig', keep_default_na=False)
+    raw = raw.fillna('')
+    columns = {col: raw[col].tolist() if col in raw else [''] * len(raw) for col in ANNOUNCEMENT_COLUMNS}
+    return announcements_frame(columns)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='NSE announcements Parquet archive')
+    parser.add_argument('--root', help='Archive directory (default: FILINGS_ARCHIVE_DIR or archive/filings)')
+    sub = parser.add_subparsers(dest='command', required=True)
+    imp = sub.add_parser('import', help='Import old nse_filings_*.csv/.xlsx snapshots')
+    imp.add_argument('paths', nargs='*', help='Files to import (default: nse_filings_* in the current directory)')
+    rd = sub.add_parser('read', help='Print a summary of a date range')
+    rd.add_argument('--from', dest='start', help='First date (YYYY-MM-DD)')
+    rd.add_argument('--to', dest='end', help='Last date (YYYY-MM-DD)')
+    args = parser.parse_args(argv)
+
+    archive = FilingsArchive(args.root)
+    if args.command == 'import':
+        paths = args.paths or sorted(glob.glob('nse_filings_*.csv') + glob.glob('nse_filings_*.xlsx'))
+        if not paths:
+            print("✗ No snapshot files found")
+            sys.exit(1)
+        results = archive.import_snapshots(paths)
+        print(f"✓ Imported {sum(r['written'] for r in results)} announcements from {len(paths)} files into {archive.root}")
+        return results
+
+    df = archive.read(args.start, args.end)
+    print(f"✓ {len(df)} announcements")
+    if not df.empty:
+        print(df[['Symbol', 'Company', 'Subject', 'Timestamp']].tail(10).to_string(index=False))
+    return df
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""In-process background job runner for the server.
+
+The scraper and the scripts under `scripts/` expose `main(argv=None)`.
+Instead of forking a new interpreter per API call, the server runs those
+entry points in a small thread pool and hands back a job id that can be
+polled. Output printed by a job's thread is captured into that job's
+record; the process' real stdout still receives everything else.
+"""
+
+import io
+import sys
+import threading
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+class _ThreadOutput(io.TextIOBase):
+    """Stream proxy that diverts writes from registered threads to a buffer."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
+
+    def capture(self, buffer):
+        self._local.buffer = buffer
+
+    def release(self):
+        self._local.buffer = None
+
+    def write(self, text):
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is not None:
+            return buffer.write(text)
+        return self._stream.write(text)
+
+    def flush(self):
+        self._stream.flush()
+
+    def writable(self):
+        return True
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+_install_lock = threading.Lock()
+
+
+def _install_output_proxies():
+    with _install_lock:
+        if not isinstance(sys.stdout, _ThreadOutput):
+            sys.stdout = _ThreadOutput(sys.stdout)
+        if not isinstance(sys.stderr, _ThreadOutput):
+            sys.stderr = _ThreadOutput(sys.stderr)
+    return sys.stdout, sys.stderr
+
+
+def run_entrypoint(fn, args=None, name=None):
+    """Call a script's `main(argv)` in the current thread.
+
+    Returns the same shape the old subprocess runner produced:
+    {'returncode', 'stdout', 'stderr', 'cmd'}. `sys.exit()` inside the
+    entry point becomes the return code; uncaught exceptions return 3.
+    """
+    args = list(args or [])
+    out, err = _install_output_proxies()
+    stdout, stderr = io.StringIO(), io.StringIO()
+    out.capture(stdout)
+    err.capture(stderr)
+    returncode = 0
+    try:
+        fn(args)
+    except SystemExit as se:
+        code = se.code
+        if code is None:
+            returncode = 0
+        elif isinstance(code, int):
+            returncode = code
+        else:
+            stderr.write(f'{code}\n')
+            returncode = 1
+    except Exception:
+        stderr.write(traceback.format_exc())
+        returncode = 3
+    finally:
+        out.release()
+        err.release()
+    return {
+        'returncode': returncode,
+        'stdout': stdout.getvalue(),
+        'stderr': stderr.getvalue(),
+        'cmd': ' '.join([name or getattr(fn, '__module__', 'job')] + args),
+    }
+
+
+class JobRunner:
+    """Thread pool executor that tracks submitted jobs by id."""
+
+    def __init__(self, max_workers=2, max_history=200):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs = OrderedDict()
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._max_history = max_history
+
+    def submit(self, name, fn, *args, **kwargs):
+        """Queue `fn(*args, **kwargs)`; returns the new job id."""
+        job_id = uuid.uuid4().hex
+        job = {
+            'id': job_id,
+            'name': name,
+            'status': 'queued',
+            'created_at': datetime.utcnow().isoformat() + 'Z',
+            'started_at': None,
+            'finished_at': None,
+            'result': None,
+            'error': None,
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._trim()
+            self._futures[job_id] = self._executor.submit(self._run, job, fn, args, kwargs)
+        return job_id
+
+    def _run(self, job, fn, args, kwargs):
+        with self._lock:
+            job['status'] = 'running'
+            job['started_at'] = datetime.utcnow().isoformat() + 'Z'
+        try:
+            result = fn(*args, **kwargs)
+            status = 'succeeded'
+            if isinstance(result, dict) and result.get('success') is False:
+                status = 'failed'
+            with self._lock:
+                job['result'] = result
+                job['status'] = status
+        except Exception as e:
+            with self._lock:
+                job['error'] = f'{e}\n{traceback.format_exc()}'
+                job['status'] = 'failed'
+        finally:
+            with self._lock:
+                job['finished_at'] = datetime.utcnow().isoformat() + 'Z'
+                self._futures.pop(job['id'], None)
+
+    def _trim(self):
+        # Forget the oldest finished jobs once the history is full
+        while len(self._jobs) > self._max_history:
+            for job_id, job in self._jobs.items():
+                if job['status'] in ('succeeded', 'failed'):
+                    del self._jobs[job_id]
+                    break
+            else:
+                break
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list(self):
+        with self._lock:
+            return [dict(job) for job in reversed(self._jobs.values())]
+
+    def wait(self, job_id, timeout=None):
+        """Block until the job finishes (or `timeout` seconds pass); returns the job."""
+        future = self._futures.get(job_id)
+        if future is not None:
+            try:
+                future.result(timeout=timeout)
+            except Exception:
+                pass
+        return self.get(job_id)
@@ -1,8 +1,10 @@
 import requests
 import json
-from datetime import datetime
+import os
 import time
 
+from seen_store import SeenStore
+
 NSE_BASE = "https://www.nseindia.com"
 API_URL = f"{NSE_BASE}/api/corporate-announcements"
 CACHE_FILE = "nse_cache.json"
@@ -43,23 +45,19 @@ def fetch_announcements(session, size=50):
     
     return announcements
 
-def save_cache(announcements):
-    with open(CACHE_FILE, "w") as f:
-        json.dump({
-            "timestamp": datetime.now().isoformat(),
-            "filings": announcements
-        }, f, indent=2)
-
-def load_cache():
+def load_legacy_cache():
+    """Filings from the old JSON snapshot, used once to seed the seen store."""
     try:
         with open(CACHE_FILE, "r") as f:
             return json.load(f).get("filings", [])
-    except:
+    except (OSError, ValueError):
         return []
 
-def find_new(old, new):
-    old_ids = {f"{f['symbol']}_{f['broadcast_date']}_{f['subject']}" for f in old}
-    return [f for f in new if f"{f['symbol']}_{f['broadcast_date']}_{f['subject']}" not in old_ids]
+def open_seen_store():
+    store = SeenStore()
+    if not len(store) and os.path.exists(CACHE_FILE):
+        store.filter_new(load_legacy_cache())
+    return store
 
 def main():
     print("Fetching NSE announcements...")
@@ -71,8 +69,11 @@ def main():
         print("Failed to fetch data")
         return
     
-    old = load_cache()
-    new = find_new(old, current)
+    store = open_seen_store()
+    new = store.filter_new(current)
+    pruned = store.prune()
+    total = len(store)
+    store.close()
     
     if new:
         print(f"\n🆕 {len(new)} NEW ANNOUNCEMENTS:\n")
@@ -85,8 +86,7 @@ def main():
     for f in current[:5]:
         print(f"{f['symbol']:12s} | {f['broadcast_date']} | {f['subject'][:60]}")
     
-    save_cache(current)
-    print(f"\nSaved {len(current)} announcements")
+    print(f"\nTracking {total} seen announcements" + (f" ({pruned} expired)" if pruned else ""))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,262 @@
+"""Pipeline stage timing and Prometheus-format metrics.
+
+Every pipeline stage (cookie_fetch, nse_api, nse_body_read for streamed
+bodies, decompress, parse, mongo_write, pdf_download, text_extract,
+llm_call, price_fetch, whatsapp_send) is wrapped in `stage(name)`:
+
+    with stage('pdf_download', company=company):
+        ...
+
+which records, per stage:
+
+- `pipeline_stage_seconds` histogram of durations
+- `pipeline_stage_total` counter by outcome (ok / error)
+- `pipeline_stage_in_flight` gauge of calls currently running
+
+and keeps a structured span ({stage, trace, parent, start, seconds,
+outcome, attrs}) in a bounded in-memory buffer (METRICS_SPAN_BUFFER,
+default 500). Spans opened inside another span share its trace id, so
+one scrape or summarize run can be followed end to end. Work handed to a
+thread pool keeps its parent when submitted with `submit_with_context()`
+(a worker thread otherwise starts with an empty context). The summarize
+pipeline, backfill and WhatsApp batch sends submit this way under their
+`summarize_run`, `backfill` and `whatsapp_batch` spans.
+
+The server exposes the registry at `/metrics` and recent spans at
+`/api/spans`. Jobs run in-process, so the scripts' stages show up there
+too. Metrics live in process memory and reset on restart.
+"""
+
+import contextvars
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=(), registry=None):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f'{self.name} expects labels {self.label_names}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def get(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def collect(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}')
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        super().__init__(name, help_text, labels, registry)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry['buckets'][i] += 1
+            entry['sum'] += value
+            entry['count'] += 1
+
+    def get(self, **labels):
+        """{'buckets', 'sum', 'count'} for a label set (cumulative bucket counts)."""
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            return None if entry is None else {'buckets': list(entry['buckets']), 'sum': entry['sum'],
+                                                'count': entry['count']}
+
+    def collect(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, entry in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, entry['buckets']):
+                    labels = _format_labels(self.label_names, key, ('le', _format_value(bound)))
+                    lines.append(f'{self.name}_bucket{labels} {count}')
+                labels = _format_labels(self.label_names, key)
+                lines.append(f'{self.name}_sum{labels} {_format_value(entry["sum"])}')
+                lines.append(f'{self.name}_count{labels} {entry["count"]}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f'Metric {metric.name} already registered')
+            self._metrics[metric.name] = metric
+
+    def render(self):
+        """Prometheus text exposition (format 0.0.4) of every metric."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+STAGE_SECONDS = Histogram('pipeline_stage_seconds', 'Time spent in a pipeline stage.', ['stage'])
+STAGE_TOTAL = Counter('pipeline_stage_total', 'Pipeline stage calls by outcome.', ['stage', 'outcome'])
+STAGE_IN_FLIGHT = Gauge('pipeline_stage_in_flight', 'Pipeline stage calls currently running.', ['stage'])
+
+
+def _span_buffer_size():
+    try:
+        return max(0, int(os.environ.get('METRICS_SPAN_BUFFER', 500)))
+    except ValueError:
+        return 500
+
+
+_spans = deque(maxlen=_span_buffer_size())
+_spans_lock = threading.Lock()
+_current_span = contextvars.ContextVar('pipeline_span', default=None)
+
+
+def _record_span(span):
+    with _spans_lock:
+        _spans.append(span)
+
+
+def recent_spans(limit=100, stage_name=None):
+    """Most recent finished spans, newest first."""
+    with _spans_lock:
+        spans = list(_spans)
+    spans.reverse()
+    if stage_name:
+        spans = [s for s in spans if s['stage'] == stage_name]
+    return spans[:limit]
+
+
+def observe_stage(name, seconds, outcome='ok', **attrs):
+    """Record a stage whose time was measured by the caller (e.g. summed over chunks)."""
+    parent = _current_span.get()
+    STAGE_SECONDS.observe(seconds, stage=name)
+    STAGE_TOTAL.inc(stage=name, outcome=outcome)
+    _record_span({
+        'stage': name, 'trace': parent['trace'] if parent else uuid.uuid4().hex[:16],
+        'parent': parent['stage'] if parent else None, 'start': time.time() - seconds,
+        'seconds': round(seconds, 6), 'outcome': outcome, 'attrs': attrs,
+    })
+
+
+@contextmanager
+def stage(name, **attrs):
+    """Time a pipeline stage; yields the span dict so callers can add attrs."""
+    parent = _current_span.get()
+    span = {
+        'stage': name, 'trace': parent['trace'] if parent else uuid.uuid4().hex[:16],
+        'parent': parent['stage'] if parent else None, 'start': time.time(),
+        'seconds': None, 'outcome': 'ok', 'attrs': attrs,
+    }
+    token = _current_span.set(span)
+    STAGE_IN_FLIGHT.inc(stage=name)
+    started = time.perf_counter()
+    try:
+        yield span
+    except BaseException as e:
+        span['outcome'] = 'error'
+        span['attrs'] = dict(span['attrs'], error=type(e).__name__)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        _current_span.reset(token)
+        STAGE_IN_FLIGHT.dec(stage=name)
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        STAGE_TOTAL.inc(stage=name, outcome=span['outcome'])
+        span['seconds'] = round(elapsed, 6)
+        _record_span(span)
+
+
+def render():
+    return REGISTRY.render()
+
+
+def submit_with_context(pool, fn, *args, **kwargs):
+    """`pool.submit()` running `fn` in a copy of the caller's context.
+
+    Stages opened by `fn` in the worker thread then become children of the
+    caller's current span. Thread pools only; contexts can't be pickled.
+    """
+    return pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
@@ -0,0 +1,96 @@
+"""Chunked MongoDB bulk writes.
+
+`bulk_write_chunks` submits operations as unordered bulk writes of
+MONGO_BULK_BATCH_SIZE (default 500) and reports per-batch counts and
+write errors instead of raising. `conditional_upserts` runs upserts whose
+filter adds a condition to `_id`, retrying duplicate-key collisions once.
+"""
+
+import os
+
+from pymongo.errors import BulkWriteError
+
+from metrics import stage
+
+
+DEFAULT_BULK_BATCH_SIZE = 500
+DUPLICATE_KEY = 11000
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def bulk_write_chunks(collection, ops, batch_size=None):
+    """Submit `ops` as unordered bulk writes of `batch_size` operations.
+
+    Returns one dict per batch with upserted/modified/errors counts and the
+    write errors (with `index` relative to the full `ops` list).
+    """
+    if batch_size is None:
+        batch_size = _env_int('MONGO_BULK_BATCH_SIZE', DEFAULT_BULK_BATCH_SIZE)
+    batch_size = max(1, batch_size)
+    batches = []
+    for start in range(0, len(ops), batch_size):
+        chunk = ops[start:start + batch_size]
+        stats = {'size': len(chunk), 'upserted': 0, 'modified': 0, 'errors': 0, 'write_errors': []}
+        with stage('mongo_write', collection=getattr(collection, 'name', None), ops=len(chunk)) as span:
+            try:
+                res = collection.bulk_write(chunk, ordered=False)
+                stats['upserted'] = res.upserted_count
+                stats['modified'] = res.modified_count
+            except BulkWriteError as bwe:
+                details = bwe.details or {}
+                stats['upserted'] = details.get('nUpserted', 0)
+                stats['modified'] = details.get('nModified', 0)
+                for err in details.get('writeErrors', []):
+                    stats['write_errors'].append({'index': start + err.get('index', 0), 'errmsg': err.get('errmsg', ''),
+                                                  'code': err.get('code')})
+                stats['errors'] = len(stats['write_errors'])
+                span['outcome'] = 'error'
+            except Exception as e:
+                # Nothing in the batch is known to have been written
+                stats['errors'] = len(chunk)
+                stats['write_errors'] = [{'index': start + i, 'errmsg': str(e)} for i in range(len(chunk))]
+                span['outcome'] = 'error'
+        batches.append(stats)
+    return batches
+
+
+def is_duplicate_key(err):
+    return err.get('code') == DUPLICATE_KEY or 'E11000' in err.get('errmsg', '')
+
+
+def conditional_upserts(collection, ops, batch_size=None):
+    """Run upserts whose filter adds a condition to `_id`.
+
+    Such an upsert fails with E11000 when the document exists but fails
+    the condition, and also when a concurrent writer inserted the same _id
+    first (MongoDB does not retry those, because the filter is not just
+    _id). Collided ops are retried once; those that collide again are
+    reported as `skipped` (indexes into `ops`). Other write errors are in
+    `errors`; `upserted`/`modified` count both attempts.
+    """
+    batches = bulk_write_chunks(collection, ops, batch_size)
+    upserted = sum(b['upserted'] for b in batches)
+    modified = sum(b['modified'] for b in batches)
+    collided, errors = [], []
+    for batch in batches:
+        for err in batch['write_errors']:
+            (collided if is_duplicate_key(err) else errors).append(err)
+    skipped = []
+    if collided:
+        retry_indexes = [err['index'] for err in collided]
+        for batch in bulk_write_chunks(collection, [ops[i] for i in retry_indexes], batch_size):
+            upserted += batch['upserted']
+            modified += batch['modified']
+            for err in batch['write_errors']:
+                err = dict(err, index=retry_indexes[err['index']])
+                if is_duplicate_key(err):
+                    skipped.append(err['index'])
+                else:
+                    errors.append(err)
+    return {'batches': batches, 'upserted': upserted, 'modified': modified, 'skipped': skipped, 'errors': errors}
@@ -0,0 +1,277 @@
+"""Shared asyncio NSE API client with a pool of warmed sessions.
+
+NSE's JSON API only answers requests that carry the cookies set by its
+HTML pages. Warming a session (loading the announcements page) is slow, so
+instead of doing it before every API call this module keeps a small pool
+of `httpx.AsyncClient` sessions whose cookies are reused until they
+expire or NSE answers 401/403, at which point only that session is
+re-warmed.
+
+One client is shared per process (`get_client()`); it runs its own event
+loop in a background thread so synchronous code (Flask handlers, scripts)
+can call it through `NSEClient`'s blocking methods, while async code can
+await the `AsyncNSEClient` directly.
+
+Environment variables:
+- NSE_POOL_SIZE (default 2) number of warmed sessions
+- NSE_COOKIE_TTL (default 300) seconds to trust cookies without an explicit expiry
+- NSE_WARMUP_DELAY (default 1) pause after loading the warm-up page
+- NSE_RATE_PER_SEC (default 3) requests per second across all sessions
+"""
+
+import asyncio
+import os
+import threading
+import time
+
+import httpx
+
+from metrics import stage
+
+
+BASE_URL = "https://www.nseindia.com"
+WARMUP_URL = f"{BASE_URL}/companies-listing/corporate-filings-announcements"
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': '*/*',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Connection': 'keep-alive',
+    'Referer': WARMUP_URL,
+    'X-Requested-With': 'XMLHttpRequest'
+}
+
+
+def _env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+class AsyncRateLimiter:
+    """Token bucket shared by every request made through one client."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or max(1.0, self.rate))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = None
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class NSESession:
+    """One httpx client plus the time its cookies stop being trusted."""
+
+    def __init__(self, client):
+        self.client = client
+        self.expires_at = 0.0
+
+    def expired(self):
+        return time.time() >= self.expires_at
+
+
+class AsyncNSEClient:
+    """Pool of warmed NSE sessions; use `get()` / `get_json()` from a coroutine."""
+
+    def __init__(self, pool_size=None, cookie_ttl=None, warmup_delay=None, timeout=15, transport=None, rate=None):
+        self.pool_size = int(pool_size or _env_float('NSE_POOL_SIZE', 2))
+        self.limiter = AsyncRateLimiter(rate if rate is not None else _env_float('NSE_RATE_PER_SEC', 3))
+        self.cookie_ttl = cookie_ttl if cookie_ttl is not None else _env_float('NSE_COOKIE_TTL', 300)
+        self.warmup_delay = warmup_delay if warmup_delay is not None else _env_float('NSE_WARMUP_DELAY', 1)
+        self.timeout = timeout
+        self._transport = transport
+        self._pool = None
+        self.warmups = 0
+
+    def _new_session(self):
+        kwargs = {'headers': DEFAULT_HEADERS, 'timeout': self.timeout, 'follow_redirects': True}
+        if self._transport is not None:
+            kwargs['transport'] = self._transport
+        return NSESession(httpx.AsyncClient(**kwargs))
+
+    async def _ensure_pool(self):
+        if self._pool is None:
+            self._pool = asyncio.Queue()
+            for _ in range(self.pool_size):
+                self._pool.put_nowait(self._new_session())
+
+    async def warm(self, session):
+        """Load the announcements page to obtain fresh cookies for `session`."""
+        session.client.cookies.clear()
+        await self.limiter.acquire()
+        with stage('cookie_fetch'):
+            resp = await session.client.get(WARMUP_URL, headers={'Accept': 'text/html,*/*'})
+            if resp.status_code != 200:
+                session.expires_at = 0.0
+                raise httpx.HTTPStatusError(f'Cookie warm-up failed: {resp.status_code}', request=resp.request, response=resp)
+        self.warmups += 1
+        now = time.time()
+        expiries = [c.expires for c in session.client.cookies.jar if c.expires]
+        ttl_expiry = now + self.cookie_ttl
+        session.expires_at = min([ttl_expiry] + [e for e in expiries if e > now])
+        if self.warmup_delay:
+            await asyncio.sleep(self.warmup_delay)
+
+    @staticmethod
+    async def _request(session, url, params, stream=False):
+        """One timed API GET; with `stream` only the headers are read."""
+        path = url[len(BASE_URL):] if url.startswith(BASE_URL) else url
+        with stage('nse_api', path=path) as span:
+            request = session.client.build_request('GET', url, params=params)
+            resp = await session.client.send(request, stream=stream)
+            span['attrs']['status'] = resp.status_code
+            if resp.status_code >= 400:
+                span['outcome'] = 'error'
+            return resp
+
+    async def get(self, path, params=None):
+        """GET an NSE API path with a pooled session; returns the httpx.Response.
+
+        Cookies are refreshed when the session's cookies have expired and once
+        more if NSE rejects the request with 401/403.
+        """
+        await self._ensure_pool()
+        session = await self._pool.get()
+        try:
+            if session.expired():
+                await self.warm(session)
+            url = path if path.startswith('http') else f"{BASE_URL}{path}"
+            await self.limiter.acquire()
+            resp = await self._request(session, url, params)
+            if resp.status_code in (401, 403):
+                await self.warm(session)
+                await self.limiter.acquire()
+                resp = await self._request(session, url, params)
+            return resp
+        finally:
+            self._pool.put_nowait(session)
+
+    async def open_stream(self, path, params=None):
+        """Send a GET without reading the body; returns (response, release).
+
+        The pooled session stays checked out until `await release()`, which
+        also closes the response.
+        """
+        await self._ensure_pool()
+        session = await self._pool.get()
+        try:
+            if session.expired():
+                await self.warm(session)
+            url = path if path.startswith('http') else f"{BASE_URL}{path}"
+            await self.limiter.acquire()
+            resp = await self._request(session, url, params, stream=True)
+            if resp.status_code in (401, 403):
+                await resp.aclose()
+                await self.warm(session)
+                await self.limiter.acquire()
+                resp = await self._request(session, url, params, stream=True)
+        except BaseException:
+            self._pool.put_nowait(session)
+            raise
+
+        async def release():
+            try:
+                await resp.aclose()
+            finally:
+                self._pool.put_nowait(session)
+
+        return resp, release
+
+    async def get_json(self, path, params=None):
+        resp = await self.get(path, params=params)
+        resp.raise_for_status()
+        return resp.json()
+
+    async def aclose(self):
+        if self._pool is None:
+            return
+        while not self._pool.empty():
+            session = self._pool.get_nowait()
+            await session.client.aclose()
+        self._pool = None
+
+
+class RawStream:
+    """Blocking iterator over raw body chunks; close() returns the session to the pool."""
+
+    def __init__(self, client, chunks, release):
+        self._client = client
+        self._chunks = chunks
+        self._release = release
+        self._closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._closed:
+            raise StopIteration
+        try:
+            return self._client.run(self._chunks.__anext__())
+        except StopAsyncIteration:
+            self.close()
+            raise StopIteration
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._client.run(self._release())
+
+
+class NSEClient:
+    """Blocking facade over AsyncNSEClient running on a private event loop thread."""
+
+    def __init__(self, **kwargs):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='nse-client', daemon=True)
+        self._thread.start()
+        self.aio = AsyncNSEClient(**kwargs)
+
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the client's loop and wait for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+    def get(self, path, params=None):
+        return self.run(self.aio.get(path, params=params))
+
+    def get_json(self, path, params=None):
+        return self.run(self.aio.get_json(path, params=params))
+
+    def iter_raw(self, path, params=None, chunk_size=65536):
+        """Stream an undecoded response body; returns (response, RawStream)."""
+        resp, release = self.run(self.aio.open_stream(path, params=params))
+        return resp, RawStream(self, resp.aiter_raw(chunk_size), release)
+
+    def close(self):
+        self.run(self.aio.aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide NSEClient, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = NSEClient()
+        return _client
@@ -2,14 +2,24 @@ import requests
 from bs4 import BeautifulSoup
 import pandas as pd
 import time
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
+import argparse
+import asyncio
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import brotli  # For Brotli decompression
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, DuplicateKeyError
+from pymongo import ASCENDING, DESCENDING, MongoClient, UpdateOne
+from pymongo.errors import ConnectionFailure
 import os
 import sys
 
+from announcements import (ANNOUNCEMENT_FIELDS, ANNOUNCEMENT_KEY_COLUMNS, CATEGORY_COLUMNS, announcement_id,
+                           announcements_frame, build_announcement, normalize_announcement,
+                           parse_announcement_time, records_to_frame)
+from metrics import observe_stage, stage, submit_with_context
+from mongo_bulk import bulk_write_chunks, conditional_upserts
+
 # Force UTF-8 encoding for stdout/stderr to prevent UnicodeEncodeError on Windows
 if sys.platform == 'win32':
     import io
@@ -17,10 +27,210 @@ if sys.platform == 'win32':
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
 from urllib.parse import quote_plus
 
+# Shared, cookie-pooled NSE client (needs httpx); without it each fetch
+# falls back to warming this scraper's own requests session.
+try:
+    from nse_client import get_client as get_nse_client
+except ImportError:
+    get_nse_client = None
+
+# Incremental JSON parser for streamed payloads; without it a streamed
+# response is decompressed incrementally but parsed in one piece.
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+
+def decompress_stream(chunks, encoding='', timings=None):
+    """Incrementally decode raw body chunks per Content-Encoding (br, gzip, deflate).
+
+    The decode time is recorded as the `decompress` stage and, when a dict
+    is passed, added to `timings['decompress']`.
+    """
+    encoding = (encoding or '').strip().lower()
+    elapsed = 0.0
+    if encoding == 'br':
+        decoder = brotli.Decompressor()
+        decode = decoder.process
+    elif encoding in ('gzip', 'x-gzip', 'deflate'):
+        decoder = zlib.decompressobj(16 + zlib.MAX_WBITS if encoding != 'deflate' else zlib.MAX_WBITS)
+        decode = decoder.decompress
+    else:
+        decoder = None
+        decode = None
+    for chunk in chunks:
+        if not chunk:
+            continue
+        if decode:
+            started = time.perf_counter()
+            data = decode(chunk)
+            elapsed += time.perf_counter() - started
+        else:
+            data = chunk
+        if data:
+            yield data
+    if decoder is not None and hasattr(decoder, 'flush'):
+        tail = decoder.flush()
+        if tail:
+            yield tail
+    if timings is not None:
+        timings['decompress'] = timings.get('decompress', 0.0) + elapsed
+    if decoder is not None:
+        # Summed over chunks, since the consumer runs between them
+        observe_stage('decompress', elapsed, encoding=encoding)
+
+
+class _ChunkReader:
+    """Minimal file-like wrapper so ijson can pull from a chunk iterator."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = b''
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if size < 0:
+            data, self._buffer = self._buffer, b''
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def _list_events(events, keys=('data', 'records')):
+    """ijson events of the first top-level `keys` list, re-rooted as a top-level array."""
+    key = None
+    for prefix, event, value in events:
+        if key is None:
+            if prefix in keys and event == 'start_array':
+                key = prefix
+                yield '', event, value
+        elif prefix == key:
+            yield '', event, value
+            return
+        elif prefix.startswith(key + '.'):
+            yield prefix[len(key) + 1:], event, value
+
+
+def iter_json_records(chunks):
+    """Yield raw announcement dicts from a decoded JSON byte stream.
+
+    Handles the same shapes as parse_to_dataframe: a top-level list or an
+    object with a `data` (or `records`) list.
+    """
+    chunks = iter(chunks)
+    head = b''
+    for chunk in chunks:
+        head += chunk
+        if head.strip():
+            break
+    first = head.lstrip()[:1]
+    if not first:
+        return
+
+    def rest():
+        yield head
+        yield from chunks
+
+    if ijson is None:
+        data = json.loads(b''.join(rest()).decode('utf-8'))
+        items = (data.get('data') or data.get('records') or []) if isinstance(data, dict) else data
+        yield from items
+        return
+    events = ijson.parse(_ChunkReader(rest()), use_float=True)
+    yield from ijson.items(events if first == b'[' else _list_events(events), 'item')
+
+
+def format_nse_date(day):
+    """Format a date the way the announcements API expects it, e.g. 7-11-2025."""
+    return f"{day.day}-{day.month}-{day.year}"
+
+
+def backfill_chunks(start, end, chunk_days=1):
+    """Split the inclusive date range [start, end] into (from_date, to_date) string pairs."""
+    chunk_days = max(1, int(chunk_days))
+    chunks = []
+    day = start
+    while day <= end:
+        last = min(end, day + timedelta(days=chunk_days - 1))
+        chunks.append((format_nse_date(day), format_nse_date(last)))
+        day = last + timedelta(days=1)
+    return chunks
+
+
+
+# Indexes kept on the scraper's collections (see NSEScraper.ensure_indexes)
+COMPANY_MAP_INDEXES = [
+    [('announcement.Symbol', ASCENDING), ('announcement.announced_at', DESCENDING)],
+    [('announcement.announced_at', DESCENDING)],
+    [('last_updated', DESCENDING)],
+    [('announcement.scraped_at', DESCENDING)],
+]
+LAST_HOUR_INDEXES = [
+    [('latest.scraped_at', ASCENDING)],
+]
+
+
+def latest_announcement_op(company, announcement, now):
+    """Upsert for company-map that only replaces an older announcement.
+
+    The filter matches the company's document only while its stored
+    `announced_at` is missing or not newer, so a backfill of old dates
+    never overwrites the current latest filing. When the stored one is
+    newer the upsert collides with the existing _id (E11000); run these
+    through conditional_upserts().
+    """
+    announced_at = announcement['announced_at']
+    if announced_at is None:
+        condition = {'announcement.announced_at': None}
+    else:
+        condition = {'$or': [{'announcement.announced_at': None},
+                             {'announcement.announced_at': {'$lte': announced_at}}]}
+    return UpdateOne(
+        {'_id': company, **condition},
+        {'$set': {'announcement': announcement, 'last_updated': now}},
+        upsert=True,
+    )
+
+
+def _is_newer(announcement, current):
+    if current is None or current['announced_at'] is None:
+        return True
+    return announcement['announced_at'] is not None and announcement['announced_at'] >= current['announced_at']
+
+
+def ensure_collection_indexes(collection, indexes):
+    """Create `indexes` on `collection` (a no-op for ones that already exist)."""
+    return [collection.create_index(keys) for keys in indexes]
+
+
+def migrate_announcement_times(collection, field='announcement', batch_size=None):
+    """Backfill `<field>.announced_at` from the stored `<field>.Timestamp` string.
+
+    Only documents without the date are touched, so the migration can be
+    re-run. Unparseable timestamps get None and are not retried.
+    Returns the number of documents updated.
+    """
+    cursor = collection.find({f'{field}.announced_at': {'$exists': False}, f'{field}.Timestamp': {'$exists': True}},
+                             {f'{field}.Timestamp': 1})
+    ops = [
+        UpdateOne({'_id': doc['_id']},
+                  {'$set': {f'{field}.announced_at': parse_announcement_time((doc.get(field) or {}).get('Timestamp'))}})
+        for doc in cursor
+    ]
+    batches = bulk_write_chunks(collection, ops, batch_size)
+    return sum(b['modified'] for b in batches)
+
+
 class NSEScraper:
-    def __init__(self, mongo_uri=None, db_password=None):
+    def __init__(self, mongo_uri=None, db_password=None, use_shared_client=True):
         self.base_url = "https://www.nseindia.com"
         self.session = requests.Session()
+        self.nse_client = get_nse_client() if (use_shared_client and get_nse_client) else None
         
         # Updated headers to better mimic browser
         self.headers = {
@@ -62,6 +272,7 @@ class NSEScraper:
             # Use the new collection requested: 'company-map'
             self.collection = self.db['company-map']  # Collection name
             print(f"✓ Using collection: {self.db.name}.{self.collection.name}")
+            self.ensure_indexes()
             
             return True
             
@@ -72,93 +283,123 @@ class NSEScraper:
             print(f"✗ Error setting up MongoDB: {e}")
             return False
     
+    def ensure_indexes(self):
+        """Create the company-map and last_hour indexes the queries below rely on."""
+        if self.collection is None:
+            return False
+        try:
+            ensure_collection_indexes(self.collection, COMPANY_MAP_INDEXES)
+            ensure_collection_indexes(self.db['last_hour'], LAST_HOUR_INDEXES)
+            return True
+        except Exception as e:
+            print(f"✗ Error creating MongoDB indexes: {e}")
+            return False
+
+    def migrate_timestamps(self):
+        """Store announcement times as BSON dates in existing company-map / last_hour documents."""
+        updated = migrate_announcement_times(self.collection, 'announcement')
+        updated_last_hour = migrate_announcement_times(self.db['last_hour'], 'latest')
+        print(f"✓ announced_at backfilled: {updated} company-map, {updated_last_hour} last_hour documents")
+        return updated + updated_last_hour
+
     def record_exists(self, symbol, timestamp):
         """Check if a record already exists in MongoDB"""
         if self.collection is None:
             return False
         
         try:
-            existing = self.collection.find_one({
-                'Symbol': symbol,
-                'Timestamp': timestamp
-            })
+            announced_at = parse_announcement_time(timestamp)
+            query = {'announcement.Symbol': symbol}
+            if announced_at is not None:
+                query['announcement.announced_at'] = announced_at
+            else:
+                query['announcement.Timestamp'] = timestamp
+            existing = self.collection.find_one(query, {'_id': 1})
             return existing is not None
         except Exception as e:
             print(f"✗ Error checking record existence: {e}")
             return False
     
-    def save_to_mongodb(self, df):
-        """Save DataFrame to MongoDB - only insert if not already present"""
+    def save_to_mongodb(self, df, batch_size=None):
+        """Save DataFrame to MongoDB as one latest announcement per company.
+
+        Records are turned into upserts and sent as unordered bulk writes
+        of `batch_size` operations (MONGO_BULK_BATCH_SIZE, default 500). The
+        newest announcement per company wins, both within `df` and against
+        the stored one (see latest_announcement_op). Returns a dict with
+        totals and per-batch counts, or False on failure.
+        """
+        if df is None or df.empty:
+            print("✗ No data to save to MongoDB")
+            return False
+        return self.save_records_to_mongodb(df.to_dict('records'), batch_size)
+
+    def save_records_to_mongodb(self, records, batch_size=None):
+        """Like save_to_mongodb, but consumes any iterable of records.
+
+        Only the latest announcement per company is held in memory, so a
+        generator from iter_corporate_filings can be written without
+        materializing the whole response.
+        """
         if self.collection is None:
             print("✗ MongoDB not configured. Cannot save data.")
             return False
-        
+
         try:
-            if df is None or df.empty:
+            now = datetime.now()
+            by_company = {}
+            count = 0
+            for record in records:
+                count += 1
+                company = record.get('Company') or record.get('sm_name') or record.get('company') or 'Unknown'
+                if not company:
+                    company = 'Unknown'
+                announcement = build_announcement(record, now)
+                if _is_newer(announcement, by_company.get(company)):
+                    by_company[company] = announcement
+
+            if not count:
                 print("✗ No data to save to MongoDB")
                 return False
-            
-            # Convert DataFrame to list of dictionaries
-            records = df.to_dict('records')
+            print(f"\n→ Processing {count} records (company-keyed bulk upserts)...")
 
-            upserted = 0
-            errors = 0
+            # Upsert the single announcement per company, unless the stored one is newer
+            ops = [latest_announcement_op(company, announcement, now)
+                   for company, announcement in by_company.items()]
+            companies = list(by_company)
+            written = conditional_upserts(self.collection, ops, batch_size)
+            batches = written['batches']
 
-            print(f"\n→ Processing {len(records)} records (company-keyed upserts)...")
+            for err in written['errors']:
+                print(f"✗ Error upserting announcement for company '{companies[err['index']]}': {err['errmsg']}")
 
-            for record in records:
-                try:
-                    company = record.get('Company') or record.get('sm_name') or record.get('company') or 'Unknown'
-                    if not company:
-                        company = 'Unknown'
-
-                    announcement = {
-                        'Symbol': record.get('Symbol') or record.get('symbol', ''),
-                        'Subject': record.get('Subject') or record.get('desc', ''),
-                        'Description': record.get('Description') or record.get('attchmntText', ''),
-                        'Attachment_URL': record.get('Attachment_URL') or record.get('attchmntFile', ''),
-                        'File_Size': record.get('File_Size') or record.get('sm_size', ''),
-                        'Timestamp': record.get('Timestamp') or record.get('an_dt', ''),
-                        'XBRL_Link': record.get('XBRL_Link') or record.get('xbrl', ''),
-                        'scraped_at': datetime.now()
-                    }
-
-                    # Upsert: replace the single announcement for the company
-                    # Store it under 'announcement' so each company has only one announcement
-                    res = self.collection.update_one(
-                        {'_id': company},
-                        {'$set': {'announcement': announcement, 'last_updated': datetime.now()}},
-                        upsert=True
-                    )
-
-                    if getattr(res, 'modified_count', 0) > 0 or getattr(res, 'upserted_id', None):
-                        upserted += 1
-
-                except DuplicateKeyError as dk:
-                    # A duplicate key error here most likely comes from existing unique
-                    # constraints on other indexes. Log and continue.
-                    errors += 1
-                    print(f"✗ DuplicateKeyError upserting for '{company}': {dk}")
-                except Exception as e:
-                    errors += 1
-                    print(f"✗ Error upserting announcement for company '{company}': {e}")
+            result = {
+                'records': count,
+                'upserted': written['upserted'],
+                'modified': written['modified'],
+                # Companies whose stored announcement is newer
+                'kept_newer': len(written['skipped']),
+                'errors': len(written['errors']),
+                'batches': [{k: b[k] for k in ('size', 'upserted', 'modified', 'errors')} for b in batches],
+            }
 
             print(f"\n{'='*80}")
             print("MongoDB Save Summary (company-keyed):")
             print(f"{'='*80}")
-            print(f"✓ Upserted/Updated: {upserted}")
-            if errors > 0:
-                print(f"✗ Errors: {errors}")
+            print(f"✓ Upserted: {result['upserted']}, Updated: {result['modified']}, "
+                  f"kept newer: {result['kept_newer']} ({len(batches)} batch(es))")
+            if result['errors'] > 0:
+                print(f"✗ Errors: {result['errors']}")
             print(f"{'='*80}\n")
 
-            return True
+            return result
             
         except Exception as e:
             print(f"✗ Error saving to MongoDB: {e}")
             return False
     
-    def get_records_from_mongodb(self, symbol=None, limit=10):
-        """Retrieve records from MongoDB"""
+    def get_records_from_mongodb(self, symbol=None, limit=10, since=None, until=None):
+        """Retrieve the latest announcements, newest first (optionally in [since, until))."""
         if self.collection is None:
             print("✗ MongoDB not configured")
             return None
@@ -166,15 +407,19 @@ class NSEScraper:
         try:
             query = {}
             if symbol:
-                query['Symbol'] = symbol
+                query['announcement.Symbol'] = symbol
+            if since or until:
+                time_range = {}
+                if since:
+                    time_range['$gte'] = since
+                if until:
+                    time_range['$lt'] = until
+                query['announcement.announced_at'] = time_range
             
-            records = list(self.collection.find(query).sort('Timestamp', -1).limit(limit))
+            docs = self.collection.find(query).sort('announcement.announced_at', DESCENDING).limit(limit)
+            records = [dict(doc['announcement'], Company=doc['_id']) for doc in docs if doc.get('announcement')]
             
             if records:
-                # Remove MongoDB _id for display
-                for record in records:
-                    record.pop('_id', None)
-                
                 df = pd.DataFrame(records)
                 return df
             else:
@@ -191,15 +436,149 @@ class NSEScraper:
             self.mongo_client.close()
             print("✓ MongoDB connection closed")
         
+    def load_scrape_state(self, index):
+        """Return the stored high-water mark for `index` as (datetime or None, {id: time})."""
+        if self.db is None:
+            return None, {}
+        try:
+            state = self.db['scrape_state'].find_one({'_id': index}) or {}
+        except Exception as e:
+            print(f"✗ Error reading scrape state: {e}")
+            return None, {}
+        return state.get('high_water_mark'), dict(state.get('seen_ids') or {})
+
+    def save_scrape_state(self, index, high_water_mark, seen_ids):
+        """Persist the high-water mark and the recently seen announcement ids."""
+        if self.db is None:
+            return False
+        try:
+            self.db['scrape_state'].update_one(
+                {'_id': index},
+                {'$set': {
+                    'high_water_mark': high_water_mark,
+                    'seen_ids': seen_ids,
+                    'updated_at': datetime.now(),
+                }},
+                upsert=True
+            )
+            return True
+        except Exception as e:
+            print(f"✗ Error saving scrape state: {e}")
+            return False
+
+    def filter_new_records(self, df, index="equities", lookback_minutes=10):
+        """Keep only announcements not seen by a previous incremental run.
+
+        An announcement is new when its id is not in the stored seen set and
+        its time is later than the high-water mark minus `lookback_minutes`
+        (NSE sometimes publishes a filing with a slightly older timestamp).
+        Returns (new_df, state) where state is passed to save_scrape_state
+        once the delta has been written.
+        """
+        high_water_mark, seen_ids = self.load_scrape_state(index)
+        lookback = timedelta(minutes=lookback_minutes)
+        cutoff = high_water_mark - lookback if high_water_mark else None
+
+        keep = []
+        current = set()
+        for rec in df.to_dict('records'):
+            rid = announcement_id(rec)
+            current.add(rid)
+            ts = parse_announcement_time(rec.get('Timestamp'))
+            keep.append(rid not in seen_ids and (cutoff is None or ts is None or ts > cutoff))
+            if ts is not None and (high_water_mark is None or ts > high_water_mark):
+                high_water_mark = ts
+            seen_ids[rid] = ts
+        new_df = df[keep].reset_index(drop=True)
+
+        # Only remember ids that can still fall inside the lookback window.
+        # Undated ids can't age out, so keep them only while NSE still returns them.
+        new_cutoff = high_water_mark - lookback if high_water_mark is not None else None
+        seen_ids = {
+            rid: ts for rid, ts in seen_ids.items()
+            if (rid in current if ts is None else new_cutoff is None or ts > new_cutoff)
+        }
+
+        print(f"→ Incremental: {len(new_df)} new of {len(df)} announcements (high-water mark: {high_water_mark})")
+        return new_df, (index, high_water_mark, seen_ids)
+
+    def refresh_last_hour(self, df):
+        """Replace the transient 'last_hour' collection with this scrape's announcements."""
+        last_coll_name = 'last_hour'
+        # Drop existing last_hour collection if present
+        if last_coll_name in self.db.list_collection_names():
+            self.db.drop_collection(last_coll_name)
+            print(f"→ Dropped existing transient collection: {last_coll_name}")
+
+        last_coll = self.db[last_coll_name]
+
+        records = df.to_dict('records')
+        docs = []
+        unknown_idx = 0
+        for rec in records:
+            company = rec.get('Company') or rec.get('sm_name') or 'Unknown'
+            if not company:
+                company = f'Unknown_{unknown_idx}'
+                unknown_idx += 1
+
+            docs.append({'_id': company, 'latest': build_announcement(rec)})
+
+        if docs:
+            # Bulk insert (collection is new after drop)
+            with stage('mongo_write', collection=last_coll_name, ops=len(docs)):
+                last_coll.insert_many(docs)
+            ensure_collection_indexes(last_coll, LAST_HOUR_INDEXES)
+            print(f"✓ Inserted {len(docs)} documents into transient collection: {last_coll_name}")
+        else:
+            print(f"→ No docs to insert into {last_coll_name}")
+
+    def update_last_hour(self, df):
+        """Upsert only the new announcements into 'last_hour' (incremental mode).
+
+        Each company's `latest` is replaced by its newest new announcement,
+        which also clears the summarizer's processed flags. Documents
+        scraped before today are removed so the collection keeps the same
+        "today's announcements" scope as a full refresh.
+        """
+        last_coll = self.db['last_hour']
+        now = datetime.now()
+
+        newest = {}
+        for rec in df.to_dict('records'):
+            company = rec.get('Company') or rec.get('sm_name') or 'Unknown'
+            ts = parse_announcement_time(rec.get('Timestamp'))
+            current = newest.get(company)
+            if current is None or (ts and (current[0] is None or ts > current[0])):
+                newest[company] = (ts, rec)
+
+        ops = [
+            UpdateOne({'_id': company}, {'$set': {'latest': build_announcement(rec, now)}}, upsert=True)
+            for company, (_, rec) in newest.items()
+        ]
+        if ops:
+            with stage('mongo_write', collection='last_hour', ops=len(ops)):
+                res = last_coll.bulk_write(ops, ordered=False)
+            print(f"✓ last_hour delta: {res.upserted_count} inserted, {res.modified_count} updated")
+        else:
+            print("→ No new announcements for last_hour")
+
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        res = last_coll.delete_many({'latest.scraped_at': {'$lt': midnight}})
+        if res.deleted_count:
+            print(f"→ Removed {res.deleted_count} documents from previous days in last_hour")
+
     def get_cookies(self):
         """Get cookies by visiting the announcements page first"""
         try:
             url = f"{self.base_url}/companies-listing/corporate-filings-announcements"
-            response = self.session.get(
-                url,
-                headers=self.headers,
-                timeout=10
-            )
+            with stage('cookie_fetch') as span:
+                response = self.session.get(
+                    url,
+                    headers=self.headers,
+                    timeout=10
+                )
+                if response.status_code != 200:
+                    span['outcome'] = 'error'
             
             if response.status_code == 200:
                 print("✓ Cookies obtained successfully")
@@ -211,15 +590,54 @@ class NSEScraper:
             print(f"✗ Error getting cookies: {e}")
             return False
     
-    def fetch_corporate_filings(self, index="equities", from_date=None, to_date=None, symbol=None):
-        """Fetch corporate filings from NSE API"""
-        
+    def api_get(self, path, params=None, timeout=15):
+        """GET an NSE API path, via the shared client when available.
+
+        The shared client reuses warmed cookies across calls; the fallback
+        warms this scraper's requests session before every call.
+        """
+        if self.nse_client is not None:
+            return self.nse_client.get(path, params=params)
         if not self.get_cookies():
             return None
-        
         time.sleep(3)
+        with stage('nse_api', path=path) as span:
+            response = self.session.get(
+                f"{self.base_url}{path}",
+                headers=self.headers,
+                params=params,
+                timeout=timeout
+            )
+            if response.status_code >= 400:
+                span['outcome'] = 'error'
+        return response
+
+    def fetch_trading_holidays(self, segment='CM'):
+        """Return the set of NSE trading holidays (dates) for `segment` (CM = equities)."""
+        try:
+            response = self.api_get("/api/holiday-master", params={'type': 'trading'})
+            if response is None:
+                return None
+            if response.status_code != 200:
+                print(f"✗ Failed to fetch holidays: {response.status_code}")
+                return None
+            holidays = set()
+            for item in response.json().get(segment, []):
+                try:
+                    holidays.add(datetime.strptime(item.get('tradingDate', ''), '%d-%b-%Y').date())
+                except ValueError:
+                    continue
+            print(f"✓ Loaded {len(holidays)} NSE trading holidays")
+            return holidays
+        except Exception as e:
+            print(f"✗ Error fetching holidays: {e}")
+            return None
+
+    def fetch_corporate_filings(self, index="equities", from_date=None, to_date=None, symbol=None):
+        """Fetch corporate filings from NSE API"""
         
-        api_url = f"{self.base_url}/api/corporate-announcements"
+        api_path = "/api/corporate-announcements"
+        api_url = f"{self.base_url}{api_path}"
         
         params = {
             'index': index
@@ -236,12 +654,9 @@ class NSEScraper:
             print(f"→ Requesting: {api_url}")
             print(f"→ Params: {params}")
             
-            response = self.session.get(
-                api_url,
-                headers=self.headers,
-                params=params,
-                timeout=15
-            )
+            response = self.api_get(api_path, params=params)
+            if response is None:
+                return None
             
             print(f"→ Response status: {response.status_code}")
             
@@ -250,10 +665,12 @@ class NSEScraper:
                     # Handle Brotli compression manually if needed
                     content_encoding = response.headers.get('Content-Encoding', '')
                     
-                    if content_encoding == 'br' and response.content[:2] != b'{[':
+                    # (httpx responses are already decoded)
+                    if self.nse_client is None and content_encoding == 'br' and response.content[:2] != b'{[':
                         # Manually decompress Brotli
                         try:
-                            decompressed = brotli.decompress(response.content)
+                            with stage('decompress', encoding='br'):
+                                decompressed = brotli.decompress(response.content)
                             data = json.loads(decompressed.decode('utf-8'))
                             print(f"✓ Brotli decompression successful")
                         except:
@@ -283,8 +700,216 @@ class NSEScraper:
             print(f"✗ Error fetching data: {e}")
             return None
     
+    def iter_corporate_filings(self, index="equities", from_date=None, to_date=None, symbol=None, chunk_size=65536):
+        """Stream normalized announcement records without buffering the response.
+
+        The raw body is decompressed chunk by chunk and fed to an incremental
+        JSON parser, so memory stays flat for multi-week ranges. Yields the
+        same dicts parse_to_dataframe puts in its rows; raises on HTTP errors.
+        """
+        api_path = "/api/corporate-announcements"
+        params = {'index': index}
+        if from_date:
+            params['from_date'] = from_date
+        if to_date:
+            params['to_date'] = to_date
+        if symbol:
+            params['symbol'] = symbol
+
+        print(f"→ Streaming: {self.base_url}{api_path} {params}")
+        if self.nse_client is not None:
+            response, chunks = self.nse_client.iter_raw(api_path, params=params, chunk_size=chunk_size)
+            close = chunks.close
+            if response.status_code != 200:
+                close()
+                raise requests.HTTPError(f"Status code {response.status_code}")
+        else:
+            if not self.get_cookies():
+                raise requests.ConnectionError("Could not obtain NSE cookies")
+            time.sleep(3)
+            with stage('nse_api', path=api_path):
+                response = self.session.get(f"{self.base_url}{api_path}", headers=self.headers,
+                                            params=params, timeout=15, stream=True)
+            close = response.close
+            if response.status_code != 200:
+                close()
+                raise requests.HTTPError(f"Status code {response.status_code}")
+            chunks = response.raw.stream(chunk_size, decode_content=False)
+
+        encoding = response.headers.get('Content-Encoding', '')
+        timings = {'read': 0.0, 'decompress': 0.0}
+
+        def timed_chunks():
+            chunk_iter = iter(chunks)
+            while True:
+                started = time.perf_counter()
+                chunk = next(chunk_iter, None)
+                timings['read'] += time.perf_counter() - started
+                if chunk is None:
+                    return
+                yield chunk
+
+        count = 0
+        pull_seconds = 0.0
+        records = iter_json_records(decompress_stream(timed_chunks(), encoding, timings))
+        try:
+            while True:
+                started = time.perf_counter()
+                item = next(records, None)
+                if item is None:
+                    break
+                record = normalize_announcement(item)
+                pull_seconds += time.perf_counter() - started
+                count += 1
+                yield record
+        finally:
+            close()
+        # Pulling a record also reads and decompresses the chunks behind it
+        observe_stage('nse_body_read', timings['read'], streamed=True)
+        observe_stage('parse', max(0.0, pull_seconds - timings['read'] - timings['decompress']),
+                      records=count, streamed=True)
+        print(f"✓ Streamed {count} records")
+
+    @staticmethod
+    def _query_params(query):
+        """Normalize a batch query (dict or (index, symbol, from_date, to_date) tuple)."""
+        if isinstance(query, dict):
+            query = dict(query)
+        else:
+            keys = ('index', 'symbol', 'from_date', 'to_date')
+            query = dict(zip(keys, query))
+        query.setdefault('index', 'equities')
+        return query
+
+    async def _gather_announcements(self, queries, concurrency):
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def fetch(query):
+            params = {k: v for k, v in query.items() if v}
+            async with semaphore:
+                return await self.nse_client.aio.get_json("/api/corporate-announcements", params=params)
+
+        return await asyncio.gather(*(fetch(q) for q in queries), return_exceptions=True)
+
+    def fetch_many(self, queries, concurrency=4):
+        """Fetch several (index, symbol, from_date, to_date) queries concurrently.
+
+        Queries share the NSE client's session pool and rate limiter. Results
+        are merged into one DataFrame with the `parse_to_dataframe` columns,
+        de-duplicated by announcement (symbol, time, subject, attachment).
+        Returns None when no query produced records.
+        """
+        queries = [self._query_params(q) for q in queries]
+        if not queries:
+            return None
+        payloads = self._fetch_payloads(queries, concurrency)
+        frames = [self.parse_to_dataframe(p) for p in payloads if p is not None]
+        return self._merge_frames(frames)
+
+    def _fetch_payloads(self, queries, concurrency):
+        """Fetch normalized queries; returns one JSON payload per query (None on failure)."""
+        print(f"→ Fetching {len(queries)} queries (concurrency {concurrency})")
+        if self.nse_client is None:
+            return [self.fetch_corporate_filings(**q) for q in queries]
+        payloads = []
+        results = self.nse_client.run(self._gather_announcements(queries, concurrency))
+        for query, result in zip(queries, results):
+            if isinstance(result, Exception):
+                print(f"✗ Query {query} failed: {result}")
+                result = None
+            payloads.append(result)
+        return payloads
+
+    @staticmethod
+    def _merge_frames(frames):
+        """Concatenate parsed frames and drop duplicate announcements."""
+        frames = [df for df in frames if df is not None and not df.empty]
+        if not frames:
+            return None
+        merged = pd.concat(frames, ignore_index=True)
+        # concat falls back to object dtype when categories differ
+        for col in CATEGORY_COLUMNS:
+            merged[col] = merged[col].astype('category')
+        merged = merged.drop_duplicates(subset=ANNOUNCEMENT_KEY_COLUMNS).reset_index(drop=True)
+        print(f"✓ {len(merged)} unique announcements from {len(frames)} queries")
+        return merged
+
+    def _backfill_chunk(self, index, chunk):
+        """Stream one (from_date, to_date) chunk into company-map; True if it is done."""
+        from_date, to_date = chunk
+        seen = [0]
+        finished = [False]
+
+        def counted(records):
+            for record in records:
+                seen[0] += 1
+                yield record
+            finished[0] = True
+
+        try:
+            result = self.save_records_to_mongodb(
+                counted(self.iter_corporate_filings(index=index, from_date=from_date, to_date=to_date)))
+        except Exception as e:
+            print(f"✗ Backfill chunk {from_date}..{to_date} failed: {e}")
+            return False, 0
+        if result is False:
+            # save_records_to_mongodb returns False for an empty chunk (e.g. a
+            # holiday), but also when the stream itself failed mid-way
+            return finished[0] and seen[0] == 0, 0
+        return result['errors'] == 0, result['records']
+
+    def backfill(self, start, end, index="equities", chunk_days=1, concurrency=4, resume=True):
+        """Scrape announcements between `start` and `end` (dates) into company-map.
+
+        The range is split into `chunk_days` chunks. Up to `concurrency`
+        chunks are streamed at a time (iter_corporate_filings ->
+        save_records_to_mongodb), and each chunk is checkpointed in
+        `scrape_state` (`_id: 'backfill:<index>'`) once it is written. With
+        `resume`, chunks finished by an earlier run are skipped. Old
+        announcements never replace a newer stored one. Returns a summary dict.
+        """
+        chunks = backfill_chunks(start, end, chunk_days)
+        state_id = f'backfill:{index}'
+        done = set()
+        if resume and self.db is not None:
+            try:
+                done = set((self.db['scrape_state'].find_one({'_id': state_id}) or {}).get('done_chunks') or [])
+            except Exception as e:
+                print(f"✗ Error reading backfill checkpoint: {e}")
+        pending = [c for c in chunks if c[0] not in done]
+        print(f"→ Backfill {index}: {len(chunks)} chunks, {len(chunks) - len(pending)} already done")
+
+        summary = {'chunks': len(chunks), 'skipped': len(chunks) - len(pending),
+                   'fetched': 0, 'failed': [], 'records': 0}
+        # The requests fallback session is not shared between threads
+        workers = max(1, concurrency) if self.nse_client is not None else 1
+        with stage('backfill', chunks=len(pending)), ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {submit_with_context(pool, self._backfill_chunk, index, c): c for c in pending}
+            for future in as_completed(futures):
+                chunk = futures[future]
+                ok, records = future.result()
+                if not ok:
+                    # Left unchecked so a resumed run retries it
+                    summary['failed'].append(chunk[0])
+                    continue
+                summary['fetched'] += 1
+                summary['records'] += records
+                if self.db is not None:
+                    try:
+                        self.db['scrape_state'].update_one(
+                            {'_id': state_id},
+                            {'$addToSet': {'done_chunks': chunk[0]}, '$set': {'updated_at': datetime.now()}},
+                            upsert=True
+                        )
+                    except Exception as e:
+                        print(f"✗ Error saving backfill checkpoint: {e}")
+
+        print(f"✓ Backfill finished: {summary['fetched']} chunks, {summary['records']} announcements, "
+              f"{len(summary['failed'])} failed")
+        return summary
+
     def parse_to_dataframe(self, data):
-        """Convert JSON data to pandas DataFrame"""
+        """Convert JSON data to a typed pandas DataFrame (see announcements_frame)"""
         if not data:
             print("✗ No data available in response")
             return None
@@ -310,28 +935,53 @@ class NSEScraper:
             print("✗ Could not find records in response")
             return None
         
-        records = []
-        for item in records_list:
-            record = {
-                'Symbol': item.get('symbol', ''),
-                'Company': item.get('sm_name', ''),
-                'Subject': item.get('desc', ''),
-                'Description': item.get('attchmntText', ''),
-                'Attachment_URL': item.get('attchmntFile', ''),
-                'File_Size': item.get('sm_size', ''),
-                'Timestamp': item.get('an_dt', ''),
-                'XBRL_Link': item.get('xbrl', '')
+        # Build each column directly from the raw items, then type it
+        with stage('parse', records=len(records_list)):
+            columns = {
+                col: [item.get(field, '') for item in records_list]
+                for col, field in ANNOUNCEMENT_FIELDS.items()
             }
-            records.append(record)
-        
-        df = pd.DataFrame(records)
-        return df
+            return announcements_frame(columns)
 
 
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Scrape NSE corporate announcements into MongoDB')
+    parser.add_argument('--index', default='equities', help='NSE index to scrape (default: equities)')
+    parser.add_argument('--incremental', action='store_true',
+                        default=os.environ.get('SCRAPE_INCREMENTAL', '').lower() in ('1', 'true', 'yes'),
+                        help='Only write announcements newer than the last run (or set SCRAPE_INCREMENTAL=1)')
+    parser.add_argument('--lookback-minutes', type=int, default=10,
+                        help='Incremental mode: re-check this many minutes before the high-water mark')
+    parser.add_argument('--from-date', help='Backfill from this date (YYYY-MM-DD) instead of scraping today')
+    parser.add_argument('--to-date', help='Backfill up to this date (YYYY-MM-DD, default: today)')
+    parser.add_argument('--chunk-days', type=int, default=1, help='Backfill: days per request (default: 1, use 7 for weeks)')
+    parser.add_argument('--concurrency', type=int, default=4, help='Backfill: chunks fetched in parallel (default: 4)')
+    parser.add_argument('--restart', action='store_true', help='Backfill: ignore checkpoints from earlier runs')
+    parser.add_argument('--archive', action='store_true',
+                        default=os.environ.get('SCRAPE_ARCHIVE', '').lower() in ('1', 'true', 'yes'),
+                        help='Append each scrape to the Parquet archive (or set SCRAPE_ARCHIVE=1)')
+    parser.add_argument('--migrate-timestamps', action='store_true',
+                        help='Backfill announced_at dates on existing documents, then exit')
+    args = parser.parse_args(argv)
+
+    backfill_range = None
+    if args.from_date:
+        try:
+            start = datetime.strptime(args.from_date, '%Y-%m-%d').date()
+            end = datetime.strptime(args.to_date, '%Y-%m-%d').date() if args.to_date else datetime.now().date()
+        except ValueError as e:
+            parser.error(f'invalid backfill date: {e}')
+        if end < start:
+            parser.error('--to-date must not be before --from-date')
+        backfill_range = (start, end)
+
     print("="*80)
     print("NSE Corporate Filings Scraper - Hourly Run")
     print(f"Run Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    if backfill_range:
+        print(f"Mode: backfill {backfill_range[0]} to {backfill_range[1]}")
+    elif args.incremental:
+        print("Mode: incremental")
     print("="*80 + "\n")
     
     # MongoDB credentials - password directly in URI
@@ -352,30 +1002,43 @@ def main():
         print(f"✓ Using collection: {scraper.db.name}.{scraper.collection.name}")
     except Exception as e:
         print(f"✗ MongoDB connection failed: {e}")
-        return None
+        sys.exit(1)
     
     if scraper.collection is None:
         print("✗ MongoDB connection failed. Cannot proceed.")
-        return None
+        sys.exit(1)
+
+    scraper.ensure_indexes()
+    if args.migrate_timestamps:
+        updated = scraper.migrate_timestamps()
+        scraper.close_mongodb_connection()
+        return updated
+
+    if backfill_range:
+        summary = scraper.backfill(*backfill_range, index=args.index, chunk_days=args.chunk_days,
+                                   concurrency=args.concurrency, resume=not args.restart)
+        scraper.close_mongodb_connection()
+        if summary['failed']:
+            print(f"✗ Chunks to retry: {', '.join(summary['failed'])}")
+            sys.exit(1)
+        return summary
     
     # Get today's date (non-zero-padded day-month-year), e.g. 7-11-2025
-    now = datetime.now()
-    today = f"{now.day}-{now.month}-{now.year}"
+    today = format_nse_date(datetime.now())
     
     print(f"Fetching corporate announcements for {today}...")
     print("-" * 80)
     
-    # Fetch data
-    data = scraper.fetch_corporate_filings(
-        index="equities",
-        from_date=today,
-        to_date=today
-    )
-    
-    if data:
-        df = scraper.parse_to_dataframe(data)
-        
-        if df is not None and not df.empty:
+    # Stream the response straight into DataFrame columns, without
+    # buffering the raw body or the decoded JSON
+    df = None
+    try:
+        df = records_to_frame(scraper.iter_corporate_filings(index=args.index, from_date=today, to_date=today))
+    except Exception as e:
+        print(f"✗ Error fetching data: {e}")
+
+    if df is not None:
+        if not df.empty:
             print("\n" + "="*80)
             print(f"✓ SUCCESS: Found {len(df)} announcements from NSE")
             print("="*80 + "\n")
@@ -387,54 +1050,47 @@ def main():
             print(df[display_cols].head(5).to_string(index=False))
             print()
 
+            if args.archive:
+                try:
+                    from filings_archive import FilingsArchive
+                    res = FilingsArchive().append(df)
+                    print(f"✓ Archived {res['written']} announcements ({res['duplicates']} already archived)")
+                except Exception as e:
+                    print(f"✗ Failed to archive scrape: {e}")
+
+            state = None
+            if args.incremental:
+                df, state = scraper.filter_new_records(df, index=args.index, lookback_minutes=args.lookback_minutes)
+
             # Create/replace a transient collection 'last_hour' that contains
-            # the current scrape's latest announcement per company. We drop the
-            # old collection and insert company-keyed documents for this run.
+            # the current scrape's latest announcement per company. In
+            # incremental mode only the new announcements are upserted.
             try:
-                last_coll_name = 'last_hour'
-                # Drop existing last_hour collection if present
-                if last_coll_name in scraper.db.list_collection_names():
-                    scraper.db.drop_collection(last_coll_name)
-                    print(f"→ Dropped existing transient collection: {last_coll_name}")
-
-                last_coll = scraper.db[last_coll_name]
-
-                records = df.to_dict('records')
-                docs = []
-                unknown_idx = 0
-                for rec in records:
-                    company = rec.get('Company') or rec.get('sm_name') or 'Unknown'
-                    if not company:
-                        company = f'Unknown_{unknown_idx}'
-                        unknown_idx += 1
-
-                    announcement = {
-                        'Symbol': rec.get('Symbol') or rec.get('symbol', ''),
-                        'Subject': rec.get('Subject') or rec.get('desc', ''),
-                        'Description': rec.get('Description') or rec.get('attchmntText', ''),
-                        'Attachment_URL': rec.get('Attachment_URL') or rec.get('attchmntFile', ''),
-                        'File_Size': rec.get('File_Size') or rec.get('sm_size', ''),
-                        'Timestamp': rec.get('Timestamp') or rec.get('an_dt', ''),
-                        'XBRL_Link': rec.get('XBRL_Link') or rec.get('xbrl', ''),
-                        'scraped_at': datetime.now()
-                    }
-
-                    docs.append({'_id': company, 'latest': announcement})
-
-                if docs:
-                    # Bulk insert (collection is new after drop)
-                    last_coll.insert_many(docs)
-                    print(f"✓ Inserted {len(docs)} documents into transient collection: {last_coll_name}")
+                if args.incremental:
+                    scraper.update_last_hour(df)
                 else:
-                    print(f"→ No docs to insert into {last_coll_name}")
+                    scraper.refresh_last_hour(df)
             except Exception as e:
                 print(f"✗ Failed to refresh transient collection 'last_hour': {e}")
+                state = None
 
             # Save to MongoDB (only new records) into the main company-map style collection
-            scraper.save_to_mongodb(df)
+            saved_ok = True
+            if not df.empty:
+                result = scraper.save_to_mongodb(df)
+                saved_ok = result is not False and result['errors'] == 0
+
+            # Advance the high-water mark only after the delta was written
+            if state is not None and saved_ok:
+                scraper.save_scrape_state(*state)
             
             # Close MongoDB connection
             scraper.close_mongodb_connection()
+
+            if not saved_ok:
+                # The mark was not advanced, so the next run emits these again
+                print("✗ company-map write failed; high-water mark not advanced")
+                sys.exit(1)
             
             print(f"✓ Scraping completed at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
             
@@ -448,7 +1104,8 @@ def main():
         print("✗ FAILED: Could not fetch data from NSE")
         print("="*80)
         scraper.close_mongodb_connection()
-        return None
+        # Non-zero exit so schedulers/job runners can back off
+        sys.exit(1)
 
 
 if __name__ == "__main__":
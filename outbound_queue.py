@@ -0,0 +1,391 @@
+"""Durable outbound WhatsApp message queue.
+
+Messages are enqueued under a key built from (filing id, phone, template)
+before anything is sent, so a crashed or re-run broadcast never messages
+the same person twice about the same filing: enqueueing an existing key
+is a no-op, and `drain()` only sends messages still pending.
+
+States: pending -> leased -> sent | failed. A worker claims a batch by
+leasing it for OUTBOUND_LEASE_SECONDS; if the worker dies the lease
+expires and another worker (or the next run) picks the messages up again.
+Leases make it safe to run several sender processes against one queue.
+Delivery is at-least-once: a message sent just before a crash, but not
+yet marked sent, is retried once its lease expires. `drain()` marks each
+message as soon as its send finishes and renews the leases of the rest of
+the batch every third of OUTBOUND_LEASE_SECONDS, so slow retries don't
+let another worker reclaim messages still in flight.
+
+A message may carry a `digest` item ({group, symbol, summary, name}).
+`drain()` can then compose the claimed members of one group into a
+single message (see digest.py). Each (filing, phone) is still its own
+queue entry, so a filing is never sent twice, whether it went out alone
+or inside a digest. A message may also carry a `not_before` time (a
+digest's window end); it is not claimed until then, so filings queued by
+separate runs within one window are sent together.
+
+`enqueue_many()` raises EnqueueError when any message could not be
+written, so a caller never reports success for messages that were not
+queued. Claims take the oldest messages first, one batch per round trip.
+
+Backends: the `outbound_messages` MongoDB collection, or a local SQLite
+file (OUTBOUND_QUEUE_PATH, default .cache/outbound.sqlite) without a
+database.
+
+Environment variables:
+- OUTBOUND_LEASE_SECONDS (default 120)
+- OUTBOUND_MAX_ATTEMPTS (default 3) claims before a message is marked failed
+"""
+
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from pymongo import UpdateOne
+
+from mongo_bulk import bulk_write_chunks
+
+
+DEFAULT_QUEUE_PATH = os.path.join('.cache', 'outbound.sqlite')
+COLLECTION_NAME = 'outbound_messages'
+
+
+def _env_number(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+class EnqueueError(Exception):
+    """Some messages could not be queued; nothing about them was sent."""
+
+    def __init__(self, errors):
+        super().__init__(f'{len(errors)} message(s) not queued: {errors[0]}')
+        self.errors = errors
+
+
+def message_key(filing_id, phone, template):
+    """Idempotency key for one (filing, recipient, template) message."""
+    raw = '\x1f'.join(str(p) for p in (filing_id, phone, template))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _unpack(message):
+    """(filing_id, phone, template, payload[, digest[, not_before]]) -> 6-tuple."""
+    filing_id, phone, template, payload, *rest = message
+    rest += [None] * (2 - len(rest))
+    return (filing_id, phone, template, payload, *rest[:2])
+
+
+def _utc(when):
+    """Naive UTC datetime for a local naive (or aware) datetime; None stays None."""
+    if when is None:
+        return None
+    return when.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+class MongoOutboundQueue:
+    """Outbound queue stored in a MongoDB collection."""
+
+    def __init__(self, collection, lease_seconds=None, max_attempts=None):
+        self.collection = collection
+        self.lease_seconds = lease_seconds or _env_number('OUTBOUND_LEASE_SECONDS', 120)
+        self.max_attempts = int(max_attempts or _env_number('OUTBOUND_MAX_ATTEMPTS', 3))
+
+    def ensure_indexes(self):
+        self.collection.create_index([('state', 1), ('lease_until', 1)])
+        self.collection.create_index([('state', 1), ('created_at', 1)])
+
+    def enqueue_many(self, messages):
+        """Insert (filing_id, phone, template, payload[, digest[, not_before]]) tuples; existing keys are left alone.
+
+        Returns the number of newly queued messages. Raises EnqueueError if
+        any write failed; the upserts are idempotent, so the caller can
+        simply enqueue the same messages again.
+        """
+        now = datetime.utcnow()
+        ops = [
+            UpdateOne(
+                {'_id': message_key(filing_id, phone, template)},
+                {'$setOnInsert': {
+                    'filing_id': filing_id, 'phone': phone, 'template': template, 'payload': payload,
+                    'digest': digest, 'not_before': _utc(not_before), 'state': 'pending', 'attempts': 0,
+                    'created_at': now, 'lease_until': None,
+                }},
+                upsert=True,
+            )
+            for filing_id, phone, template, payload, digest, not_before in map(_unpack, messages)
+        ]
+        batches = bulk_write_chunks(self.collection, ops)
+        errors = [err['errmsg'] for b in batches for err in b['write_errors']]
+        if errors:
+            raise EnqueueError(errors)
+        return sum(b['upserted'] for b in batches)
+
+    @staticmethod
+    def _claimable(now):
+        return {'$and': [
+            {'$or': [{'state': 'pending'}, {'state': 'leased', 'lease_until': {'$lt': now}}]},
+            {'$or': [{'not_before': None}, {'not_before': {'$lte': now}}]},
+        ]}
+
+    def claim(self, owner, limit=50):
+        """Lease up to `limit` pending (or lease-expired) messages for `owner`, oldest first.
+
+        Messages out of attempts are failed first. The oldest candidates
+        (whose `not_before`, if any, has passed) are then leased with one update under a fresh lease id, and read back by
+        that id, since a concurrent worker may have taken some of them.
+        """
+        now = datetime.utcnow()
+        self.collection.update_many(
+            dict(self._claimable(now), attempts={'$gte': self.max_attempts}),
+            {'$set': {'state': 'failed', 'error': 'too many attempts', 'finished_at': now}},
+        )
+        candidates = [doc['_id'] for doc in
+                      self.collection.find(self._claimable(now), {'_id': 1}).sort('created_at', 1).limit(limit)]
+        if not candidates:
+            return []
+        lease_id = uuid.uuid4().hex
+        self.collection.update_many(
+            dict(self._claimable(now), _id={'$in': candidates}),
+            {'$set': {'state': 'leased', 'lease_owner': owner, 'lease_id': lease_id,
+                      'lease_until': now + timedelta(seconds=self.lease_seconds)},
+             '$inc': {'attempts': 1}},
+        )
+        return list(self.collection.find({'lease_id': lease_id}).sort('created_at', 1))
+
+    def renew(self, keys, owner):
+        """Extend the lease of `owner`'s still-leased messages among `keys`."""
+        self.collection.update_many(
+            {'_id': {'$in': list(keys)}, 'state': 'leased', 'lease_owner': owner},
+            {'$set': {'lease_until': datetime.utcnow() + timedelta(seconds=self.lease_seconds)}},
+        )
+
+    def mark_sent(self, key, owner, response=None):
+        self.collection.update_one(
+            {'_id': key, 'lease_owner': owner},
+            {'$set': {'state': 'sent', 'response': response, 'finished_at': datetime.utcnow()}},
+        )
+
+    def mark_failed(self, key, owner, error):
+        self.collection.update_one(
+            {'_id': key, 'lease_owner': owner},
+            {'$set': {'state': 'failed', 'error': error, 'finished_at': datetime.utcnow()}},
+        )
+
+    def counts(self):
+        result = {'pending': 0, 'leased': 0, 'sent': 0, 'failed': 0}
+        for row in self.collection.aggregate([{'$group': {'_id': '$state', 'n': {'$sum': 1}}}]):
+            result[row['_id']] = row['n']
+        return result
+
+
+class SqliteOutboundQueue:
+    """Outbound queue in a local SQLite file (single host, multiple processes)."""
+
+    def __init__(self, path=None, lease_seconds=None, max_attempts=None):
+        self.path = path or os.environ.get('OUTBOUND_QUEUE_PATH') or DEFAULT_QUEUE_PATH
+        self.lease_seconds = lease_seconds or _env_number('OUTBOUND_LEASE_SECONDS', 120)
+        self.max_attempts = int(max_attempts or _env_number('OUTBOUND_MAX_ATTEMPTS', 3))
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS outbound ('
+            ' key TEXT PRIMARY KEY, filing_id TEXT, phone TEXT, template TEXT, payload TEXT NOT NULL,'
+            ' state TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, lease_owner TEXT,'
+            ' lease_until REAL, error TEXT, created_at REAL NOT NULL, finished_at REAL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS outbound_state ON outbound(state, lease_until)')
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(outbound)')}
+        if 'digest' not in columns:
+            self._conn.execute('ALTER TABLE outbound ADD COLUMN digest TEXT')
+        if 'not_before' not in columns:
+            self._conn.execute('ALTER TABLE outbound ADD COLUMN not_before REAL')
+
+    def ensure_indexes(self):
+        pass
+
+    def enqueue_many(self, messages):
+        now = time.time()
+        rows = [
+            (message_key(filing_id, phone, template), str(filing_id), phone, template, json.dumps(payload),
+             json.dumps(digest) if digest is not None else None,
+             not_before.timestamp() if not_before is not None else None, now)
+            for filing_id, phone, template, payload, digest, not_before in map(_unpack, messages)
+        ]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._conn.executemany(
+                    'INSERT OR IGNORE INTO outbound'
+                    ' (key, filing_id, phone, template, payload, digest, not_before, state, created_at)'
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, 'pending', ?)", rows,
+                )
+                self._conn.execute('COMMIT')
+            except sqlite3.Error as e:
+                self._conn.execute('ROLLBACK')
+                raise EnqueueError([str(e)]) from e
+            return self._conn.total_changes - before
+
+    # Pending or lease-expired, and past any not_before (parameters: now, now)
+    _CLAIMABLE = ("(state = 'pending' OR (state = 'leased' AND lease_until < ?))"
+                  ' AND (not_before IS NULL OR not_before <= ?)')
+
+    def claim(self, owner, limit=50):
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._conn.execute(
+                    "UPDATE outbound SET state = 'failed', error = 'too many attempts', finished_at = ?"
+                    f' WHERE attempts >= ? AND {self._CLAIMABLE}', (now, self.max_attempts, now, now),
+                )
+                rows = self._conn.execute(
+                    "SELECT key, filing_id, phone, template, payload, attempts, digest FROM outbound"
+                    f' WHERE {self._CLAIMABLE} ORDER BY created_at LIMIT ?', (now, now, limit),
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE outbound SET state = 'leased', lease_owner = ?, lease_until = ?, attempts = attempts + 1"
+                    ' WHERE key = ?', [(owner, now + self.lease_seconds, r[0]) for r in rows],
+                )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        return [
+            {'_id': r[0], 'filing_id': r[1], 'phone': r[2], 'template': r[3],
+             'payload': json.loads(r[4]), 'attempts': r[5] + 1, 'digest': json.loads(r[6]) if r[6] else None}
+            for r in rows
+        ]
+
+    def _finish(self, key, owner, state, error=None):
+        with self._lock:
+            self._conn.execute(
+                'UPDATE outbound SET state = ?, error = ?, finished_at = ? WHERE key = ? AND lease_owner = ?',
+                (state, error, time.time(), key, owner),
+            )
+
+    def renew(self, keys, owner):
+        lease_until = time.time() + self.lease_seconds
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE outbound SET lease_until = ? WHERE key = ? AND state = 'leased' AND lease_owner = ?",
+                [(lease_until, key, owner) for key in keys],
+            )
+
+    def mark_sent(self, key, owner, response=None):
+        self._finish(key, owner, 'sent')
+
+    def mark_failed(self, key, owner, error):
+        self._finish(key, owner, 'failed', error)
+
+    def counts(self):
+        result = {'pending': 0, 'leased': 0, 'sent': 0, 'failed': 0}
+        with self._lock:
+            for state, n in self._conn.execute('SELECT state, COUNT(*) FROM outbound GROUP BY state'):
+                result[state] = n
+        return result
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_queue(db=None):
+    """Mongo-backed queue when a database is given, else the local SQLite queue."""
+    if db is not None:
+        queue = MongoOutboundQueue(db[COLLECTION_NAME])
+        queue.ensure_indexes()
+        return queue
+    return SqliteOutboundQueue()
+
+
+class _LeaseKeeper:
+    """Background thread renewing the leases of a batch's unfinished messages."""
+
+    def __init__(self, queue, owner, keys):
+        self.queue = queue
+        self.owner = owner
+        self._keys = set(keys)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def done(self, keys):
+        with self._lock:
+            self._keys.difference_update(keys)
+
+    def _run(self):
+        while not self._stop.wait(self.queue.lease_seconds / 3):
+            with self._lock:
+                keys = list(self._keys)
+            if keys:
+                try:
+                    self.queue.renew(keys, self.owner)
+                except Exception as e:
+                    print(f'✗ Could not renew outbound leases: {e}')
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def drain(queue, sender, owner=None, batch_size=200, on_result=None, compose=None):
+    """Send every claimable message through `sender` (a WhatsAppSender).
+
+    `compose(docs)` may turn a claimed batch into (payload, docs) send
+    units, e.g. one digest for several messages; every doc in a unit is
+    marked with that send's result as soon as it finishes. Returns
+    {'sent', 'failed'} messages for this worker.
+    """
+    owner = owner or worker_id()
+    totals = {'sent': 0, 'failed': 0}
+    while True:
+        batch = queue.claim(owner, limit=batch_size)
+        if not batch:
+            return totals
+        units = compose(batch) if compose is not None else [(doc['payload'], [doc]) for doc in batch]
+        finished = set()
+
+        def finish(index, result):
+            if index in finished:
+                return
+            finished.add(index)
+            docs = units[index][1]
+            for doc in docs:
+                if result['ok']:
+                    queue.mark_sent(doc['_id'], owner, result['response'])
+                    totals['sent'] += 1
+                else:
+                    queue.mark_failed(doc['_id'], owner, result['error'])
+                    totals['failed'] += 1
+            keeper.done(doc['_id'] for doc in docs)
+
+        def record(result):
+            if 'index' in result:
+                finish(result['index'], result)
+            if on_result is not None:
+                on_result(result)
+
+        with _LeaseKeeper(queue, owner, [doc['_id'] for doc in batch]) as keeper:
+            results = sender.send_many([payload for payload, _ in units], on_result=record)
+            for index, result in enumerate(results):
+                finish(index, result)
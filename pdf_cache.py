@@ -0,0 +1,181 @@
+"""Persistent cache of text extracted from NSE attachments.
+
+The summarizer scripts download and parse the same attachment PDFs on
+every run. This module keeps the extracted text (and page count) in a
+small SQLite file so repeat runs can skip both the download and the
+PDF parse (see `pdf_text.py`).
+
+Entries are content addressed: the text is stored once per SHA-256 of the
+downloaded file, and each attachment URL points at a hash together with
+the ETag / Content-Length seen when it was fetched. NSE archive URLs are
+immutable, so by default a known URL is trusted without any network
+call; set PDF_CACHE_REVALIDATE=1 to send a HEAD request and compare the
+ETag / Content-Length first.
+
+The cache is bounded by total text size and evicts least recently used
+entries. Callers don't store empty extractions, so an attachment that
+failed to parse is downloaded and parsed again on the next run.
+
+Environment variables:
+- PDF_CACHE_DIR (default .cache/pdf_text)
+- PDF_CACHE_MAX_MB (default 512)
+- PDF_CACHE_REVALIDATE (optional; 1/true to revalidate URLs with HEAD)
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+
+DEFAULT_CACHE_DIR = os.path.join('.cache', 'pdf_text')
+DEFAULT_MAX_MB = 512
+
+
+def file_sha256(path, chunk_size=65536):
+    """Return the hex SHA-256 of a file on disk."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class PdfTextCache:
+    """SQLite-backed, size-bounded LRU cache of attachment text."""
+
+    def __init__(self, cache_dir=None, max_bytes=None, revalidate=None):
+        self.cache_dir = cache_dir or os.environ.get('PDF_CACHE_DIR') or DEFAULT_CACHE_DIR
+        if max_bytes is None:
+            try:
+                max_bytes = int(float(os.environ.get('PDF_CACHE_MAX_MB', DEFAULT_MAX_MB)) * 1024 * 1024)
+            except ValueError:
+                max_bytes = DEFAULT_MAX_MB * 1024 * 1024
+        self.max_bytes = max_bytes
+        if revalidate is None:
+            revalidate = os.environ.get('PDF_CACHE_REVALIDATE', '').lower() in ('1', 'true', 'yes')
+        self.revalidate = revalidate
+        # hits skip download and parse, content_hits skip only the parse
+        self.hits = 0
+        self.content_hits = 0
+        self.misses = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.cache_dir, 'index.sqlite'), check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS texts ('
+                ' sha256 TEXT PRIMARY KEY, text TEXT NOT NULL, page_count INTEGER,'
+                ' size INTEGER NOT NULL, last_access REAL NOT NULL)'
+            )
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS urls ('
+                ' url TEXT PRIMARY KEY, sha256 TEXT NOT NULL, etag TEXT, content_length INTEGER)'
+            )
+            self._conn.execute('CREATE INDEX IF NOT EXISTS texts_last_access ON texts(last_access)')
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _touch(self, sha256):
+        self._conn.execute('UPDATE texts SET last_access = ? WHERE sha256 = ?', (time.time(), sha256))
+
+    def _headers_match(self, session, url, etag, content_length):
+        """HEAD the URL and compare validators with what was cached."""
+        try:
+            resp = session.head(url, timeout=10, allow_redirects=True)
+            resp.raise_for_status()
+        except Exception:
+            # If we cannot revalidate, trust the cached copy
+            return True
+        remote_etag = resp.headers.get('ETag')
+        remote_length = resp.headers.get('Content-Length')
+        if etag and remote_etag and etag != remote_etag:
+            return False
+        if content_length and remote_length and str(content_length) != remote_length:
+            return False
+        return True
+
+    def get(self, url, session=None):
+        """Return (text, page_count) for a previously seen URL, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT t.text, t.page_count, u.sha256, u.etag, u.content_length'
+                ' FROM urls u JOIN texts t ON t.sha256 = u.sha256 WHERE u.url = ?',
+                (url,),
+            ).fetchone()
+        if row is None:
+            return None
+        text, page_count, sha256, etag, content_length = row
+        if self.revalidate and session is not None and not self._headers_match(session, url, etag, content_length):
+            return None
+        with self._lock, self._conn:
+            self._touch(sha256)
+        self.hits += 1
+        return text, page_count
+
+    def get_by_hash(self, sha256, url=None, etag=None, content_length=None):
+        """Return (text, page_count) for already-parsed content, or None.
+
+        When `url` is given the URL is (re)pointed at this content so the
+        next run can skip the download as well.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT text, page_count FROM texts WHERE sha256 = ?', (sha256,)
+            ).fetchone()
+            if row is None:
+                return None
+            with self._conn:
+                self._touch(sha256)
+                if url:
+                    self._link(url, sha256, etag, content_length)
+        self.content_hits += 1
+        return row[0], row[1]
+
+    def _link(self, url, sha256, etag, content_length):
+        self._conn.execute(
+            'INSERT OR REPLACE INTO urls (url, sha256, etag, content_length) VALUES (?, ?, ?, ?)',
+            (url, sha256, etag, content_length),
+        )
+
+    def put(self, url, sha256, text, page_count=None, etag=None, content_length=None):
+        """Store extracted text for `sha256` and point `url` at it."""
+        text = text or ''
+        size = len(text.encode('utf-8'))
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO texts (sha256, text, page_count, size, last_access) VALUES (?, ?, ?, ?, ?)',
+                (sha256, text, page_count, size, time.time()),
+            )
+            if url:
+                self._link(url, sha256, etag, content_length)
+            self._evict()
+        self.misses += 1
+
+    def _evict(self):
+        """Drop least recently used texts until the cache fits max_bytes."""
+        total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM texts').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute('SELECT sha256, size FROM texts ORDER BY last_access ASC').fetchall()
+        for sha256, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute('DELETE FROM texts WHERE sha256 = ?', (sha256,))
+            self._conn.execute('DELETE FROM urls WHERE sha256 = ?', (sha256,))
+            total -= size
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM texts').fetchone()
+        return {
+            'hits': self.hits,
+            'content_hits': self.content_hits,
+            'misses': self.misses,
+            'entries': entries,
+            'bytes': size,
+        }
@@ -0,0 +1,275 @@
+"""Pluggable, early-stopping PDF text extraction for attachment summaries.
+
+The summarizers only send the first PDF_TEXT_MAX_CHARS characters of an
+attachment to the LLM, so extraction stops as soon as that much text has
+been collected instead of parsing the first 10 pages of every document.
+Both summarizers use the same limit (the larger of their prompt slices)
+so text cached by `pdf_cache.py` serves either of them.
+
+Backends are tried in order until one opens the file and yields text:
+
+- `pypdfium2` (PDFium, fastest)
+- `pdfminer` (pdfminer.six, pure Python, good layout handling)
+- `pypdf2` (PyPDF2, always installed)
+
+Pages without text objects (pypdfium2) or without fonts or form XObjects
+(scanned, image-only pages) are skipped without running the text
+extractor on them.
+
+`extract_texts_in_pool()` runs the extraction in a shared process pool so
+a slow or crashing PDF does not hold the GIL or take down the server
+process that runs the summarize jobs; all paths are submitted before any
+result is collected, so the workers extract them in parallel. Its workers are started with
+forkserver (spawn where that is unavailable), never forked from the
+multi-threaded server, whose locks a forked child could inherit held.
+
+Environment variables:
+- PDF_TEXT_BACKEND (optional) comma-separated backend order
+- PDF_TEXT_MAX_CHARS (default 15000)
+- PDF_TEXT_MAX_PAGES (default 10)
+- PDF_TEXT_WORKERS (default 2) processes in the extraction pool
+"""
+
+import io
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+DEFAULT_BACKENDS = ('pypdfium2', 'pdfminer', 'pypdf2')
+DEFAULT_MAX_CHARS = 15000
+DEFAULT_MAX_PAGES = 10
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _pdfium_pages(path, max_pages):
+    """(page_count, iterator of page text or None for skipped pages)."""
+    import pypdfium2 as pdfium
+    import pypdfium2.raw as pdfium_c
+
+    pdf = pdfium.PdfDocument(path)
+    page_count = len(pdf)
+
+    def pages():
+        try:
+            for i in range(min(page_count, max_pages)):
+                page = pdf[i]
+                try:
+                    # Text objects, also those nested in form XObjects
+                    if next(page.get_objects(filter=(pdfium_c.FPDF_PAGEOBJ_TEXT,)), None) is None:
+                        yield None
+                        continue
+                    textpage = page.get_textpage()
+                    try:
+                        yield textpage.get_text_range()
+                    finally:
+                        textpage.close()
+                finally:
+                    page.close()
+        finally:
+            pdf.close()
+
+    return page_count, pages()
+
+
+def _pdfminer_pages(path, max_pages):
+    from pdfminer.converter import TextConverter
+    from pdfminer.layout import LAParams
+    from pdfminer.pdfdocument import PDFDocument
+    from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+    from pdfminer.pdfpage import PDFPage
+    from pdfminer.pdfparser import PDFParser
+    from pdfminer.pdftypes import resolve1
+
+    fh = open(path, 'rb')
+    try:
+        document = PDFDocument(PDFParser(fh))
+        page_count = resolve1(document.catalog['Pages']).get('Count')
+    except Exception:
+        fh.close()
+        raise
+
+    def has_text(page):
+        # Fonts, or form XObjects that may carry their own
+        resources = resolve1(page.resources) or {}
+        if resolve1(resources.get('Font')):
+            return True
+        xobjects = resolve1(resources.get('XObject')) or {}
+        return any(getattr(resolve1(x).get('Subtype'), 'name', None) == 'Form'
+                   for x in xobjects.values())
+
+    def pages():
+        manager = PDFResourceManager()
+        try:
+            for i, page in enumerate(PDFPage.create_pages(document)):
+                if i >= max_pages:
+                    break
+                if not has_text(page):
+                    yield None
+                    continue
+                out = io.StringIO()
+                device = TextConverter(manager, out, laparams=LAParams())
+                try:
+                    PDFPageInterpreter(manager, device).process_page(page)
+                finally:
+                    device.close()
+                yield out.getvalue()
+        finally:
+            fh.close()
+
+    return page_count, pages()
+
+
+def _pypdf2_pages(path, max_pages):
+    from PyPDF2 import PdfReader
+
+    reader = PdfReader(path)
+    page_count = len(reader.pages)
+
+    def has_text(page):
+        # Fonts, or form XObjects that may carry their own
+        resources = page.get('/Resources')
+        resources = resources.get_object() if resources is not None else {}
+        if resources.get('/Font'):
+            return True
+        xobjects = resources.get('/XObject')
+        xobjects = xobjects.get_object() if xobjects is not None else {}
+        return any(x.get_object().get('/Subtype') == '/Form' for x in xobjects.values())
+
+    def pages():
+        for i in range(min(page_count, max_pages)):
+            page = reader.pages[i]
+            if not has_text(page):
+                yield None
+                continue
+            try:
+                yield page.extract_text() or ''
+            except Exception:
+                yield ''
+
+    return page_count, pages()
+
+
+BACKENDS = {
+    'pypdfium2': _pdfium_pages,
+    'pdfminer': _pdfminer_pages,
+    'pypdf2': _pypdf2_pages,
+}
+
+
+def backend_order():
+    value = os.environ.get('PDF_TEXT_BACKEND')
+    names = [n.strip().lower() for n in value.split(',')] if value else list(DEFAULT_BACKENDS)
+    return [n for n in names if n in BACKENDS]
+
+
+def extract_text(path, max_chars=None, max_pages=None, backends=None):
+    """Extract up to `max_chars` characters from the first `max_pages` pages.
+
+    Returns {'text', 'page_count', 'pages_read', 'pages_skipped', 'backend',
+    'seconds', 'error'}. A backend that is not installed, cannot open the
+    file or yields no text falls through to the next one; if none yields
+    text, `text` is '' and the counts are those of the last backend that
+    opened the file.
+    """
+    max_chars = max_chars or _env_int('PDF_TEXT_MAX_CHARS', DEFAULT_MAX_CHARS)
+    max_pages = max_pages or _env_int('PDF_TEXT_MAX_PAGES', DEFAULT_MAX_PAGES)
+    started = time.perf_counter()
+    result = {'text': '', 'page_count': None, 'pages_read': 0, 'pages_skipped': 0,
+              'backend': None, 'seconds': 0.0, 'error': None}
+    for name in backends or backend_order():
+        try:
+            page_count, pages = BACKENDS[name](path, max_pages)
+        except Exception as e:
+            # ImportError for a missing backend, or a file it can't parse
+            if result['backend'] is None:
+                result['error'] = f'{name}: {e}'
+            continue
+        result.update(page_count=page_count, pages_read=0, pages_skipped=0, backend=name, error=None)
+        texts, collected = [], 0
+        try:
+            for text in pages:
+                result['pages_read'] += 1
+                if text is None:
+                    result['pages_skipped'] += 1
+                    continue
+                text = text.strip()
+                if text:
+                    texts.append(text)
+                    collected += len(text)
+                if collected >= max_chars:
+                    break
+        except Exception as e:
+            # Keep what was read before a damaged page
+            result['error'] = f'{name}: {e}'
+        finally:
+            pages.close()
+        if texts:
+            result['text'] = '\n'.join(texts)[:max_chars]
+            break
+    result['seconds'] = time.perf_counter() - started
+    return result
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def process_pool(max_workers):
+    """ProcessPoolExecutor whose workers are not forked from this (threaded) process."""
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = process_pool(max(1, _env_int('PDF_TEXT_WORKERS', 2)))
+        return _pool
+
+
+def extract_texts_in_pool(paths, max_chars=None, max_pages=None):
+    """extract_text() for each of `paths` in the shared process pool, in order.
+
+    Every path is submitted before any result is awaited. Paths whose
+    extraction hit a broken pool are extracted inline.
+    """
+    global _pool
+    pool = _get_pool()
+    futures = []
+    for path in paths:
+        try:
+            futures.append((path, pool.submit(extract_text, path, max_chars, max_pages)))
+        except BrokenProcessPool:
+            futures.append((path, None))
+    results = []
+    for path, future in futures:
+        result = None
+        if future is not None:
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                pass
+        if result is None:
+            with _pool_lock:
+                if _pool is pool:
+                    _pool = None
+            result = extract_text(path, max_chars, max_pages)
+        results.append(result)
+    return results
+
+
+def extract_text_in_pool(path, max_chars=None, max_pages=None):
+    """extract_text() in the shared process pool (inline if the pool is broken)."""
+    return extract_texts_in_pool([path], max_chars, max_pages)[0]
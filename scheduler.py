@@ -0,0 +1,278 @@
+"""In-process scheduler for the scrape -> summarize -> send pipeline.
+
+Replaces the external cron hitting /api/run_all. Each stage has its own
+interval:
+
+- scrape runs every SCHEDULE_SCRAPE_SECONDS (default 120) while the market
+  is open and every SCHEDULE_SCRAPE_OFF_HOURS_SECONDS (default 900, 0 to
+  disable) outside market hours on trading days;
+- summarize runs right after a successful scrape and otherwise every
+  SCHEDULE_SUMMARIZE_SECONDS (default 300);
+- send runs right after a successful summarize (on arrival) and, if
+  SCHEDULE_SEND_SECONDS is set, periodically as well.
+
+Nothing runs on weekends or NSE trading holidays. Every stage runs under
+one single-flight lock (also used by the server's manual pipeline routes),
+backed by a MongoDB lease when a database is available so separate
+processes never overlap. The lease is renewed while the lock is held, so
+a stage that outlasts it is not overlapped either.
+Failed scrapes back off exponentially with jitter, up to
+SCHEDULE_BACKOFF_MAX_SECONDS (default 1800).
+"""
+
+import logging
+import os
+import random
+import socket
+import threading
+import uuid
+from datetime import datetime, time, timedelta, timezone
+
+
+# India has no DST, so a fixed offset is enough and avoids a tzdata dependency
+IST = timezone(timedelta(hours=5, minutes=30), 'IST')
+STAGES = ('scrape', 'summarize', 'send')
+
+
+def _env_seconds(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def parse_holidays(value):
+    """Parse comma/whitespace separated YYYY-MM-DD dates into a set of dates."""
+    holidays = set()
+    for token in (value or '').replace(',', ' ').split():
+        try:
+            holidays.add(datetime.strptime(token, '%Y-%m-%d').date())
+        except ValueError:
+            logging.warning('Ignoring invalid holiday date %r', token)
+    return holidays
+
+
+class MarketCalendar:
+    """NSE trading days and market hours (IST).
+
+    `holiday_loader` is an optional callable returning a set of dates; it is
+    called at most once per day and merged with the static `holidays`.
+    """
+
+    def __init__(self, holidays=None, holiday_loader=None, open_time=time(9, 15), close_time=time(15, 30)):
+        self.holidays = set(holidays or ())
+        self.holiday_loader = holiday_loader
+        self.open_time = open_time
+        self.close_time = close_time
+        self._loaded = set()
+        self._loaded_on = None
+
+    def _refresh(self, today):
+        if self.holiday_loader is None or self._loaded_on == today:
+            return
+        self._loaded_on = today
+        try:
+            self._loaded = set(self.holiday_loader() or ())
+        except Exception as e:
+            logging.warning('Could not load NSE holidays: %s', e)
+
+    def is_trading_day(self, day):
+        self._refresh(day)
+        return day.weekday() < 5 and day not in self.holidays and day not in self._loaded
+
+    def is_market_open(self, now):
+        now = now.astimezone(IST)
+        return self.is_trading_day(now.date()) and self.open_time <= now.time() <= self.close_time
+
+
+class SingleFlightLock:
+    """Non-blocking lock, optionally shared across processes via a MongoDB lease.
+
+    With `collection`, the lock is a document {_id: name, owner, expires_at};
+    an expired lease (e.g. from a crashed process) can be taken over. While
+    held, a background thread renews the lease every third of
+    `lease_seconds`.
+    """
+
+    def __init__(self, name='pipeline', collection=None, lease_seconds=3600):
+        self.name = name
+        self.collection = collection
+        self.lease_seconds = lease_seconds
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._local = threading.Lock()
+        self._stop_renewing = None
+
+    def acquire(self):
+        if not self._local.acquire(blocking=False):
+            return False
+        if self.collection is None:
+            return True
+        now = datetime.utcnow()
+        try:
+            from pymongo.errors import DuplicateKeyError
+
+            self.collection.find_one_and_update(
+                {'_id': self.name, '$or': [{'expires_at': {'$lt': now}}, {'owner': self.owner}]},
+                {'$set': {'owner': self.owner, 'expires_at': now + timedelta(seconds=self.lease_seconds)}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            # Another process holds an unexpired lease
+            self._local.release()
+            return False
+        except Exception as e:
+            logging.warning('Lock lease for %s unavailable, using local lock only: %s', self.name, e)
+            return True
+        self._stop_renewing = threading.Event()
+        threading.Thread(target=self._renew, args=(self._stop_renewing,), daemon=True).start()
+        return True
+
+    def _renew(self, stop):
+        while not stop.wait(self.lease_seconds / 3):
+            try:
+                self.collection.update_one(
+                    {'_id': self.name, 'owner': self.owner},
+                    {'$set': {'expires_at': datetime.utcnow() + timedelta(seconds=self.lease_seconds)}},
+                )
+            except Exception as e:
+                logging.warning('Could not renew lock lease for %s: %s', self.name, e)
+
+    def release(self):
+        if self._stop_renewing is not None:
+            self._stop_renewing.set()
+            self._stop_renewing = None
+        if self.collection is not None:
+            try:
+                self.collection.delete_one({'_id': self.name, 'owner': self.owner})
+            except Exception as e:
+                logging.warning('Could not release lock lease for %s: %s', self.name, e)
+        self._local.release()
+
+    def locked(self):
+        return self._local.locked()
+
+
+class PipelineScheduler:
+    """Runs pipeline stages on their intervals from a background thread.
+
+    `run_stage(name)` executes one stage synchronously and returns True on
+    success. Stages run one at a time under `lock`.
+    """
+
+    def __init__(self, run_stage, calendar=None, lock=None, config=None):
+        self.run_stage = run_stage
+        self.calendar = calendar or MarketCalendar()
+        self.lock = lock or SingleFlightLock()
+        config = dict(config or {})
+        self.scrape_seconds = config.get('scrape_seconds', _env_seconds('SCHEDULE_SCRAPE_SECONDS', 120))
+        self.off_hours_seconds = config.get('off_hours_seconds', _env_seconds('SCHEDULE_SCRAPE_OFF_HOURS_SECONDS', 900))
+        self.summarize_seconds = config.get('summarize_seconds', _env_seconds('SCHEDULE_SUMMARIZE_SECONDS', 300))
+        self.send_seconds = config.get('send_seconds', _env_seconds('SCHEDULE_SEND_SECONDS', 0))
+        self.backoff_base = config.get('backoff_base', _env_seconds('SCHEDULE_BACKOFF_BASE_SECONDS', 60))
+        self.backoff_max = config.get('backoff_max', _env_seconds('SCHEDULE_BACKOFF_MAX_SECONDS', 1800))
+        self.poll_seconds = config.get('poll_seconds', 5)
+
+        self.next_run = {stage: None for stage in STAGES}
+        self.scrape_failures = 0
+        self.last_result = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def backoff_delay(self):
+        """Exponential backoff with +/-50% jitter after consecutive scrape failures."""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (self.scrape_failures - 1)))
+        return delay * random.uniform(0.5, 1.5)
+
+    def due_stages(self, now):
+        """Return the stages whose interval has elapsed at `now`."""
+        if not self.calendar.is_trading_day(now.astimezone(IST).date()):
+            return []
+        due = []
+        for stage in STAGES:
+            interval = self._interval(stage, now)
+            if not interval:
+                continue
+            next_run = self.next_run[stage]
+            if next_run is None or now >= next_run:
+                due.append(stage)
+        return due
+
+    def _interval(self, stage, now):
+        if stage == 'scrape':
+            return self.scrape_seconds if self.calendar.is_market_open(now) else self.off_hours_seconds
+        if stage == 'summarize':
+            return self.summarize_seconds
+        return self.send_seconds
+
+    def _run(self, stage, now):
+        try:
+            ok = bool(self.run_stage(stage))
+        except Exception:
+            logging.exception('Scheduled %s failed', stage)
+            ok = False
+        self.last_result[stage] = {'ok': ok, 'at': now.isoformat()}
+        interval = self._interval(stage, now) or 0
+        if stage == 'scrape':
+            if ok:
+                self.scrape_failures = 0
+            else:
+                self.scrape_failures += 1
+                interval = self.backoff_delay()
+        self.next_run[stage] = now + timedelta(seconds=interval)
+        return ok
+
+    def run_once(self, now=None):
+        """Run due stages (plus any they trigger); returns the stages that ran."""
+        now = now or datetime.now(IST)
+        due = self.due_stages(now)
+        if not due:
+            return []
+        if not self.lock.acquire():
+            logging.info('Pipeline already running; skipping scheduled %s', ', '.join(due))
+            return []
+        ran = []
+        try:
+            triggered = set(due)
+            for stage in STAGES:
+                if stage not in triggered:
+                    continue
+                ran.append(stage)
+                ok = self._run(stage, now)
+                # A successful stage feeds the next one straight away
+                if ok and stage == 'scrape':
+                    triggered.add('summarize')
+                elif ok and stage == 'summarize':
+                    triggered.add('send')
+        finally:
+            self.lock.release()
+        return ran
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logging.exception('Scheduler tick failed')
+            self._stop.wait(self.poll_seconds)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='pipeline-scheduler', daemon=True)
+        self._thread.start()
+        logging.info('Pipeline scheduler started')
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def status(self):
+        return {
+            'running': bool(self._thread and self._thread.is_alive()),
+            'busy': self.lock.locked(),
+            'next_run': {k: (v.isoformat() if v else None) for k, v in self.next_run.items()},
+            'last_result': dict(self.last_result),
+            'scrape_failures': self.scrape_failures,
+        }
@@ -5,10 +5,15 @@ Broadcast a WhatsApp template message to all contacts in the database.
 import sys
 import os
 import argparse
+import hashlib
 import json
-import requests
 from pymongo import MongoClient
 
+# Make the repo-root helper modules importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from whatsapp_sender import sender_from_env
+from outbound_queue import drain, open_queue
+
 # Force UTF-8 encoding on Windows
 if sys.platform == 'win32':
     import io
@@ -66,18 +71,6 @@ def build_template_payload(template_name, to, customer, company, price, update):
     return payload
 
 
-def send_message(token, phone_id, payload):
-    """Send WhatsApp message via Meta Graph API."""
-    url = f"https://graph.facebook.com/v22.0/{phone_id}/messages"
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
-    resp = requests.post(url, headers=headers, json=payload, timeout=30)
-    resp.raise_for_status()
-    return resp.json()
-
-
 def connect_db(mongo_uri):
     """Connect to MongoDB."""
     client = MongoClient(mongo_uri)
@@ -85,7 +78,7 @@ def connect_db(mongo_uri):
     return client['nse_data']
 
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description='Broadcast WhatsApp template to all contacts')
     parser.add_argument('--mongo-uri', help='MongoDB URI (overrides MONGO_URI env var)')
     parser.add_argument('--token', help='WhatsApp API bearer token')
@@ -97,7 +90,9 @@ def main():
     parser.add_argument('--update', required=True, help='Update text')
     parser.add_argument('--dry-run', action='store_true', help='Print payloads without sending')
     parser.add_argument('--verbose', '-v', action='store_true', help='Verbose output')
-    args = parser.parse_args()
+    parser.add_argument('--concurrency', type=int, help='Parallel sends (default: WHATSAPP_CONCURRENCY or 8)')
+    parser.add_argument('--campaign-id', help='Idempotency id for this broadcast (default: hash of template and content)')
+    args = parser.parse_args(argv)
 
     # Load environment from .env.local
     load_env_file()
@@ -157,16 +152,14 @@ def main():
         print('✗ No valid phone numbers found')
         sys.exit(0)
 
-    # Counters
-    sent = 0
-    failed = 0
-
-    # Send to each recipient
+    # Build one payload per recipient
+    payloads = []
+    names = {}
     for recipient in recipients:
         phone = recipient['phone']
         customer_name = recipient.get('name', args.customer)
+        names[phone] = customer_name
 
-        # Build payload
         payload = build_template_payload(
             args.template,
             phone,
@@ -175,28 +168,43 @@ def main():
             args.price,
             args.update
         )
+        payloads.append(payload)
 
         if args.verbose or args.dry_run:
             print(f'\n→ Payload for {phone} ({customer_name}):')
             print(json.dumps(payload, indent=2))
 
-        if args.dry_run:
-            continue
+    # Queue one message per (campaign, phone, template) so re-running the
+    # same broadcast after a crash only sends to those not yet messaged.
+    # Sends run concurrently over one pooled connection, with retries;
+    # failures that survive the retries go to whatsapp_dead_letters.
+    campaign_id = args.campaign_id or hashlib.sha1(
+        '|'.join([args.template, args.company, args.price, args.update]).encode('utf-8')).hexdigest()[:16]
+    sent = 0
+    failed = 0
 
-        # Send message
-        try:
-            resp = send_message(token, phone_id, payload)
+    def report(result):
+        nonlocal sent, failed
+        phone = result['to']
+        if result['ok']:
             sent += 1
-            print(f'✓ Message sent to {phone} ({customer_name})')
+            print(f'✓ Message sent to {phone} ({names.get(phone)})')
             if args.verbose:
-                print(f'  Response: {json.dumps(resp)}')
-        except requests.HTTPError as he:
-            failed += 1
-            error_detail = he.response.text if he.response else str(he)
-            print(f'✗ HTTP error sending to {phone}: {error_detail}')
-        except Exception as e:
+                print(f'  Response: {json.dumps(result["response"])}')
+        else:
             failed += 1
-            print(f'✗ Error sending to {phone}: {e}')
+            print(f'✗ Error sending to {phone} after {result["attempts"]} attempt(s): {result["error"]}')
+
+    if not args.dry_run:
+        queue = open_queue(db)
+        queued = queue.enqueue_many((campaign_id, p['to'], args.template, p) for p in payloads)
+        print(f'Queued {queued} new message(s) for campaign {campaign_id} '
+              f'({len(payloads) - queued} already queued or sent)')
+        sender = sender_from_env(token, phone_id, db=db, concurrency=args.concurrency)
+        try:
+            drain(queue, sender, on_result=report)
+        finally:
+            sender.close()
 
     # Summary
     print(f'\n=== Summary ===')
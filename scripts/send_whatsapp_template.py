@@ -19,18 +19,27 @@ Example (PowerShell):
 Or pass values on the command line:
   python .\scripts\send_whatsapp_template.py --token 'EAA...' --phone-id '918492424669959' --to 918081489340 ...
 
+Messages go through the `outbound_messages` queue (see outbound_queue.py),
+keyed by company, update text and phone, so re-running the same update
+only sends to recipients that have not received it yet.
+
 Warning: keep your token secret. Do not commit it into source control.
 """
 import os
+import hashlib
 import json
 import re
 import sys
 import argparse
-import requests
 from pymongo import MongoClient
 from datetime import datetime
 import os
 
+# Make the repo-root helper modules importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from whatsapp_sender import sender_from_env
+from outbound_queue import drain, open_queue
+
 
 def load_env_file(path='.env.local'):
     try:
@@ -155,18 +164,7 @@ def connect_db(mongo_uri):
     return client['nse_data']
 
 
-def send_message(token, phone_id, payload):
-    url = f"https://graph.facebook.com/v22.0/{phone_id}/messages"
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
-    resp = requests.post(url, headers=headers, json=payload, timeout=30)
-    resp.raise_for_status()
-    return resp.json()
-
-
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description='Send WhatsApp template via Meta Graph API')
     parser.add_argument('--token', help='WhatsApp API bearer token')
     parser.add_argument('--phone-id', help='WhatsApp Business Phone ID (numeric)')
@@ -178,7 +176,7 @@ def main():
     parser.add_argument('--dry-run', action='store_true', help='Do not send messages; print payloads')
     parser.add_argument('--check-only', action='store_true', help='Only run validations and print status; do not send')
     parser.add_argument('--verbose', '-v', action='store_true', help='Enable verbose output with debug info')
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     # Load .env.local if present
     load_env_file('.env.local')
@@ -284,7 +282,8 @@ def main():
         print('✗ No recipients found: pass --to or populate customers in last_hour/company-map')
         return
 
-    # Send to each recipient
+    # Build a payload for each recipient
+    payloads = []
     for r in valid_recipients:
         to = r['phone']
         customer_name = args.customer or r.get('name') or 'Customer'
@@ -307,20 +306,30 @@ def main():
             print('DRY RUN payload for', to)
             print(json.dumps(payload, indent=2))
             continue
+        payloads.append(payload)
 
-        try:
-            resp = send_message(token, phone_id, payload)
-            print(f'✓ Message sent to {to}:')
+    def report(result):
+        if result['ok']:
+            print(f"✓ Message sent to {result['to']}:")
             if args.verbose:
-                print(json.dumps(resp, indent=2))
-        except requests.HTTPError as he:
-            print(f'✗ HTTP error sending message to {to}:')
-            try:
-                print(he.response.text)
-            except Exception:
-                print(str(he))
-        except Exception as e:
-            print(f'✗ Error sending message to {to}: {e}')
+                print(json.dumps(result['response'], indent=2))
+        else:
+            print(f"✗ Error sending message to {result['to']} after {result['attempts']} attempt(s):")
+            print(result['error'])
+
+    if payloads:
+        # Queue first so a re-run skips recipients that already got this update;
+        # sends are pooled, rate-limited and retried, final failures dead-lettered
+        update_id = f"{company_id}:" + hashlib.sha1(
+            f'{template_name}|{update_text}'.encode('utf-8')).hexdigest()[:16]
+        queue = open_queue(db)
+        queued = queue.enqueue_many((update_id, p['to'], template_name, p) for p in payloads)
+        print(f'→ Queued {queued} new message(s) ({len(payloads) - queued} already queued or sent)')
+        sender = sender_from_env(token, phone_id, db=db)
+        try:
+            drain(queue, sender, on_result=report)
+        finally:
+            sender.close()
 
 
 if __name__ == '__main__':
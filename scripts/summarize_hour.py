@@ -1,6 +1,14 @@
 """
 summarize_hour.py
 Summarize PDFs and broadcast via WhatsApp using specific Utility Template standards.
+
+Attachment text is cached on disk by `pdf_cache.py`, so re-running over the
+same last_hour documents skips the download and PDF parse. Use
+--no-pdf-cache to bypass it. OpenAI summaries are memoized by
+`summary_cache.py`; use --no-summary-cache to bypass it.
+
+With --digest (or DIGEST_MODE=1) a subscriber's matched filings are
+grouped per DIGEST_WINDOW_MINUTES window into one message; see `digest.py`.
 """
 
 import os
@@ -14,7 +22,6 @@ import argparse
 from pymongo import MongoClient
 from datetime import datetime
 from urllib.parse import urljoin
-from PyPDF2 import PdfReader
 
 # Force UTF-8 encoding for Windows
 if sys.platform == 'win32':
@@ -22,6 +29,18 @@ if sys.platform == 'win32':
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
 
+# Make the repo-root helper modules importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pdf_cache import PdfTextCache, file_sha256
+from summary_cache import SummaryCache
+from metrics import observe_stage, stage
+from pdf_text import extract_texts_in_pool
+from subscriptions import SubscriptionIndex
+from whatsapp_sender import sender_from_env
+from outbound_queue import EnqueueError, drain, open_queue
+from announcements import announcement_id
+from digest import digest_window, format_digest, group_claimed, priority_subjects_from_env
+
 
 def load_env_file(path='.env.local'):
     if not os.path.isfile(path):
@@ -47,59 +66,130 @@ def connect_db(mongo_uri):
     return client['nse_data']
 
 
-def download_file(session, url, timeout=30):
-    try:
-        resp = session.get(url, timeout=timeout, stream=True)
-        resp.raise_for_status()
-        content_type = resp.headers.get('Content-Type', '')
-        ext = '.pdf' if 'pdf' in content_type.lower() or url.lower().endswith('.pdf') else ''
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=ext)
-        for chunk in resp.iter_content(chunk_size=8192):
-            if chunk:
-                tmp.write(chunk)
-        tmp.flush()
-        tmp.close()
-        return tmp.name, content_type
-    except Exception:
-        return None, None
+def download_file(session, url, timeout=30, meta=None):
+    with stage('pdf_download') as span:
+        try:
+            resp = session.get(url, timeout=timeout, stream=True)
+            resp.raise_for_status()
+            content_type = resp.headers.get('Content-Type', '')
+            if meta is not None:
+                meta['etag'] = resp.headers.get('ETag')
+                meta['content_length'] = resp.headers.get('Content-Length')
+            ext = '.pdf' if 'pdf' in content_type.lower() or url.lower().endswith('.pdf') else ''
+            tmp = tempfile.NamedTemporaryFile(delete=False, suffix=ext)
+            for chunk in resp.iter_content(chunk_size=8192):
+                if chunk:
+                    tmp.write(chunk)
+            tmp.flush()
+            tmp.close()
+            return tmp.name, content_type
+        except Exception:
+            span['outcome'] = 'error'
+            return None, None
+
+
+def extract_pdfs(paths, max_pages=10):
+    """(text, page_count) per path, extracted in parallel in the process pool."""
+    # Extracts up to PDF_TEXT_MAX_CHARS (more than the 4000 used below) so
+    # the cached text also serves summarize_last_hour.py
+    extracted = []
+    for result in extract_texts_in_pool(paths, max_pages=max_pages):
+        observe_stage('text_extract', result['seconds'], 'error' if result['error'] else 'ok',
+                      backend=result['backend'], pages=result['pages_read'])
+        extracted.append((result['text'], result['page_count']))
+    return extracted
 
 
 def extract_text_from_pdf(path, max_pages=10):
-    try:
-        reader = PdfReader(path)
-        texts = []
-        num_pages = len(reader.pages)
-        page_count = min(num_pages, max_pages) if max_pages else num_pages
-        for i in range(page_count):
-            page = reader.pages[i]
-            text = page.extract_text()
-            if text:
-                texts.append(text)
-        return '\n'.join(texts)
-    except Exception:
-        return ''
+    return extract_pdfs([path], max_pages=max_pages)[0][0]
+
 
+def get_attachment_texts(session, urls, pdf_cache=None):
+    """{url: text} for attachment `urls`, using the on-disk cache when available.
 
-def summarize_text(openai_key, text, company, model='gpt-4o-mini'):
+    Cache misses are downloaded first and then extracted together, so the
+    process pool works on several PDFs at once. A URL whose download or
+    cache lookup raised maps to the exception, for the caller to report.
+    """
+    texts, pending = {}, []
+    for url in dict.fromkeys(urls):
+        try:
+            if pdf_cache:
+                cached = pdf_cache.get(url, session)
+                if cached is not None:
+                    texts[url] = cached[0]
+                    continue
+            meta = {}
+            tmp_path, content_type = download_file(session, url, meta=meta)
+            if not tmp_path:
+                texts[url] = ''
+                continue
+            sha256 = None
+            if pdf_cache:
+                sha256 = file_sha256(tmp_path)
+                cached = pdf_cache.get_by_hash(sha256, url=url, etag=meta.get('etag'),
+                                               content_length=meta.get('content_length'))
+                if cached is not None:
+                    texts[url] = cached[0]
+                    continue
+            pending.append((url, tmp_path, sha256, meta))
+        except Exception as e:
+            texts[url] = e
+
+    for (url, tmp_path, sha256, meta), (text, page_count) in zip(pending, extract_pdfs([p[1] for p in pending])):
+        texts[url] = text
+        if pdf_cache and text:
+            # An empty result may be a transient parse failure; try again next run
+            try:
+                pdf_cache.put(url, sha256, text, page_count, etag=meta.get('etag'),
+                              content_length=meta.get('content_length'))
+            except Exception as e:
+                print(f'WARNING: Could not cache text for {url}: {e}')
+    return texts
+
+# Bump when the prompt below changes so cached summaries are not reused
+PROMPT_VARIANT = 'hour_1sent_v1'
+
+_openai_clients = {}
+
+
+def get_openai_client(openai_key):
+    client = _openai_clients.get(openai_key)
+    if client is None:
+        import openai
+        client = openai.OpenAI(api_key=openai_key)
+        _openai_clients[openai_key] = client
+    return client
+
+
+def summarize_text(openai_key, text, company, model='gpt-4o-mini', summary_cache=None):
     if not text:
         return 'No text extracted from document.', None
     
     if openai_key:
+        prompt_text = text[:4000]
+        if summary_cache:
+            cached = summary_cache.get(prompt_text, company, model, PROMPT_VARIANT)
+            if cached:
+                return cached, None
         try:
-            import openai
-            client = openai.OpenAI(api_key=openai_key)
+            client = get_openai_client(openai_key)
             # Prompt tweaked to be concise for the "log" style format
-            prompt = f"Summarize this corporate filing for {company} in 1 very concise sentence focusing on the core event (e.g. 'Board declared dividend of Rs 5'). Keep it factual:\n\n{text[:4000]}"
-            response = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": "You are a system logger. Output only factual event summaries."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=100,
-                temperature=0.2
-            )
-            return response.choices[0].message.content.strip(), None
+            prompt = f"Summarize this corporate filing for {company} in 1 very concise sentence focusing on the core event (e.g. 'Board declared dividend of Rs 5'). Keep it factual:\n\n{prompt_text}"
+            with stage('llm_call', model=model):
+                response = client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {"role": "system", "content": "You are a system logger. Output only factual event summaries."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    max_tokens=100,
+                    temperature=0.2
+                )
+            summary = response.choices[0].message.content.strip()
+            if summary_cache and summary:
+                summary_cache.put(prompt_text, company, model, PROMPT_VARIANT, summary)
+            return summary, None
         except Exception as e:
             pass
             
@@ -112,16 +202,18 @@ def summarize_text(openai_key, text, company, model='gpt-4o-mini'):
 def fetch_price(symbol):
     if not symbol:
         return None
-    try:
-        import yfinance as yf
-        ticker = yf.Ticker(f"{symbol}.NS")
-        hist = ticker.history(period='1d')
-        if hist.empty:
-            return None
-        price = hist['Close'].iloc[-1]
-        return f"{price:.2f}" # Keep it simple number for Utility format
-    except Exception:
-        return "0.00"
+    with stage('price_fetch') as span:
+        try:
+            import yfinance as yf
+            ticker = yf.Ticker(f"{symbol}.NS")
+            hist = ticker.history(period='1d')
+            if hist.empty:
+                return None
+            price = hist['Close'].iloc[-1]
+            return f"{price:.2f}" # Keep it simple number for Utility format
+        except Exception:
+            span['outcome'] = 'error'
+            return "0.00"
 
 
 def normalize_phone(phone):
@@ -195,18 +287,53 @@ def build_template_payload(template_name, to, user_name, item_id, value_metric,
     return payload
 
 
-def send_message(token, phone_id, payload):
-    url = f"https://graph.facebook.com/v22.0/{phone_id}/messages"
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
-    resp = requests.post(url, headers=headers, json=payload, timeout=30)
-    resp.raise_for_status()
-    return resp.json()
-
+def enqueue_digests(queue, matches, template_name, window_minutes, verbose=False):
+    """Queue digest-mode matches, one message per (filing, subscriber) tagged with its digest group.
 
-def main():
+    The same key as a non-digest send is used, so a filing is only ever
+    sent once per subscriber. Grouped messages are held until their window
+    ends; `compose_digests` merges a group when draining.
+    """
+    priority_subjects = priority_subjects_from_env()
+    messages = []
+    for m in matches:
+        payload = build_template_payload(template_name, m['phone'], m['name'], f"REF-{m['symbol']}",
+                                         m['price'], m['summary'])
+        group, not_before = digest_window(m, window_minutes, priority_subjects)
+        digest = None if group is None else {'group': group, 'symbol': m['symbol'], 'summary': m['summary'],
+                                             'name': m['name']}
+        messages.append((m['filing_id'], m['phone'], template_name, payload, digest, not_before))
+    queued = queue.enqueue_many(messages)
+    grouped = sum(1 for message in messages if message[4] is not None)
+    print(f"→ Digest mode: {len(matches)} matches ({grouped} digestible, {len(matches) - grouped} priority), "
+          f"{queued} newly queued")
+    if verbose:
+        groups = {}
+        for message in messages:
+            if message[4] is not None:
+                groups[message[4]['group']] = groups.get(message[4]['group'], 0) + 1
+        for group, count in sorted(groups.items()):
+            print(f'  → {group}: {count} filing(s)')
+    return queued
+
+
+def compose_digests(docs):
+    """drain() composer: one digest message per group of pending messages."""
+    units = []
+    for unit in group_claimed(docs):
+        if len(unit) == 1:
+            units.append((unit[0]['payload'], unit))
+            continue
+        first = unit[0]
+        symbols = [doc['digest']['symbol'] for doc in unit]
+        item_id = 'DIGEST: ' + ', '.join(symbols[:3]) + (f' +{len(symbols) - 3}' if len(symbols) > 3 else '')
+        payload = build_template_payload(first['template'], first['phone'], first['digest']['name'], item_id,
+                                         f"{len(symbols)} filings", format_digest([doc['digest'] for doc in unit]))
+        units.append((payload, unit))
+    return units
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser()
     parser.add_argument('--mongo-uri', help='MongoDB URI')
     parser.add_argument('--limit', type=int, default=0, help='Limit companies (0=all)')
@@ -215,13 +342,23 @@ def main():
     parser.add_argument('--send', action='store_true', help='Send WhatsApp messages')
     parser.add_argument('--template', default='alert_notification_v5', help='WhatsApp template name')
     parser.add_argument('--recipients', help='Comma-separated phone numbers to force send (overrides DB)')
-    args = parser.parse_args()
+    parser.add_argument('--no-pdf-cache', action='store_true', help='Do not read or write the extracted-text cache')
+    parser.add_argument('--no-summary-cache', action='store_true', help='Do not read or write the summary cache')
+    parser.add_argument('--sync-subscriptions', action='store_true',
+                        help='Re-sync the subscriber index now instead of every SUBSCRIPTION_SYNC_SECONDS')
+    parser.add_argument('--digest', action='store_true',
+                        default=os.environ.get('DIGEST_MODE', '').lower() in ('1', 'true', 'yes'),
+                        help="Send one digest per subscriber per window instead of one message per filing")
+    parser.add_argument('--digest-window-minutes', type=int,
+                        default=int(os.environ.get('DIGEST_WINDOW_MINUTES', 60)),
+                        help='Digest window length in minutes (default: 60)')
+    args = parser.parse_args(argv)
 
     load_env_file('.env.local')
     mongo_uri = os.environ.get('MONGO_URI') or os.environ.get('MONGODB_URI') or args.mongo_uri
     if not mongo_uri:
         print('✗ ERROR: MONGO_URI must be set')
-        return
+        sys.exit(1)
 
     openai_key = os.environ.get('OPENAI_API_KEY')
     fetch_price_flag = os.environ.get('FETCH_PRICE', '').lower() in ('1', 'true', 'yes')
@@ -230,7 +367,9 @@ def main():
     send_messages = args.send and whatsapp_token and whatsapp_phone_id
     
     if args.send and not send_messages:
-        print('WARNING: --send flag provided but WHATSAPP credentials missing.')
+        # Fail instead of summarizing silently, so a scheduled send stage isn't reported healthy
+        print('✗ ERROR: --send flag provided but WHATSAPP_TOKEN/WHATSAPP_PHONE_ID are missing')
+        sys.exit(4)
 
     # Force recipients logic (CLI override)
     force_recipients = []
@@ -249,10 +388,23 @@ def main():
 
     last_coll = db['last_hour']
     hourly_coll = db['hourly_summaries']
-    contacts_coll = db['nse data']
     session = requests.Session()
     session.headers.update({'User-Agent': 'Mozilla/5.0'})
 
+    pdf_cache = None
+    if not args.no_pdf_cache:
+        try:
+            pdf_cache = PdfTextCache()
+        except Exception as e:
+            print(f'WARNING: PDF text cache unavailable, continuing without it: {e}')
+
+    summary_cache = None
+    if openai_key and not args.no_summary_cache:
+        try:
+            summary_cache = SummaryCache()
+        except Exception as e:
+            print(f'WARNING: summary cache unavailable, continuing without it: {e}')
+
     try:
         docs = list(last_coll.find())
     except Exception:
@@ -263,57 +415,67 @@ def main():
     if args.limit and args.limit > 0:
         docs = docs[:args.limit]
     
-    # === Load Recipients by Symbol ===
-    contacts_by_symbol = {}
+    # === Subscriber index (alias -> contacts), synced incrementally ===
+    subscriptions = None
     if send_messages and not force_recipients:
         try:
-            all_contacts = list(contacts_coll.find())
-            print(f'Found {len(all_contacts)} contacts in database')
-            # Build a map: symbol -> list of contacts interested in that symbol
-            for contact in all_contacts:
-                phone = normalize_phone(contact.get('phone') or contact.get('mobile'))
-                if not phone:
-                    continue
-                name = contact.get('name', 'Subscriber')
-                # Get the list of selected companies/symbols
-                selected = contact.get('profile', {}).get('selectedCompanies', [])
-                for symbol in selected:
-                    if symbol not in contacts_by_symbol:
-                        contacts_by_symbol[symbol] = []
-                    contacts_by_symbol[symbol].append({'phone': phone, 'name': name})
-            if args.verbose:
-                print(f'Loaded contacts for {len(contacts_by_symbol)} unique symbols')
+            subscriptions = SubscriptionIndex(db)
+            subscriptions.ensure_indexes()
+            stats = subscriptions.sync(force=args.sync_subscriptions)
+            if stats is not None:
+                print(f"Synced subscriptions ({stats['mode']}): {stats['contacts']} contacts, "
+                      f"{stats['added']} added, {stats['updated']} updated, {stats['removed']} removed")
         except Exception as e:
-            print(f'WARNING: Could not load contacts: {e}')
+            print(f'WARNING: Could not sync subscriptions: {e}')
+
+    sender = sender_from_env(whatsapp_token, whatsapp_phone_id, db=db) if send_messages else None
+    # Messages are queued per (filing, phone, template) and sent at the end,
+    # so a re-run after a crash only sends what is still pending
+    queue = open_queue(db) if send_messages else None
+
+    def report(result):
+        if result['ok']:
+            counters['messages_sent'] += 1
+            print(f"  ✓ Message sent to {result['to']}")
+        else:
+            counters['messages_failed'] += 1
+            print(f"  ✗ Error to {result['to']} after {result['attempts']} attempt(s): {result['error']}")
+
+    counters = {'processed': 0, 'messages_sent': 0, 'messages_failed': 0, 'summaries_success': 0,
+                'enqueue_failed': 0}
+    # Digest mode: (filing, subscriber) matches, grouped after the loop
+    matches = []
+
+    # Download every attachment first so the process pool extracts them in parallel
+    filings = []
+    for doc in docs:
+        company = doc.get('_id') or doc.get('company') or doc.get('latest', {}).get('Company')
+        if not company: continue
 
-    counters = {'processed': 0, 'messages_sent': 0, 'messages_failed': 0, 'summaries_success': 0}
+        counters['processed'] += 1
+        latest = doc.get('latest', {})
+        attachment = latest.get('Attachment_URL') or latest.get('attchmntFile') or ''
+        symbol = latest.get('Symbol') or latest.get('symbol') or company.replace(' ', '')
 
-    for doc in docs:
+        if not attachment:
+            print(f'- {company}: No attachment, skipping')
+            continue
+
+        if attachment.startswith('/'):
+            attachment = urljoin('https://www.nseindia.com', attachment)
+
+        print(f'- {company}: Downloading PDF...')
+        filings.append((company, latest, attachment, symbol))
+    texts = get_attachment_texts(session, [filing[2] for filing in filings], pdf_cache)
+
+    for company, latest, attachment, symbol in filings:
         try:
-            company = doc.get('_id') or doc.get('company') or doc.get('latest', {}).get('Company')
-            if not company: continue
-            
-            counters['processed'] += 1
-            latest = doc.get('latest', {})
-            attachment = latest.get('Attachment_URL') or latest.get('attchmntFile') or ''
-            symbol = latest.get('Symbol') or latest.get('symbol') or company.replace(' ', '')
-            
-            if not attachment:
-                print(f'- {company}: No attachment, skipping')
-                continue
-                
-            if attachment.startswith('/'):
-                attachment = urljoin('https://www.nseindia.com', attachment)
+            text = texts[attachment]
+            if isinstance(text, Exception):
+                raise text
 
-            print(f'- {company}: Downloading PDF...')
-            tmp_path, content_type = download_file(session, attachment)
-            
-            text = ''
-            if tmp_path:
-                text = extract_text_from_pdf(tmp_path)
-            
             # Summarize
-            summary, err = summarize_text(openai_key, text, company, model=args.model)
+            summary, err = summarize_text(openai_key, text, company, model=args.model, summary_cache=summary_cache)
             if not err:
                 counters['summaries_success'] += 1
 
@@ -343,59 +505,81 @@ def main():
                 if force_recipients:
                     target_recipients = force_recipients
                 else:
-                    # Check both symbol (e.g., "INFY") and full company name (e.g., "Eros International Media Limited")
-                    recipients_by_symbol = contacts_by_symbol.get(symbol, []) if symbol else []
-                    recipients_by_company = contacts_by_symbol.get(company, []) if company else []
-                    
-                    # Combine and deduplicate by phone number
-                    seen_phones = set()
+                    # Match symbol (e.g., "INFY"), ISIN and company name variants
+                    # (e.g., "Infosys Ltd" / "Infosys Limited"); deduped by phone
                     target_recipients = []
-                    for r in recipients_by_symbol + recipients_by_company:
-                        if r['phone'] not in seen_phones:
-                            seen_phones.add(r['phone'])
-                            target_recipients.append(r)
+                    if subscriptions is not None:
+                        target_recipients = subscriptions.lookup(
+                            symbol=symbol, company=company, isin=latest.get('ISIN') or latest.get('isin'))
                     
                     if args.verbose and target_recipients:
                         names = ', '.join([r['name'] for r in target_recipients[:3]])
                         more = f' and {len(target_recipients)-3} more' if len(target_recipients) > 3 else ''
                         print(f'  → Sending to {len(target_recipients)} subscriber(s): {names}{more}')
                 
+                if args.digest:
+                    matches.extend({
+                        'filing_id': announcement_id(latest),
+                        'phone': recipient['phone'],
+                        'name': recipient.get('name', 'User'),
+                        'symbol': symbol,
+                        'subject': latest.get('Subject') or latest.get('desc'),
+                        'summary': summary,
+                        'price': price_str,
+                        'timestamp': latest.get('Timestamp') or latest.get('an_dt'),
+                    } for recipient in target_recipients)
+                    continue
+
                 # Format Data for Template
                 formatted_item_id = f"REF-{symbol}" 
                 formatted_value = f"{price_str}"
 
-                for recipient in target_recipients:
-                    phone = recipient['phone']
-                    user_name = recipient.get('name', 'User')
-
-                    # Map data to the new Alert variables
-                    payload = build_template_payload(
-                        template_name=args.template, 
-                        to=phone, 
-                        user_name=user_name,       # {{user_name}}
-                        item_id=formatted_item_id, # {{item_id}}
-                        value_metric=formatted_value, # {{value_metric}}
-                        alert_details=summary      # {{alert_details}}
+                # Map data to the new Alert variables
+                payloads = [
+                    build_template_payload(
+                        template_name=args.template,
+                        to=recipient['phone'],
+                        user_name=recipient.get('name', 'User'),  # {{user_name}}
+                        item_id=formatted_item_id,                # {{item_id}}
+                        value_metric=formatted_value,             # {{value_metric}}
+                        alert_details=summary                     # {{alert_details}}
                     )
-
-                    try:
-                        send_message(whatsapp_token, whatsapp_phone_id, payload)
-                        counters['messages_sent'] += 1
-                        print(f'  ✓ Message sent to {phone}')
-                    except requests.HTTPError as he:
-                        counters['messages_failed'] += 1
-                        err = he.response.text if he.response else str(he)
-                        print(f'  ✗ HTTP error to {phone}: {err}')
-                    except Exception as e:
-                        counters['messages_failed'] += 1
-                        print(f'  ✗ Error to {phone}: {e}')
-
+                    for recipient in target_recipients
+                ]
+                queued = queue.enqueue_many(
+                    (announcement_id(latest), p['to'], args.template, p) for p in payloads)
+                if args.verbose:
+                    print(f'  → Queued {queued} new message(s) ({len(payloads) - queued} already queued)')
+
+        except EnqueueError as e:
+            print(f'✗ Could not queue messages for {company}: {e}')
+            counters['enqueue_failed'] += 1
         except Exception as e:
             print(f'Error processing {company}: {e}')
             if args.verbose:
                 traceback.print_exc()
 
+    if matches:
+        try:
+            enqueue_digests(queue, matches, args.template, args.digest_window_minutes, verbose=args.verbose)
+        except EnqueueError as e:
+            print(f'✗ Could not queue digest messages: {e}')
+            counters['enqueue_failed'] += 1
+    if sender:
+        drain(queue, sender, on_result=report, compose=compose_digests if args.digest else None)
+        sender.close()
     print(f"\n=== Summary ===\nProcessed: {counters['processed']}\nMessages Sent: {counters['messages_sent']}\nMessages Failed: {counters['messages_failed']}")
+    if pdf_cache:
+        stats = pdf_cache.stats()
+        print(f"PDF cache: {stats['hits']} hits, {stats['content_hits']} content hits, {stats['misses']} misses")
+        pdf_cache.close()
+    if summary_cache:
+        stats = summary_cache.stats()
+        print(f"Summary cache: {stats['hits']} hits, {stats['misses']} misses")
+        summary_cache.close()
+    if counters['enqueue_failed']:
+        # Unqueued messages were never sent; fail so the scheduler reports it
+        sys.exit(5)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -22,6 +22,20 @@ Environment variables (or use .env.local):
 - OPENAI_API_KEY (optional — when present, uses OpenAI for summarization)
 - FETCH_PRICE (optional; set to 1/true to attempt yfinance price lookup)
 
+Documents are processed as a staged pipeline: attachment downloads, PDF
+text extraction (in a process pool, see `pdf_text.py`), LLM summaries and price lookups each
+run in their own bounded worker pool. Pool sizes can be set with the
+`--*-workers` flags or the matching environment variables:
+- SUMMARIZE_DOWNLOAD_WORKERS (default 8)
+- SUMMARIZE_EXTRACT_WORKERS (default: number of CPUs)
+- SUMMARIZE_LLM_WORKERS (default 4)
+- SUMMARIZE_PRICE_WORKERS (default 4)
+
+Extracted attachment text is kept in the on-disk cache from `pdf_cache.py`
+(see that module for PDF_CACHE_* settings); pass `--no-pdf-cache` to
+bypass it. OpenAI summaries are memoized by `summary_cache.py`
+(SUMMARY_CACHE_* settings); pass `--no-summary-cache` to bypass it.
+
 This file intentionally keeps logic small and readable.
 """
 
@@ -34,9 +48,9 @@ import traceback
 from pymongo import MongoClient
 from datetime import datetime
 from urllib.parse import urljoin
-from PyPDF2 import PdfReader
 import argparse
 import re
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 # Force UTF-8 encoding for stdout/stderr to prevent UnicodeEncodeError on Windows
 if sys.platform == 'win32':
@@ -44,6 +58,14 @@ if sys.platform == 'win32':
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
 
+# Make the repo-root helper modules importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pdf_cache import PdfTextCache, file_sha256
+from summary_cache import SummaryCache
+# `metrics.stage` is used qualified: run_pipeline has its own `stage` variable
+import metrics
+from pdf_text import extract_text, process_pool
+
 
 def load_env_file(path='.env.local'):
     try:
@@ -82,91 +104,155 @@ def connect_db(mongo_uri):
     return client['nse_data']
 
 
-def download_file(session, url, timeout=30):
+def download_file(session, url, timeout=30, meta=None):
+    with metrics.stage('pdf_download') as span:
+        try:
+            resp = session.get(url, timeout=timeout, stream=True)
+            resp.raise_for_status()
+            content_type = resp.headers.get('Content-Type', '')
+            if meta is not None:
+                meta['etag'] = resp.headers.get('ETag')
+                meta['content_length'] = resp.headers.get('Content-Length')
+            ext = '.pdf' if 'pdf' in content_type.lower() or url.lower().endswith('.pdf') else ''
+            tmp = tempfile.NamedTemporaryFile(delete=False, suffix=ext)
+            for chunk in resp.iter_content(chunk_size=8192):
+                if chunk:
+                    tmp.write(chunk)
+            tmp.flush()
+            tmp.close()
+            return tmp.name, content_type
+        except Exception:
+            span['outcome'] = 'error'
+            return None, None
+
+
+def download_attachment(session, url):
+    """Download an attachment and hash it; returns (path, content_type, meta)."""
+    meta = {}
+    tmp_path, content_type = download_file(session, url, meta=meta)
+    if tmp_path:
+        meta['sha256'] = file_sha256(tmp_path)
+    return tmp_path, content_type, meta
+
+
+def extract_pdf(path, max_pages=10):
+    """Return (text, page_count) for a PDF, stopping once the prompt has enough text."""
+    result = extract_text(path, max_pages=max_pages)
+    return result['text'], result['page_count']
+
+
+def extract_text_from_pdf(path, max_pages=10):
+    return extract_pdf(path, max_pages=max_pages)[0]
+
+
+def extract_attachment_text(path, content_type):
+    """Extract (text, page_count) from a downloaded attachment (PDF or plain text).
+
+    Kept at module level so it can be shipped to a process pool worker.
+    """
+    if path.lower().endswith('.pdf') or ('pdf' in (content_type or '').lower()):
+        return extract_pdf(path, max_pages=10)
     try:
-        resp = session.get(url, timeout=timeout, stream=True)
-        resp.raise_for_status()
-        content_type = resp.headers.get('Content-Type', '')
-        ext = '.pdf' if 'pdf' in content_type.lower() or url.lower().endswith('.pdf') else ''
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=ext)
-        for chunk in resp.iter_content(chunk_size=8192):
-            if chunk:
-                tmp.write(chunk)
-        tmp.flush()
-        tmp.close()
-        return tmp.name, content_type
+        with open(path, 'r', encoding='utf-8', errors='ignore') as fh:
+            return fh.read(), None
     except Exception:
-        return None, None
+        return '', None
 
 
-def extract_text_from_pdf(path, max_pages=10):
+def timed_extract_attachment_text(path, content_type):
+    """extract_attachment_text plus its duration, measured in the worker process.
+
+    Stage metrics live in the parent process, which records the duration.
+    """
+    started = time.perf_counter()
+    text, page_count = extract_attachment_text(path, content_type)
+    return text, page_count, time.perf_counter() - started
+
+
+# Bump when the prompt below changes so cached summaries are not reused
+PROMPT_VARIANT = 'last_hour_2sent_v1'
+
+_openai_clients = {}
+
+
+def get_openai_client(openai_key):
+    """Return one shared OpenAI client per API key instead of one per document."""
+    client = _openai_clients.get(openai_key)
+    if client is None:
+        from openai import OpenAI
+        client = OpenAI(api_key=openai_key)
+        _openai_clients[openai_key] = client
+    return client
+
+
+def openai_summary(openai_key, prompt, model):
+    """Call OpenAI (new client, then legacy interface); returns text or None."""
     try:
-        reader = PdfReader(path)
-        texts = []
-        num_pages = len(reader.pages)
-        page_count = min(num_pages, max_pages) if max_pages else num_pages
-        for i in range(page_count):
+        client = get_openai_client(openai_key)
+        resp = client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": "You are a concise assistant summarizing corporate filings."},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=200,
+            temperature=0.2,
+        )
+        # New client returns choices with message content
+        if resp and getattr(resp, 'choices', None) and len(resp.choices) > 0:
             try:
-                texts.append(reader.pages[i].extract_text() or '')
+                return resp.choices[0].message.content.strip()
             except Exception:
-                texts.append('')
-        return '\n\n'.join(texts).strip()
+                # some older wrappers may return dict-like
+                return resp['choices'][0]['message']['content'].strip()
     except Exception:
-        return ''
+        # If new client failed, try legacy interface as a backup
+        import openai as legacy_openai
+        legacy_openai.api_key = openai_key
+        resp = legacy_openai.ChatCompletion.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": "You are a concise assistant summarizing corporate filings."},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=200,
+            temperature=0.2,
+        )
+        if resp and 'choices' in resp and len(resp['choices']) > 0:
+            return resp['choices'][0]['message']['content'].strip()
+    return None
 
 
-def summarize_text(openai_key, text, company, model='gpt-4o-mini'):
+def summarize_text(openai_key, text, company, model='gpt-4o-mini', summary_cache=None):
     """Use OpenAI if key is present; otherwise produce a short fallback summary.
 
     This function is resilient: it first attempts the new `openai.OpenAI`
     client (openai>=1.0.0). If that fails for any reason it will fall back
     to a simple heuristic summary so the script can continue and still
-    produce a usable `update` text.
+    produce a usable `update` text. OpenAI summaries are memoized in
+    `summary_cache` when one is given.
     """
     if not text:
         return f"No extracted text for {company}. See attachment.", None
 
     # Try OpenAI new client first (works for openai>=1.0.0)
     if openai_key:
+        prompt_text = text[:15000]
+        if summary_cache:
+            cached = summary_cache.get(prompt_text, company, model, PROMPT_VARIANT)
+            if cached:
+                return cached, None
         prompt = (
             f"Summarize the filing for {company} in 2 short sentences, focus on the key point and an action.\n\n" +
-            (text[:15000])
+            prompt_text
         )
         try:
-            try:
-                from openai import OpenAI
-                client = OpenAI(api_key=openai_key)
-                resp = client.chat.completions.create(
-                    model=model,
-                    messages=[
-                        {"role": "system", "content": "You are a concise assistant summarizing corporate filings."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    max_tokens=200,
-                    temperature=0.2,
-                )
-                # New client returns choices with message content
-                if resp and getattr(resp, 'choices', None) and len(resp.choices) > 0:
-                    try:
-                        return resp.choices[0].message.content.strip(), None
-                    except Exception:
-                        # some older wrappers may return dict-like
-                        return resp['choices'][0]['message']['content'].strip(), None
-            except Exception:
-                # If new client failed, try legacy interface as a backup
-                import openai as legacy_openai
-                legacy_openai.api_key = openai_key
-                resp = legacy_openai.ChatCompletion.create(
-                    model=model,
-                    messages=[
-                        {"role": "system", "content": "You are a concise assistant summarizing corporate filings."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    max_tokens=200,
-                    temperature=0.2,
-                )
-                if resp and 'choices' in resp and len(resp['choices']) > 0:
-                    return resp['choices'][0]['message']['content'].strip(), None
+            with metrics.stage('llm_call', model=model):
+                summary = openai_summary(openai_key, prompt, model)
+            if summary:
+                if summary_cache:
+                    summary_cache.put(prompt_text, company, model, PROMPT_VARIANT, summary)
+                return summary, None
         except Exception as e:
             # Log the error and continue to fallback heuristic summary below
             print(f"[warning] OpenAI call failed, falling back to heuristic summary: {e}")
@@ -189,28 +275,30 @@ def fetch_price(symbol):
     if not symbol:
         return None
     ticker = symbol if '.' in symbol or symbol.endswith('.NS') else symbol + '.NS'
-    try:
-        t = yf.Ticker(ticker)
-        fi = getattr(t, 'fast_info', None)
-        price = None
-        prev = None
-        if fi:
-            price = fi.get('lastPrice') or fi.get('last_price')
-            prev = fi.get('previous_close')
-        if price is None:
-            hist = t.history(period='1d')
-            if not hist.empty:
-                last_row = hist.iloc[-1]
-                price = last_row.get('Close') or last_row.get('close')
-        if price is None:
+    with metrics.stage('price_fetch') as span:
+        try:
+            t = yf.Ticker(ticker)
+            fi = getattr(t, 'fast_info', None)
+            price = None
+            prev = None
+            if fi:
+                price = fi.get('lastPrice') or fi.get('last_price')
+                prev = fi.get('previous_close')
+            if price is None:
+                hist = t.history(period='1d')
+                if not hist.empty:
+                    last_row = hist.iloc[-1]
+                    price = last_row.get('Close') or last_row.get('close')
+            if price is None:
+                return None
+            p = float(price)
+            if prev:
+                pct = (p - float(prev)) / float(prev) * 100.0
+                return f"₹{p:.2f} ({pct:+.2f}%)"
+            return f"₹{p:.2f}"
+        except Exception:
+            span['outcome'] = 'error'
             return None
-        p = float(price)
-        if prev:
-            pct = (p - float(prev)) / float(prev) * 100.0
-            return f"₹{p:.2f} ({pct:+.2f}%)"
-        return f"₹{p:.2f}"
-    except Exception:
-        return None
 
 
 def build_template_message(company, price_str, update_summary, attachment_url):
@@ -234,13 +322,172 @@ def build_template_message(company, price_str, update_summary, attachment_url):
     return tpl, filled
 
 
-def main():
+def env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def run_pipeline(items, session, workers, openai_key, model, fetch_price_flag, last_coll, counters, verbose=False,
+                 pdf_cache=None, summary_cache=None):
+    """Run download -> extract -> summarize (+ price) -> update for every item.
+
+    Each stage has its own bounded pool; the main thread only moves items
+    between stages and writes results, so `counters` is never shared
+    across threads. With `pdf_cache`, known attachments skip straight to
+    the summarize stage.
+    """
+    download_pool = ThreadPoolExecutor(max_workers=workers['download'])
+    # forkserver/spawn workers: this runs in a server job thread, so no fork
+    extract_pool = process_pool(workers['extract'])
+    llm_pool = ThreadPoolExecutor(max_workers=workers['llm'])
+    price_pool = ThreadPoolExecutor(max_workers=workers['price'])
+
+    pending = {}
+    state = {}
+
+    def submit(stage, item, pool, fn, *fn_args):
+        if pool is extract_pool:
+            # Worker processes record nothing; the parent observes text_extract
+            future = pool.submit(fn, *fn_args)
+        else:
+            future = metrics.submit_with_context(pool, fn, *fn_args)
+        pending[future] = (stage, item)
+
+    def fail(item, message, counter='summaries_failed'):
+        print(message)
+        counters[counter] += 1
+        state.pop(item['company'], None)
+
+    def start_summary(item, text):
+        if not text:
+            print(f'  → extracted text empty for {item["company"]}')
+            counters['extraction_empty'] += 1
+        submit('summarize', item, llm_pool, summarize_text, openai_key, text, item['company'], model, summary_cache)
+
+    def maybe_write(item):
+        st = state.get(item['company'])
+        if st is None or 'summary' not in st or 'price' not in st:
+            return
+        state.pop(item['company'], None)
+        company = item['company']
+        summary = st['summary']
+        price_str = st['price']
+        now = datetime.utcnow()
+
+        # Build template message
+        tpl, whatsapp_msg = build_template_message(company, price_str, summary, item['attachment'])
+
+        # ONLY update last_hour collection with summary results
+        try:
+            last_up = {
+                '$set': {
+                    'latest.summary': summary,
+                    'latest.update': summary,
+                    'latest.whatsapp_template': tpl,
+                    'latest.price': price_str,
+                    'latest.current_price': price_str,
+                    'latest.customers': [],
+                    'latest.summary_at': now,
+                    'latest.attachment_processed': True,
+                }
+            }
+            last_coll.update_one({'_id': company}, last_up, upsert=True)
+            if verbose:
+                print(f'  ✓ updated last_hour.latest for {company}')
+        except Exception as e:
+            print(f'  ✗ failed to update last_hour for {company}: {e}')
+            counters['last_hour_errors'] += 1
+
+    try:
+        for item in items:
+            company = item['company']
+            state[company] = {}
+            cached = pdf_cache.get(item['attachment'], session) if pdf_cache else None
+            if cached is not None:
+                if verbose:
+                    print(f'- {company}: using cached text for {item["attachment"]}')
+                start_summary(item, cached[0])
+            else:
+                print(f'- {company}: downloading {item["attachment"]}')
+                submit('download', item, download_pool, download_attachment, session, item['attachment'])
+            if fetch_price_flag:
+                submit('price', item, price_pool, fetch_price, item['symbol'])
+            else:
+                state[company]['price'] = None
+
+        while pending:
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, item = pending.pop(future)
+                company = item['company']
+                if company not in state:
+                    # An earlier stage already failed for this item
+                    continue
+                try:
+                    result = future.result()
+                except Exception as e:
+                    fail(item, f'Error processing {company} ({stage}): {e}\n{traceback.format_exc()}')
+                    continue
+
+                if stage == 'download':
+                    tmp_path, content_type, meta = result
+                    if not tmp_path:
+                        fail(item, f'  ✗ failed to download attachment for {company}', 'download_fail')
+                        continue
+                    item['meta'] = meta
+                    cached = None
+                    if pdf_cache:
+                        cached = pdf_cache.get_by_hash(
+                            meta['sha256'], url=item['attachment'],
+                            etag=meta.get('etag'), content_length=meta.get('content_length'),
+                        )
+                    if cached is not None:
+                        start_summary(item, cached[0])
+                    else:
+                        submit('extract', item, extract_pool, timed_extract_attachment_text, tmp_path, content_type)
+                elif stage == 'extract':
+                    text, page_count, seconds = result
+                    metrics.observe_stage('text_extract', seconds, company=company)
+                    if pdf_cache and text:
+                        # Empty text is not cached, so a failed parse is retried next run
+                        meta = item['meta']
+                        pdf_cache.put(
+                            item['attachment'], meta['sha256'], text, page_count,
+                            etag=meta.get('etag'), content_length=meta.get('content_length'),
+                        )
+                    start_summary(item, text)
+                elif stage == 'summarize':
+                    summary, err = result
+                    if err:
+                        print(f'  ✗ summarization error for {company}: {err}')
+                        counters['summaries_failed'] += 1
+                    else:
+                        counters['summaries_success'] += 1
+                    state[company]['summary'] = summary
+                    maybe_write(item)
+                elif stage == 'price':
+                    state[company]['price'] = result
+                    maybe_write(item)
+    finally:
+        for pool in (download_pool, extract_pool, llm_pool, price_pool):
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser(description='Clean summarizer: update last_hour/company-map with template fields')
     parser.add_argument('--mongo-uri', help='MongoDB URI (overrides MONGO_URI env var)')
     parser.add_argument('--limit', type=int, default=0, help='Limit how many companies to process (0=all)')
     parser.add_argument('--model', default='gpt-4o-mini', help='OpenAI model to use if OPENAI_API_KEY is set')
+    parser.add_argument('--download-workers', type=int, default=env_int('SUMMARIZE_DOWNLOAD_WORKERS', 8), help='Concurrent attachment downloads')
+    parser.add_argument('--extract-workers', type=int, default=env_int('SUMMARIZE_EXTRACT_WORKERS', os.cpu_count() or 2), help='Processes used for PDF text extraction')
+    parser.add_argument('--llm-workers', type=int, default=env_int('SUMMARIZE_LLM_WORKERS', 4), help='Concurrent summarization calls')
+    parser.add_argument('--price-workers', type=int, default=env_int('SUMMARIZE_PRICE_WORKERS', 4), help='Concurrent price lookups')
+    parser.add_argument('--no-pdf-cache', action='store_true', help='Do not read or write the extracted-text cache')
+    parser.add_argument('--no-summary-cache', action='store_true', help='Do not read or write the summary cache')
     parser.add_argument('--verbose', '-v', action='store_true', help='Enable verbose output')
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     load_env_file('.env.local')
     mongo_uri = get_env('MONGO_URI', default=args.mongo_uri or os.environ.get('MONGODB_URI'))
@@ -250,6 +497,12 @@ def main():
 
     openai_key = os.environ.get('OPENAI_API_KEY')
     fetch_price_flag = os.environ.get('FETCH_PRICE', '').lower() in ('1', 'true', 'yes')
+    workers = {
+        'download': max(1, args.download_workers),
+        'extract': max(1, args.extract_workers),
+        'llm': max(1, args.llm_workers),
+        'price': max(1, args.price_workers),
+    }
 
     db = None
     try:
@@ -263,6 +516,10 @@ def main():
 
     session = requests.Session()
     session.headers.update({'User-Agent': 'Mozilla/5.0', 'Accept': '*/*'})
+    # Size the connection pool so concurrent downloads can reuse connections
+    adapter = requests.adapters.HTTPAdapter(pool_connections=workers['download'], pool_maxsize=workers['download'])
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
 
     try:
         # Only fetch documents that haven't been summarized yet
@@ -297,84 +554,45 @@ def main():
         'last_hour_errors': 0,
     }
 
+    items = []
     for doc in docs:
+        company = doc.get('_id') or doc.get('company') or doc.get('latest', {}).get('Company')
+        if not company:
+            print('Skipping doc with no company id')
+            continue
+        counters['processed'] += 1
+        latest = doc.get('latest', {})
+        attachment = latest.get('Attachment_URL') or latest.get('attchmntFile') or ''
+        if not attachment:
+            print(f'- {company}: no attachment URL, skipping')
+            counters['skipped_no_attachment'] += 1
+            continue
+        if attachment.startswith('/'):
+            attachment = urljoin('https://www.nseindia.com', attachment)
+        items.append({
+            'company': company,
+            'attachment': attachment,
+            'symbol': latest.get('Symbol') or latest.get('symbol'),
+        })
+
+    if verbose:
+        print(f'Workers: {workers}')
+    pdf_cache = None
+    if not args.no_pdf_cache:
         try:
-            company = doc.get('_id') or doc.get('company') or doc.get('latest', {}).get('Company')
-            if not company:
-                print('Skipping doc with no company id')
-                continue
-            counters['processed'] += 1
-            latest = doc.get('latest', {})
-            attachment = latest.get('Attachment_URL') or latest.get('attchmntFile') or ''
-            if not attachment:
-                print(f'- {company}: no attachment URL, skipping')
-                counters['skipped_no_attachment'] += 1
-                continue
-            if attachment.startswith('/'):
-                attachment = urljoin('https://www.nseindia.com', attachment)
-
-            print(f'- {company}: downloading {attachment}')
-            tmp_path, content_type = download_file(session, attachment)
-            if not tmp_path:
-                print(f'  ✗ failed to download attachment for {company}')
-                counters['download_fail'] += 1
-                continue
-
-            text = ''
-            if tmp_path.lower().endswith('.pdf') or ('pdf' in (content_type or '').lower()):
-                text = extract_text_from_pdf(tmp_path, max_pages=10)
-            else:
-                try:
-                    with open(tmp_path, 'r', encoding='utf-8', errors='ignore') as fh:
-                        text = fh.read()
-                except Exception:
-                    text = ''
-
-            if not text:
-                print(f'  → extracted text empty for {company}')
-                counters['extraction_empty'] += 1
-
-            summary, err = summarize_text(openai_key, text, company, model=args.model)
-            if err:
-                print(f'  ✗ summarization error for {company}: {err}')
-                counters['summaries_failed'] += 1
-            else:
-                counters['summaries_success'] += 1
-
-            price_str = None
-            if fetch_price_flag:
-                symbol = latest.get('Symbol') or latest.get('symbol')
-                price_str = fetch_price(symbol)
-
-            now = datetime.utcnow()
-
-            # Build template message
-            tpl, whatsapp_msg = build_template_message(company, price_str, summary, attachment)
-
-            # ONLY update last_hour collection with summary results
-            try:
-                last_up = {
-                    '$set': {
-                        'latest.summary': summary,
-                        'latest.update': summary,
-                        'latest.whatsapp_template': tpl,
-                        'latest.price': price_str,
-                        'latest.current_price': price_str,
-                        'latest.customers': [],
-                        'latest.summary_at': now,
-                        'latest.attachment_processed': True,
-                    }
-                }
-                last_coll.update_one({'_id': company}, last_up, upsert=True)
-                if verbose:
-                    print(f'  ✓ updated last_hour.latest for {company}')
-            except Exception as e:
-                print(f'  ✗ failed to update last_hour for {company}: {e}')
-                counters['last_hour_errors'] += 1
-
+            pdf_cache = PdfTextCache()
+        except Exception as e:
+            print(f'WARNING: PDF text cache unavailable, continuing without it: {e}')
+    summary_cache = None
+    if openai_key and not args.no_summary_cache:
+        try:
+            summary_cache = SummaryCache()
         except Exception as e:
-            print(f'Error processing company doc: {e}\n{traceback.format_exc()}')
-            counters['summaries_failed'] += 1
+            print(f'WARNING: summary cache unavailable, continuing without it: {e}')
+    # Root span: the stage workers' spans share its trace
+    with metrics.stage('summarize_run', items=len(items)):
+        run_pipeline(items, session, workers, openai_key, args.model, fetch_price_flag, last_coll, counters,
+                     verbose=verbose, pdf_cache=pdf_cache, summary_cache=summary_cache)
 
     # Final summary and exit code
     print('\n=== Summary ===')
@@ -386,6 +604,14 @@ def main():
     print(f"Summaries succeeded: {counters['summaries_success']}")
     print(f"Summaries failed: {counters['summaries_failed']}")
     print(f"last_hour update errors: {counters['last_hour_errors']}")
+    if pdf_cache:
+        stats = pdf_cache.stats()
+        print(f"PDF cache: {stats['hits']} hits, {stats['content_hits']} content hits, {stats['misses']} misses")
+        pdf_cache.close()
+    if summary_cache:
+        stats = summary_cache.stats()
+        print(f"Summary cache: {stats['hits']} hits, {stats['misses']} misses")
+        summary_cache.close()
 
     critical_failures = counters['download_fail'] + counters['summaries_failed'] + counters['last_hour_errors']
     if critical_failures > 0:
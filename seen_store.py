@@ -0,0 +1,102 @@
+"""Persistent record of announcements that have already been reported.
+
+`main.py` used to diff each fetch against a JSON snapshot of the previous
+50 filings, so anything that dropped out of that window and came back was
+reported as new again. This store keeps every announcement ID in a local
+SQLite table (primary-key lookups, one transaction per batch) and forgets
+IDs that have not been seen for the TTL.
+
+An ID is `symbol_broadcast-date_subject`, the key `main.py` has always used.
+
+Environment variables:
+- SEEN_STORE_PATH (default .cache/seen_announcements.sqlite)
+- SEEN_STORE_TTL_DAYS (default 90)
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+
+DEFAULT_STORE_PATH = os.path.join('.cache', 'seen_announcements.sqlite')
+DEFAULT_TTL_DAYS = 90
+
+
+def announcement_id(filing):
+    return f"{filing['symbol']}_{filing['broadcast_date']}_{filing['subject']}"
+
+
+def _env_number(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+class SeenStore:
+    """SQLite set of announcement IDs with last-seen TTL pruning."""
+
+    def __init__(self, path=None, ttl_seconds=None, clock=time.time):
+        self.path = path or os.environ.get('SEEN_STORE_PATH') or DEFAULT_STORE_PATH
+        if ttl_seconds is None:
+            ttl_seconds = _env_number('SEEN_STORE_TTL_DAYS', DEFAULT_TTL_DAYS) * 86400
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS seen ('
+                ' id TEXT PRIMARY KEY, first_seen REAL NOT NULL, last_seen REAL NOT NULL'
+                ') WITHOUT ROWID'
+            )
+            self._conn.execute('CREATE INDEX IF NOT EXISTS seen_last_seen ON seen(last_seen)')
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM seen').fetchone()[0]
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._conn.execute('SELECT 1 FROM seen WHERE id = ?', (key,)).fetchone() is not None
+
+    def filter_new(self, filings):
+        """Return the filings not seen before and record all of them as seen.
+
+        Duplicates within `filings` are reported once. Every ID in the batch
+        has its last-seen time refreshed, so an announcement that stays in
+        the feed is never pruned.
+        """
+        now = self._clock()
+        new, batch = [], set()
+        with self._lock, self._conn:
+            for filing in filings:
+                key = announcement_id(filing)
+                if key in batch:
+                    continue
+                batch.add(key)
+                if self._conn.execute('SELECT 1 FROM seen WHERE id = ?', (key,)).fetchone() is None:
+                    new.append(filing)
+            self._conn.executemany(
+                'INSERT INTO seen (id, first_seen, last_seen) VALUES (?, ?, ?)'
+                ' ON CONFLICT(id) DO UPDATE SET last_seen = excluded.last_seen',
+                [(key, now, now) for key in batch],
+            )
+        return new
+
+    def prune(self):
+        """Forget IDs not seen within the TTL. Returns how many were removed."""
+        with self._lock, self._conn:
+            cursor = self._conn.execute('DELETE FROM seen WHERE last_seen < ?',
+                                        (self._clock() - self.ttl_seconds,))
+            return cursor.rowcount
@@ -1,21 +1,34 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 import os
 import sys
-import subprocess
+import importlib
 import logging
-from datetime import datetime as dt
 
 # Import the provided scraper
 from nse_scrapper import NSEScraper
+from company_history import COLLECTION_NAME as HISTORY_COLLECTION, CompanyHistory
+from jobs import JobRunner, run_entrypoint
+import metrics
+from scheduler import MarketCalendar, PipelineScheduler, SingleFlightLock, parse_holidays
 
 app = Flask(__name__)
 logging.basicConfig(level=logging.INFO)
 
+# The summarizer/sender scripts are imported and run in-process, so make
+# the scripts directory importable.
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts')
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+# Background job runner used by the /api/* endpoints
+JOBS = JobRunner(max_workers=int(os.environ.get('JOB_WORKERS', 2)))
+
 
 # Optional MongoDB support: if MONGODB_URI is set the server will save
-# scraped announcements into the `company` collection using Company name
-# as the document _id and pushing announcements to an `announcements` array.
+# scraped announcements into the `company_history` collection, bucketed
+# per company and month (see company_history.py).
 DB = None
+HISTORY = None
 MONGODB_URI = os.environ.get("MONGODB_URI")
 MONGODB_DB = os.environ.get("MONGODB_DB", "stockalert")
 
@@ -27,12 +40,21 @@ if MONGODB_URI:
         client.admin.command("ping")
         DB = client[MONGODB_DB]
         print(f"✓ Connected to MongoDB database: {MONGODB_DB}")
+        HISTORY = CompanyHistory(DB[HISTORY_COLLECTION])
+        HISTORY.ensure_indexes()
     except Exception as e:
         print(f"✗ MongoDB connection failed: {e}")
         DB = None
+        HISTORY = None
 else:
     print("→ No MONGODB_URI configured. Database disabled.")
 
+# One pipeline run at a time, across the scheduler, the manual pipeline routes
+# (/api/scrape, /api/summarize, /api/summarize_hour, /api/run_all) and (via
+# the MongoDB lease) other server processes.
+PIPELINE_LOCK = SingleFlightLock('pipeline', collection=DB['scheduler_locks'] if DB is not None else None)
+SCHEDULER = None
+
 
 def load_env_file(path='.env.local'):
     """Load simple KEY=VAL lines into environment if not present.
@@ -55,41 +77,114 @@ def load_env_file(path='.env.local'):
         return
 
 
-def run_script(path, args=None, timeout=300):
-    """Run a python script via subprocess and return output dict."""
-    cmd = [sys.executable, path]
-    if args:
-        cmd += args
-    env = os.environ.copy()
+def run_script(module_name, args=None):
+    """Run a pipeline entry point (`<module>.main(argv)`) in-process and return output dict.
+
+    `module_name` is `nse_scrapper` or a module from `scripts/`. The result
+    has the same keys the old subprocess runner returned.
+    """
     # ensure .env.local is loaded for credentials
     load_env_file('.env.local')
     try:
-        proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env, text=True, timeout=timeout)
-        return {
-            'returncode': proc.returncode,
-            'stdout': proc.stdout,
-            'stderr': proc.stderr,
-            'cmd': ' '.join(cmd),
-        }
-    except subprocess.TimeoutExpired as te:
-        return {'returncode': 2, 'stdout': te.stdout or '', 'stderr': f'Timeout: {te}', 'cmd': ' '.join(cmd)}
+        module = importlib.import_module(module_name)
     except Exception as e:
-        return {'returncode': 3, 'stdout': '', 'stderr': str(e), 'cmd': ' '.join(cmd)}
+        return {'returncode': 3, 'stdout': '', 'stderr': f'Could not import {module_name}: {e}', 'cmd': module_name}
+    return run_entrypoint(module.main, args, name=module_name)
+
+
+def script_job(module_name, args=None):
+    """Job body for a single script: returns the old endpoint response shape."""
+    result = run_script(module_name, args)
+    return {'success': result['returncode'] == 0, 'result': result}
 
 
 def run_all_once():
     """Run scrapper -> summarizer -> send script sequentially and collect results."""
     results = {}
-    logging.info('Running nse_scrapper.py')
-    results['scrape'] = run_script(os.path.join(os.getcwd(), 'nse_scrapper.py'))
-    logging.info('Running summarize_last_hour.py')
-    results['summarize'] = run_script(os.path.join(os.getcwd(), 'scripts', 'summarize_last_hour.py'))
-    logging.info('Running send_whatsapp_template.py')
-    # default: dry-run off; you can modify args if you want dry-run
-    results['send'] = run_script(os.path.join(os.getcwd(), 'scripts', 'send_whatsapp_template.py'))
+    logging.info('Running nse_scrapper')
+    results['scrape'] = run_script('nse_scrapper')
+    logging.info('Running summarize_last_hour')
+    results['summarize'] = run_script('summarize_last_hour')
+    logging.info('Running summarize_hour --send')
+    results['send'] = run_script(*SCHEDULED_STAGES['send'])
     return results
 
 
+def run_all_job():
+    results = run_all_once()
+    # success if all return 0
+    success = all(r.get('returncode') == 0 for r in results.values())
+    return {'success': success, 'results': results}
+
+
+# Entry point and arguments for each scheduled stage
+SCHEDULED_STAGES = {
+    'scrape': ('nse_scrapper', ['--incremental']),
+    'summarize': ('summarize_last_hour', []),
+    # Matches subscribers, queues each (filing, phone) once and drains the
+    # outbound queue; send_whatsapp_template needs a --company-id
+    'send': ('summarize_hour', ['--send']),
+}
+
+
+def run_scheduled_stage(stage):
+    """Run one scheduler stage through the job runner; True on success."""
+    module_name, args = SCHEDULED_STAGES[stage]
+    job = JOBS.wait(JOBS.submit(f'scheduled_{stage}', script_job, module_name, args))
+    return job is not None and job['status'] == 'succeeded'
+
+
+def start_scheduler():
+    """Start the in-process pipeline scheduler (see scheduler.py for settings)."""
+    global SCHEDULER
+    if SCHEDULER is not None:
+        return SCHEDULER
+    calendar = MarketCalendar(
+        holidays=parse_holidays(os.environ.get('NSE_HOLIDAYS')),
+        holiday_loader=lambda: NSEScraper().fetch_trading_holidays(),
+    )
+    SCHEDULER = PipelineScheduler(run_scheduled_stage, calendar=calendar, lock=PIPELINE_LOCK)
+    SCHEDULER.start()
+    return SCHEDULER
+
+
+def start_job(name, fn, *args):
+    """Queue a job and return 202 with its id.
+
+    With `?wait=true` the request blocks until the job is done and returns
+    the job's result directly (the pre-job-runner response).
+    """
+    job_id = JOBS.submit(name, fn, *args)
+    if request.args.get('wait', '').lower() == 'true':
+        job = JOBS.wait(job_id)
+        if job['result'] is not None:
+            return jsonify(job['result'])
+        return jsonify({'success': False, 'job_id': job_id, 'error': job['error']}), 500
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status': 'queued',
+        'status_url': f'/api/jobs/{job_id}',
+    }), 202
+
+
+def _release_pipeline_after(fn, *args):
+    try:
+        return fn(*args)
+    finally:
+        PIPELINE_LOCK.release()
+
+
+def start_pipeline_job(name, fn, *args):
+    """start_job() under PIPELINE_LOCK, held until the job finishes.
+
+    Returns 409 instead when a scheduled or manual pipeline run holds it.
+    """
+    if not PIPELINE_LOCK.acquire():
+        return jsonify({'success': False, 'error': 'pipeline already running'}), 409
+    return start_job(name, _release_pipeline_after, fn, *args)
+
+
 @app.route("/", methods=["GET"])
 def index():
     return jsonify({"service": "nse_scraper", "status": "ready"})
@@ -133,70 +228,50 @@ def scrape():
             return jsonify({"success": False, "error": "No records found in response"}), 404
         records = df.to_dict(orient="records")
 
-    saved = 0
-    save_errors = []
-
-    if DB:
-        coll = DB["company"]
-        now = dt.utcnow()
-        for rec in records:
-            # Use Company as _id per request; fallback to Symbol if Company not present
-            company = (rec.get("Company") or rec.get("sm_name") or rec.get("Symbol"))
-            if not company:
-                continue
-
-            announcement = {
-                "Symbol": rec.get("Symbol"),
-                "Subject": rec.get("Subject") or rec.get("desc"),
-                "Description": rec.get("Description") or rec.get("attchmntText"),
-                "Attachment_URL": rec.get("Attachment_URL") or rec.get("attchmntFile"),
-                "File_Size": rec.get("File_Size") or rec.get("sm_size"),
-                "Timestamp": rec.get("Timestamp") or rec.get("an_dt"),
-                "XBRL_Link": rec.get("XBRL_Link") or rec.get("xbrl"),
-                "scraped_at": now,
-            }
-
-            try:
-                coll.update_one(
-                    {"_id": company},
-                    {
-                        "$push": {"announcements": announcement},
-                        "$set": {"last_updated": now, "symbol": rec.get("Symbol")},
-                    },
-                    upsert=True,
-                )
-                saved += 1
-            except Exception as e:
-                save_errors.append({"company": company, "error": str(e)})
-
     result = {"success": True, "count": len(records), "records": records}
-    if DB:
-        result["saved"] = saved
-        if save_errors:
-            result["save_errors"] = save_errors
+    if HISTORY is not None:
+        saved = HISTORY.record(records)
+        result["saved"] = saved["saved"]
+        result["duplicates"] = saved["duplicates"]
+        result["save_batches"] = saved["batches"]
+        if saved["errors"]:
+            result["save_errors"] = saved["errors"]
 
     return jsonify(result)
 
 
+@app.route('/api/history', methods=['GET'])
+def api_history():
+    """Last N announcements for ?company= or ?symbol= (newest first), &limit= (default 20)."""
+    if HISTORY is None:
+        return jsonify({'success': False, 'error': 'Database not configured'}), 503
+    company = request.args.get('company')
+    symbol = request.args.get('symbol')
+    if not company and not symbol:
+        return jsonify({'success': False, 'error': 'company or symbol is required'}), 400
+    try:
+        limit = max(1, min(int(request.args.get('limit', 20)), 500))
+    except ValueError:
+        limit = 20
+    announcements = HISTORY.latest(company=company, symbol=symbol, limit=limit)
+    return jsonify({'success': True, 'count': len(announcements), 'announcements': announcements})
+
+
 @app.route('/api/scrape', methods=['POST', 'GET'])
 def api_scrape():
-    """Run nse_scrapper.py and return output."""
-    result = run_script(os.path.join(os.getcwd(), 'nse_scrapper.py'))
-    success = result['returncode'] == 0
-    return jsonify({'success': success, 'result': result})
+    """Run nse_scrapper in the background; returns 202 and a job id (409 while the pipeline runs)."""
+    return start_pipeline_job('scrape', script_job, 'nse_scrapper')
 
 
 @app.route('/api/summarize', methods=['POST', 'GET'])
 def api_summarize():
-    """Run summarize_last_hour.py and return output."""
-    result = run_script(os.path.join(os.getcwd(), 'scripts', 'summarize_last_hour.py'))
-    success = result['returncode'] == 0
-    return jsonify({'success': success, 'result': result})
+    """Run summarize_last_hour in the background; returns 202 and a job id (409 while the pipeline runs)."""
+    return start_pipeline_job('summarize', script_job, 'summarize_last_hour')
 
 
 @app.route('/api/send', methods=['POST', 'GET'])
 def api_send():
-    """Run send_whatsapp_template.py and return output.
+    """Run send_whatsapp_template in the background; returns 202 and a job id.
     
     Query params:
       - company_id: Company _id to send (optional, if omitted script will use DB customers list)
@@ -215,14 +290,12 @@ def api_send():
     if dry_run:
         args.append('--dry-run')
     
-    result = run_script(os.path.join(os.getcwd(), 'scripts', 'send_whatsapp_template.py'), args=args)
-    success = result['returncode'] == 0
-    return jsonify({'success': success, 'result': result})
+    return start_job('send', script_job, 'send_whatsapp_template', args)
 
 
 @app.route('/api/summarize_hour', methods=['POST', 'GET'])
 def api_summarize_hour():
-    """Run summarize_hour.py and return output.
+    """Run summarize_hour in the background; returns 202 and a job id (409 while the pipeline runs).
     
     Processes last_hour collection and saves summaries to hourly_summaries collection.
     Each document contains: company, price, current_price, update, update_summary.
@@ -248,18 +321,13 @@ def api_summarize_hour():
     if recipients:
         args += ['--recipients', recipients]
     
-    result = run_script(os.path.join(os.getcwd(), 'scripts', 'summarize_hour.py'), args=args)
-    success = result['returncode'] == 0
-    return jsonify({'success': success, 'result': result})
+    return start_pipeline_job('summarize_hour', script_job, 'summarize_hour', args)
 
 
 @app.route('/api/run_all', methods=['POST', 'GET'])
 def api_run_all():
-    """Run full pipeline: scrape -> summarize -> send. Returns all outputs."""
-    results = run_all_once()
-    # success if all return 0
-    success = all(r.get('returncode') == 0 for r in results.values())
-    return jsonify({'success': success, 'results': results})
+    """Run full pipeline in the background: scrape -> summarize -> send."""
+    return start_pipeline_job('run_all', run_all_job)
 
 
 @app.route('/api/broadcast', methods=['POST', 'GET'])
@@ -301,14 +369,54 @@ def api_broadcast():
     if verbose:
         args.append('--verbose')
     
-    result = run_script(os.path.join(os.getcwd(), 'scripts', 'broadcast_message.py'), args=args)
-    success = result['returncode'] == 0
-    return jsonify({'success': success, 'result': result})
+    return start_job('broadcast', script_job, 'broadcast_message', args)
+
+
+@app.route('/api/scheduler', methods=['GET'])
+def api_scheduler():
+    """Return the pipeline scheduler's state (next runs, last results)."""
+    if SCHEDULER is None:
+        return jsonify({'enabled': False, 'busy': PIPELINE_LOCK.locked()})
+    return jsonify(dict(SCHEDULER.status(), enabled=True))
+
+
+@app.route('/api/jobs', methods=['GET'])
+def api_jobs():
+    """List recent background jobs (newest first)."""
+    return jsonify({'jobs': JOBS.list()})
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def api_job_status(job_id):
+    """Return status and, once finished, the result of a background job."""
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'job not found'}), 404
+    return jsonify(job)
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Pipeline stage histograms, counters and in-flight gauges for Prometheus."""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+@app.route('/api/spans', methods=['GET'])
+def api_spans():
+    """Recent pipeline stage spans (newest first); filter with ?stage=&limit=."""
+    try:
+        limit = int(request.args.get('limit', 100))
+    except ValueError:
+        limit = 100
+    return jsonify({'spans': metrics.recent_spans(limit, request.args.get('stage'))})
 
 
 if __name__ == "__main__":
     # Load env file early
     load_env_file('.env.local')
+
+    if os.environ.get('SCHEDULER_ENABLED', '').lower() in ('1', 'true', 'yes'):
+        start_scheduler()
     
     port = int(os.environ.get("PORT", 5000))
     # Bind to 0.0.0.0 for external access when containerized/hosted
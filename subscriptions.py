@@ -0,0 +1,262 @@
+"""Inverted index from company aliases to subscribers for alert fan-out.
+
+Subscribers live in the `nse data` collection and list the companies they
+follow in `profile.selectedCompanies`, as symbols ("INFY"), ISINs or free
+text names ("Infosys Ltd"). Instead of loading every contact per run,
+this module keeps two collections:
+
+- `subscription_index`: {_id: alias key, ids: [contact _id, ...]}
+- `subscription_members`: {_id: contact _id, phone, name, keys, fingerprint}
+
+Alias keys are normalized (upper case, punctuation and legal suffixes
+such as "Ltd"/"Limited" removed) so "Infosys Ltd" and "Infosys Limited"
+match. A filing's recipients are found with one `$in` query on its
+symbol / company / ISIN keys plus one on the matching members, so lookups
+cost O(matches).
+
+`sync()` keeps the index current. On a replica set it stores a change
+stream resume token and each sync reads only the contacts changed since
+the previous one. Without change streams (standalone server), or when the
+stream can no longer resume, it reconciles every contact, writing only
+what changed, at most every SUBSCRIPTION_SYNC_SECONDS (default 900).
+"""
+
+import hashlib
+import os
+import re
+from datetime import datetime, timedelta
+
+from pymongo import DeleteOne, UpdateOne
+from pymongo.errors import PyMongoError
+
+from mongo_bulk import bulk_write_chunks
+
+
+CONTACTS_COLLECTION = 'nse data'
+INDEX_COLLECTION = 'subscription_index'
+MEMBERS_COLLECTION = 'subscription_members'
+STATE_ID = 'subscriptions'
+CONTACT_PROJECTION = {'phone': 1, 'mobile': 1, 'name': 1, 'profile.selectedCompanies': 1}
+
+# Trailing words that don't distinguish one listed company from another
+_LEGAL_SUFFIXES = {'LIMITED', 'LTD', 'PVT', 'PRIVATE', 'INC', 'CORP', 'CORPORATION', 'PLC', 'CO', 'THE'}
+
+
+def normalize_alias(value):
+    """Normalize a symbol, ISIN or company name into an index key ('' if empty)."""
+    text = re.sub(r'[^A-Z0-9&]+', ' ', str(value or '').upper()).split()
+    if len(text) == 1:
+        return text[0]
+    # Drop "The" at the front and legal suffixes at the end ("Infosys Ltd." -> INFOSYS)
+    if text and text[0] == 'THE':
+        text = text[1:]
+    while len(text) > 1 and text[-1] in _LEGAL_SUFFIXES:
+        text = text[:-1]
+    return ' '.join(text)
+
+
+def alias_keys(*values):
+    """Distinct non-empty keys for a set of aliases (symbol, company, ISIN...)."""
+    keys = []
+    for value in values:
+        key = normalize_alias(value)
+        if key and key not in keys:
+            keys.append(key)
+    return keys
+
+
+def _normalize_phone(phone):
+    # Same rules as the WhatsApp scripts' normalize_phone
+    if not phone:
+        return None
+    s = str(phone).replace('+', '').replace('-', '').replace(' ', '')
+    if not s.isdigit() or len(s) < 8 or len(s) > 15:
+        return None
+    return s
+
+
+def contact_entry(contact):
+    """Member document for a contact, or None if it has no usable phone."""
+    phone = _normalize_phone(contact.get('phone') or contact.get('mobile'))
+    if not phone:
+        return None
+    selected = (contact.get('profile') or {}).get('selectedCompanies') or []
+    if isinstance(selected, str):
+        selected = [selected]
+    entry = {
+        'phone': phone,
+        'name': contact.get('name', 'Subscriber'),
+        'keys': sorted(alias_keys(*selected)),
+    }
+    entry['fingerprint'] = hashlib.sha1(repr(sorted(entry.items())).encode('utf-8')).hexdigest()
+    return entry
+
+
+class SubscriptionIndex:
+    """Persistent alias -> subscriber index kept in MongoDB."""
+
+    def __init__(self, db, sync_seconds=None):
+        self.db = db
+        self.contacts = db[CONTACTS_COLLECTION]
+        self.index = db[INDEX_COLLECTION]
+        self.members = db[MEMBERS_COLLECTION]
+        if sync_seconds is None:
+            try:
+                sync_seconds = float(os.environ.get('SUBSCRIPTION_SYNC_SECONDS', 900))
+            except ValueError:
+                sync_seconds = 900
+        self.sync_seconds = sync_seconds
+
+    def ensure_indexes(self):
+        """Multikey index on the contacts' followed companies, for ad-hoc subscriber queries."""
+        self.contacts.create_index('profile.selectedCompanies')
+
+    def _ops_for(self, contact_id, old_keys, new_keys):
+        old_keys, new_keys = set(old_keys or ()), set(new_keys or ())
+        ops = [UpdateOne({'_id': key}, {'$addToSet': {'ids': contact_id}}, upsert=True)
+               for key in sorted(new_keys - old_keys)]
+        ops += [UpdateOne({'_id': key}, {'$pull': {'ids': contact_id}})
+                for key in sorted(old_keys - new_keys)]
+        return ops
+
+    def index_contact(self, contact):
+        """Add or refresh one contact (e.g. right after its profile changes)."""
+        contact_id = contact['_id']
+        existing = self.members.find_one({'_id': contact_id}) or {}
+        entry = contact_entry(contact)
+        if entry is None:
+            return self.remove_contact(contact_id)
+        if existing.get('fingerprint') == entry['fingerprint']:
+            return False
+        bulk_write_chunks(self.index, self._ops_for(contact_id, existing.get('keys'), entry['keys']))
+        self.members.update_one({'_id': contact_id}, {'$set': entry}, upsert=True)
+        return True
+
+    def remove_contact(self, contact_id):
+        existing = self.members.find_one({'_id': contact_id})
+        if not existing:
+            return False
+        bulk_write_chunks(self.index, self._ops_for(contact_id, existing.get('keys'), ()))
+        self.members.delete_one({'_id': contact_id})
+        return True
+
+    def sync(self, force=False):
+        """Bring the index up to date with the contacts collection.
+
+        Reads only the contacts changed since the stored change stream
+        resume token when there is one; otherwise reconciles all contacts,
+        unless the previous full sync is younger than `sync_seconds` and
+        `force` is not set. Returns counts ('mode' is 'changes' or 'full'),
+        or None when skipped.
+        """
+        state = self.db['scrape_state'].find_one({'_id': STATE_ID}) or {}
+        if not force and state.get('resume_token') is not None:
+            stats = self._sync_changes(state['resume_token'])
+            if stats is not None:
+                return stats
+            force = True  # the stream could not resume: the index may be stale
+        now = datetime.utcnow()
+        last = state.get('synced_at')
+        if not force and last and now - last < timedelta(seconds=self.sync_seconds):
+            return None
+        return self._sync_full(now)
+
+    def _sync_changes(self, token):
+        """Apply contact changes since `token`; None if the stream can't resume."""
+        changed, removed = {}, set()
+        try:
+            with self.contacts.watch(full_document='updateLookup', resume_after=token) as stream:
+                while True:
+                    change = stream.try_next()
+                    if change is None:
+                        break
+                    contact_id = change.get('documentKey', {}).get('_id')
+                    if change['operationType'] in ('insert', 'update', 'replace') and change.get('fullDocument'):
+                        changed[contact_id] = change['fullDocument']
+                        removed.discard(contact_id)
+                    elif change['operationType'] in ('insert', 'update', 'replace', 'delete'):
+                        changed.pop(contact_id, None)
+                        removed.add(contact_id)
+                    else:
+                        # drop / rename / invalidate: only a full sync can recover
+                        return None
+                token = stream.resume_token
+        except PyMongoError as e:
+            print(f'WARNING: Could not resume the contacts change stream, running a full sync: {e}')
+            return None
+
+        ids = list(changed) + list(removed)
+        known = {doc['_id']: doc for doc in self.members.find({'_id': {'$in': ids}}, {'keys': 1, 'fingerprint': 1})}
+        stats = self._apply(changed.values(), known, removed)
+        stats['mode'] = 'changes'
+        self.db['scrape_state'].update_one({'_id': STATE_ID}, {'$set': {'resume_token': token}}, upsert=True)
+        return stats
+
+    def _sync_full(self, now):
+        """Reconcile every contact; records a resume token for the next sync when possible."""
+        try:
+            # Opened before the scan so changes made during it are replayed next time
+            stream = self.contacts.watch(full_document='updateLookup')
+        except PyMongoError:
+            stream = None
+        try:
+            known = {doc['_id']: doc for doc in self.members.find({}, {'keys': 1, 'fingerprint': 1})}
+            contacts = list(self.contacts.find({}, CONTACT_PROJECTION))
+            seen = {contact['_id'] for contact in contacts}
+            stats = self._apply(contacts, known, [contact_id for contact_id in known if contact_id not in seen])
+            token = stream.resume_token if stream is not None else None
+        finally:
+            if stream is not None:
+                stream.close()
+        stats['mode'] = 'full'
+        self.db['scrape_state'].update_one(
+            {'_id': STATE_ID}, {'$set': {'synced_at': now, 'resume_token': token}}, upsert=True)
+        return stats
+
+    def _apply(self, contacts, known, removed):
+        """Write the index and member changes for `contacts` and `removed` ids."""
+        index_ops, member_ops, removed = [], [], list(removed)
+        stats = {'contacts': 0, 'added': 0, 'updated': 0, 'removed': 0}
+        for contact in contacts:
+            stats['contacts'] += 1
+            contact_id = contact['_id']
+            old = known.get(contact_id)
+            entry = contact_entry(contact)
+            if entry is None:
+                removed.append(contact_id)
+                continue
+            if old and old.get('fingerprint') == entry['fingerprint']:
+                continue
+            stats['updated' if old else 'added'] += 1
+            index_ops += self._ops_for(contact_id, (old or {}).get('keys'), entry['keys'])
+            member_ops.append(UpdateOne({'_id': contact_id}, {'$set': entry}, upsert=True))
+
+        for contact_id in removed:
+            old = known.get(contact_id)
+            if old:
+                stats['removed'] += 1
+                index_ops += self._ops_for(contact_id, old.get('keys'), ())
+                member_ops.append(DeleteOne({'_id': contact_id}))
+
+        if index_ops:
+            bulk_write_chunks(self.index, index_ops)
+        if member_ops:
+            bulk_write_chunks(self.members, member_ops)
+        return stats
+
+    def lookup(self, symbol=None, company=None, isin=None):
+        """Recipients ({'phone', 'name'}) subscribed to any alias of a filing, deduped by phone."""
+        keys = alias_keys(symbol, company, isin)
+        if not keys:
+            return []
+        ids = set()
+        for doc in self.index.find({'_id': {'$in': keys}}):
+            ids.update(doc.get('ids') or ())
+        if not ids:
+            return []
+        recipients, phones = [], set()
+        for member in self.members.find({'_id': {'$in': list(ids)}}, {'phone': 1, 'name': 1}):
+            if member['phone'] not in phones:
+                phones.add(member['phone'])
+                recipients.append({'phone': member['phone'], 'name': member.get('name', 'Subscriber')})
+        return recipients
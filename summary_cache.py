@@ -0,0 +1,118 @@
+"""Memoization cache for LLM filing summaries.
+
+The same filing text reaches `summarize_text` many times: companies
+re-file identical PDFs, `summarize_hour.py` re-runs over all of
+`last_hour`, and the summarizer endpoints can overlap. This module stores
+summaries in a local SQLite file keyed on
+
+    (hash of normalized company + text, model, prompt variant)
+
+so a repeated request is answered without calling OpenAI. Entries expire
+after a TTL and the table is capped at a maximum number of rows (oldest
+evicted first). Only model-generated summaries should be stored; the
+heuristic fallbacks are cheap to recompute.
+
+Environment variables:
+- SUMMARY_CACHE_PATH (default .cache/summaries.sqlite)
+- SUMMARY_CACHE_TTL_HOURS (default 168)
+- SUMMARY_CACHE_MAX_ENTRIES (default 50000)
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+
+DEFAULT_CACHE_PATH = os.path.join('.cache', 'summaries.sqlite')
+DEFAULT_TTL_HOURS = 168
+DEFAULT_MAX_ENTRIES = 50000
+
+
+def normalize_text(text):
+    """Collapse whitespace so trivially different extractions share a key."""
+    return re.sub(r'\s+', ' ', text or '').strip()
+
+
+def text_hash(text, company=''):
+    h = hashlib.sha256()
+    h.update(normalize_text(company).encode('utf-8'))
+    h.update(b'\x00')
+    h.update(normalize_text(text).encode('utf-8'))
+    return h.hexdigest()
+
+
+def _env_number(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+class SummaryCache:
+    """SQLite-backed TTL cache of summaries, safe to share between threads."""
+
+    def __init__(self, path=None, ttl_seconds=None, max_entries=None):
+        self.path = path or os.environ.get('SUMMARY_CACHE_PATH') or DEFAULT_CACHE_PATH
+        if ttl_seconds is None:
+            ttl_seconds = _env_number('SUMMARY_CACHE_TTL_HOURS', DEFAULT_TTL_HOURS) * 3600
+        if max_entries is None:
+            max_entries = int(_env_number('SUMMARY_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS summaries ('
+                ' text_hash TEXT NOT NULL, model TEXT NOT NULL, variant TEXT NOT NULL,'
+                ' summary TEXT NOT NULL, created_at REAL NOT NULL,'
+                ' PRIMARY KEY (text_hash, model, variant))'
+            )
+            self._conn.execute('CREATE INDEX IF NOT EXISTS summaries_created_at ON summaries(created_at)')
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def get(self, text, company, model, variant):
+        """Return a cached summary or None (expired entries count as misses)."""
+        key = text_hash(text, company)
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT summary, created_at FROM summaries WHERE text_hash = ? AND model = ? AND variant = ?',
+                (key, model, variant),
+            ).fetchone()
+            if row is not None and time.time() - row[1] <= self.ttl_seconds:
+                self.hits += 1
+                return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, text, company, model, variant, summary):
+        key = text_hash(text, company)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO summaries (text_hash, model, variant, summary, created_at) VALUES (?, ?, ?, ?, ?)',
+                (key, model, variant, summary, now),
+            )
+            self._conn.execute('DELETE FROM summaries WHERE created_at < ?', (now - self.ttl_seconds,))
+            count = self._conn.execute('SELECT COUNT(*) FROM summaries').fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    'DELETE FROM summaries WHERE rowid IN ('
+                    ' SELECT rowid FROM summaries ORDER BY created_at ASC LIMIT ?)',
+                    (count - self.max_entries,),
+                )
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
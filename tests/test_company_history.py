@@ -0,0 +1,111 @@
+from pymongo.errors import BulkWriteError
+
+from company_history import CompanyHistory
+
+
+class FakeBulkResult:
+    def __init__(self, upserted, modified):
+        self.upserted_count = upserted
+        self.modified_count = modified
+
+
+class FakeCursor(list):
+    def sort(self, key, direction):
+        return FakeCursor(sorted(self, key=lambda d: d[key], reverse=direction < 0))
+
+    def close(self):
+        pass
+
+
+class FakeHistoryCollection:
+    """Applies the conditional bucket upserts the way MongoDB would."""
+
+    name = 'company_history'
+
+    def __init__(self, racing_ids=()):
+        self.docs = {}
+        self.indexes = []
+        # Buckets another writer creates just before our upsert reaches them
+        self.racing_ids = set(racing_ids)
+
+    def create_index(self, keys):
+        self.indexes.append(keys)
+
+    def bulk_write(self, ops, ordered=True):
+        upserted, modified, errors = 0, 0, []
+        for i, op in enumerate(ops):
+            query, update = op._filter, op._doc
+            if query['_id'] in self.racing_ids:
+                self.racing_ids.discard(query['_id'])
+                self.docs[query['_id']] = dict(update['$setOnInsert'], _id=query['_id'], ids=['other'],
+                                               announcements=[{'id': 'other'}], count=1)
+                errors.append({'index': i, 'code': 11000, 'errmsg': 'E11000 duplicate key'})
+                continue
+            doc = self.docs.get(query['_id'])
+            if doc is not None and query['ids']['$ne'] in doc['ids']:
+                # No match, so the upsert inserts and collides with the _id
+                errors.append({'index': i, 'code': 11000, 'errmsg': 'E11000 duplicate key'})
+                continue
+            if doc is None:
+                doc = self.docs[query['_id']] = dict(update['$setOnInsert'], _id=query['_id'], ids=[],
+                                                     announcements=[], count=0)
+                upserted += 1
+            else:
+                modified += 1
+            doc.update(update['$set'])
+            for field, value in update['$push'].items():
+                doc[field].append(value)
+            doc['count'] += update['$inc']['count']
+            doc['first_at'] = min(doc.get('first_at', update['$min']['first_at']), update['$min']['first_at'])
+            doc['last_at'] = max(doc.get('last_at', update['$max']['last_at']), update['$max']['last_at'])
+        if errors:
+            raise BulkWriteError({'nUpserted': upserted, 'nModified': modified, 'writeErrors': errors})
+        return FakeBulkResult(upserted, modified)
+
+    def find(self, query, projection=None):
+        (field, value), = query.items()
+        return FakeCursor(d for d in self.docs.values() if d[field] == value)
+
+
+def record(symbol, timestamp, subject='Updates', company=None):
+    return {'symbol': symbol, 'sm_name': company or f'{symbol} Ltd', 'desc': subject,
+            'an_dt': timestamp, 'attchmntFile': f'https://x/{symbol}-{timestamp}.pdf'}
+
+
+def test_record_buckets_by_month_and_dedups():
+    history = CompanyHistory(FakeHistoryCollection())
+    history.ensure_indexes()
+    batch = [
+        record('INFY', '30-Oct-2025 18:00:00'),
+        record('INFY', '07-Nov-2025 10:00:00'),
+        record('INFY', '07-Nov-2025 10:00:00'),  # repeated within one scrape
+        record('TCS', '07-Nov-2025 11:00:00'),
+    ]
+    result = history.record(batch)
+    assert (result['saved'], result['duplicates'], result['errors']) == (3, 0, [])
+    assert sorted(history.collection.docs) == ['INFY Ltd|2025-10', 'INFY Ltd|2025-11', 'TCS Ltd|2025-11']
+
+    # Re-scraping an overlapping window only adds the new announcement
+    result = history.record(batch + [record('INFY', '08-Nov-2025 09:30:00')])
+    assert (result['saved'], result['duplicates']) == (1, 3)
+    assert history.collection.docs['INFY Ltd|2025-11']['count'] == 2
+
+
+def test_latest_reads_newest_buckets_first():
+    history = CompanyHistory(FakeHistoryCollection())
+    history.record([
+        record('INFY', '30-Oct-2025 18:00:00', 'October'),
+        record('INFY', '07-Nov-2025 10:00:00', 'Early November'),
+        record('INFY', '08-Nov-2025 09:30:00', 'Late November'),
+    ])
+
+    latest = history.latest(company='INFY Ltd', limit=2)
+    assert [a['Subject'] for a in latest] == ['Late November', 'Early November']
+    assert [a['Subject'] for a in history.latest(symbol='INFY', limit=10)][-1] == 'October'
+
+
+def test_concurrently_created_bucket_is_retried_not_counted_as_duplicate():
+    history = CompanyHistory(FakeHistoryCollection(racing_ids={'INFY Ltd|2025-11'}))
+    result = history.record([record('INFY', '07-Nov-2025 10:00:00'), record('TCS', '07-Nov-2025 11:00:00')])
+    assert (result['saved'], result['duplicates'], result['errors']) == (2, 0, [])
+    assert history.collection.docs['INFY Ltd|2025-11']['count'] == 2
@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import outbound_queue
+from digest import PARAM_LIMIT, clean_param, digest_group, digest_window, format_digest, group_claimed, window_start
+from outbound_queue import SqliteOutboundQueue, drain
+
+
+def match(filing_id, phone, symbol, subject='Updates', timestamp='07-Nov-2025 10:15:00', summary='Update.'):
+    return {'filing_id': filing_id, 'phone': phone, 'name': 'User', 'symbol': symbol, 'subject': subject,
+            'summary': summary, 'price': 'N/A', 'timestamp': timestamp}
+
+
+def queued(m):
+    group, not_before = digest_window(m, window_minutes=60)
+    digest = None if group is None else {'group': group, 'symbol': m['symbol'], 'summary': m['summary'],
+                                         'name': m['name']}
+    return (m['filing_id'], m['phone'], 'alert', {'to': m['phone'], 'text': m['symbol']}, digest, not_before)
+
+
+def compose(docs):
+    return [({'to': unit[0]['phone'], 'text': format_digest([d['digest'] for d in unit]) if len(unit) > 1
+              else unit[0]['payload']['text']}, unit) for unit in group_claimed(docs)]
+
+
+class RecordingSender:
+    def __init__(self):
+        self.sent = []
+
+    def send_many(self, payloads, on_result=None):
+        self.sent.extend((p['to'], p['text']) for p in payloads)
+        return [{'to': p['to'], 'ok': True, 'response': {}, 'error': None} for p in payloads]
+
+
+def test_groups_per_phone_and_window_with_priority_sent_alone():
+    assert digest_group(match('F1', '911', 'INFY')) == '911|2025-11-07T10:00:00'
+    assert digest_group(match('F2', '911', 'TCS', timestamp='07-Nov-2025 10:40:00')) == '911|2025-11-07T10:00:00'
+    assert digest_group(match('F4', '911', 'HCL', timestamp='07-Nov-2025 11:05:00')) == '911|2025-11-07T11:00:00'
+    assert digest_group(match('F3', '911', 'WIPRO', subject='Outcome of Board Meeting')) is None
+
+    docs = [{'_id': i, 'template': 'alert', 'phone': m[1], 'digest': m[4]} for i, m in enumerate(map(queued, [
+        match('F2', '911', 'TCS'), match('F1', '911', 'INFY'), match('F1', '912', 'INFY'),
+        match('F3', '911', 'WIPRO', subject='Outcome of Board Meeting'),
+    ]))]
+    assert [[d['_id'] for d in unit] for unit in group_claimed(docs)] == [[1, 0], [2], [3]]
+
+
+def test_digest_only_sends_filings_not_yet_sent(tmp_path):
+    queue = SqliteOutboundQueue(str(tmp_path / 'q.sqlite'), lease_seconds=60)
+    sender = RecordingSender()
+    queue.enqueue_many([queued(match('F1', '911', 'INFY'))])
+    drain(queue, sender, owner='w', compose=compose)
+    assert sender.sent == [('911', 'INFY')]
+
+    # Later runs see more filings in the same window: only the new ones go out
+    queue.enqueue_many(queued(m) for m in [match('F1', '911', 'INFY'), match('F2', '911', 'TCS'),
+                                           match('F5', '911', 'ACC')])
+    assert drain(queue, sender, owner='w', compose=compose) == {'sent': 2, 'failed': 0}
+    assert sender.sent[1:] == [('911', 'ACC: Update. | TCS: Update.')]
+
+    queue.enqueue_many(queued(m) for m in [match('F1', '911', 'INFY'), match('F2', '911', 'TCS')])
+    assert drain(queue, sender, owner='w', compose=compose) == {'sent': 0, 'failed': 0}
+    assert queue.counts()['sent'] == 3
+
+
+def test_digest_waits_for_its_window_to_end(tmp_path, monkeypatch):
+    queue = SqliteOutboundQueue(str(tmp_path / 'q.sqlite'), lease_seconds=60)
+    sender = RecordingSender()
+    start = window_start(datetime.now(), 60)
+
+    def at(minutes):
+        return (start + timedelta(minutes=minutes)).strftime('%d-%b-%Y %H:%M:%S')
+
+    # Two runs within the window: only the priority filing goes out
+    queue.enqueue_many([queued(match('F1', '911', 'INFY', timestamp=at(5))),
+                        queued(match('F3', '911', 'WIPRO', subject='Outcome of Board Meeting', timestamp=at(6)))])
+    assert drain(queue, sender, owner='w', compose=compose) == {'sent': 1, 'failed': 0}
+    queue.enqueue_many([queued(match('F2', '911', 'TCS', timestamp=at(40)))])
+    assert drain(queue, sender, owner='w', compose=compose) == {'sent': 0, 'failed': 0}
+    assert queue.counts()['pending'] == 2
+
+    # The first run after the window closes sends both as one digest
+    window_end = (start + timedelta(minutes=60)).timestamp()
+    monkeypatch.setattr(outbound_queue, 'time', SimpleNamespace(time=lambda: window_end))
+    assert drain(queue, sender, owner='w', compose=compose) == {'sent': 2, 'failed': 0}
+    assert sender.sent == [('911', 'WIPRO'), ('911', 'INFY: Update. | TCS: Update.')]
+
+
+def test_format_digest_fits_limit_with_more_note():
+    items = [{'symbol': f'S{i}', 'summary': 'x' * 300} for i in range(6)]
+    text = format_digest(items)
+    assert len(text) <= PARAM_LIMIT
+    assert text.endswith('(+3 more)')
+    assert text.count(' | ') == 2
+
+    long_first = format_digest([{'symbol': 'A', 'summary': 'y' * 2000}, {'symbol': 'B', 'summary': 'z'}])
+    assert len(long_first) <= PARAM_LIMIT
+    assert long_first.endswith('... (+1 more)')
+
+
+def test_clean_param_and_window_start():
+    assert clean_param('a\n\tb     c ') == 'a b c'
+    assert window_start(datetime(2025, 11, 7, 10, 44), 15) == datetime(2025, 11, 7, 10, 30)
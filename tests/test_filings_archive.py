@@ -0,0 +1,45 @@
+import pandas as pd
+
+from filings_archive import FilingsArchive, read_snapshot
+from nse_scrapper import NSEScraper
+
+
+def make_frame(items):
+    return NSEScraper(use_shared_client=False).parse_to_dataframe(items)
+
+
+def item(symbol, when, desc='Updates'):
+    return {'symbol': symbol, 'sm_name': f'{symbol} Ltd', 'desc': desc, 'attchmntText': 'Long text ' * 20,
+            'an_dt': when, 'attchmntFile': f'https://example.com/{symbol}.pdf'}
+
+
+def test_append_dedups_and_partitions_by_date(tmp_path):
+    archive = FilingsArchive(str(tmp_path))
+    first = make_frame([item('INFY', '07-Nov-2025 10:00:00'), item('TCS', '08-Nov-2025 09:00:00')])
+    assert archive.append(first)['written'] == 2
+
+    overlap = make_frame([item('TCS', '08-Nov-2025 09:00:00'), item('TCS', '08-Nov-2025 09:00:00', desc='Revised')])
+    res = FilingsArchive(str(tmp_path)).append(overlap)
+    assert res == {'written': 1, 'duplicates': 1, 'files': res['files']}
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['date=2025-11-07', 'date=2025-11-08']
+    day = archive.read('2025-11-08', '2025-11-08')
+    assert sorted(day['Subject']) == ['Revised', 'Updates']
+    assert str(day['Symbol'].dtype) == 'category'
+    assert pd.api.types.is_datetime64_any_dtype(day['Timestamp'])
+    assert len(archive.read()) == 3
+    assert sum(len(df) for df in archive.iter_frames(end='2025-11-07')) == 1
+
+
+def test_import_skips_identical_snapshots(tmp_path):
+    df = make_frame([item('INFY', '07-Nov-2025 10:00:00')])
+    csv_a = tmp_path / 'nse_filings_20251108_235205.csv'
+    csv_b = tmp_path / 'nse_filings_20251108_235220.csv'
+    df.assign(Timestamp=df['Timestamp'].dt.strftime('%d-%b-%Y %H:%M:%S')).to_csv(csv_a, index=False, encoding='utf-8-sig')
+    csv_b.write_bytes(csv_a.read_bytes())
+
+    assert read_snapshot(str(csv_a))['Timestamp'].iloc[0] == pd.Timestamp('2025-11-07 10:00:00')
+    archive = FilingsArchive(str(tmp_path / 'archive'))
+    results = archive.import_snapshots([str(csv_a), str(csv_b)])
+    assert [r['skipped'] for r in results] == [False, True]
+    assert len(archive.read()) == 1
@@ -0,0 +1,43 @@
+import pytest
+
+from app.filings_table import BACKENDS, iter_filings_table, parse_filings_table
+
+
+PAGE = '''
+<html><body>
+<table><tr><th>MENU</th></tr><tr><td>a</td><td>b</td><td>c</td><td>d</td><td>e</td><td>f</td><td>g</td></tr></table>
+<table>
+  <thead><tr><th>SYMBOL</th><th>COMPANY NAME</th><th>SUBJECT</th><th>DETAILS</th>
+  <th>ATTACHMENT</th><th>XBRL</th><th>BROADCAST DATE/TIME</th></tr></thead>
+  <tbody>
+  <tr><td><a href="/q?symbol=INFY">INFY</a></td><td> Infosys  Limited </td><td>Updates</td>
+      <td>Earnings <b>call</b> transcript</td>
+      <td><a href="https://nsearchives.nseindia.com/x.pdf">PDF</a>(597.28 KB)</td><td>-</td>
+      <td>21-Oct-2025 21:41:32</td></tr>
+  <tr><td>TCS</td><td>Tata Consultancy Services Limited</td><td>Dividend</td><td>Record date</td>
+      <td>-</td><td>-</td><td>21-Oct-2025 20:00:00</td></tr>
+  <tr><td colspan="7">No more records</td></tr>
+  </tbody>
+</table>
+</body></html>
+'''
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_backends_extract_the_same_filings(backend):
+    filings = parse_filings_table(PAGE, backend)
+    assert filings == [
+        {'symbol': 'INFY', 'company_name': 'Infosys  Limited', 'subject': 'Updates',
+         'details': 'Earningscalltranscript', 'attachment_link': 'https://nsearchives.nseindia.com/x.pdf',
+         'attachment_size': '597.28 KB', 'broadcast_date': '21-Oct-2025 21:41:32'},
+        {'symbol': 'TCS', 'company_name': 'Tata Consultancy Services Limited', 'subject': 'Dividend',
+         'details': 'Record date', 'attachment_link': None, 'attachment_size': None,
+         'broadcast_date': '21-Oct-2025 20:00:00'},
+    ]
+
+
+def test_iter_is_lazy_and_handles_empty_input():
+    rows = iter_filings_table(PAGE)
+    assert next(rows)['symbol'] == 'INFY'
+    assert parse_filings_table('') == []
+    assert parse_filings_table('<html><p>no table</p></html>') == []
@@ -0,0 +1,43 @@
+import sys
+
+from jobs import JobRunner, run_entrypoint
+
+
+def fake_main(argv=None):
+    print('processing', ' '.join(argv or []))
+    if argv and argv[0] == 'fail':
+        sys.exit(1)
+
+
+def test_run_entrypoint_captures_output_and_exit_code():
+    ok = run_entrypoint(fake_main, ['--limit', '5'], name='fake')
+    assert ok['returncode'] == 0
+    assert ok['stdout'] == 'processing --limit 5\n'
+    assert ok['cmd'] == 'fake --limit 5'
+
+    failed = run_entrypoint(fake_main, ['fail'], name='fake')
+    assert failed['returncode'] == 1
+
+
+def test_run_entrypoint_reports_exceptions():
+    def broken(argv=None):
+        raise RuntimeError('boom')
+
+    result = run_entrypoint(broken)
+    assert result['returncode'] == 3
+    assert 'RuntimeError: boom' in result['stderr']
+
+
+def test_job_runner_tracks_status():
+    runner = JobRunner(max_workers=1)
+    ok_id = runner.submit('ok', lambda: {'success': True, 'value': 42})
+    bad_id = runner.submit('bad', lambda: {'success': False})
+
+    ok = runner.wait(ok_id, timeout=5)
+    bad = runner.wait(bad_id, timeout=5)
+    assert ok['status'] == 'succeeded'
+    assert ok['result']['value'] == 42
+    assert ok['finished_at'] is not None
+    assert bad['status'] == 'failed'
+    assert runner.get('missing') is None
+    assert [job['id'] for job in runner.list()] == [bad_id, ok_id]
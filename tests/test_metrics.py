@@ -0,0 +1,75 @@
+import pytest
+
+import metrics
+from metrics import Counter, Gauge, Histogram, Registry, observe_stage, recent_spans, stage
+
+
+def test_registry_renders_prometheus_text():
+    registry = Registry()
+    requests_total = Counter('t_requests_total', 'Requests.', ['path'], registry=registry)
+    in_flight = Gauge('t_in_flight', 'In flight.', registry=registry)
+    latency = Histogram('t_seconds', 'Latency.', ['path'], buckets=(0.1, 1), registry=registry)
+
+    requests_total.inc(path='/a "b"')
+    requests_total.inc(2, path='/a "b"')
+    in_flight.inc()
+    latency.observe(0.05, path='/x')
+    latency.observe(0.5, path='/x')
+
+    text = registry.render()
+    assert '# TYPE t_requests_total counter' in text
+    assert 't_requests_total{path="/a \\"b\\""} 3' in text
+    assert 't_in_flight 1' in text
+    assert 't_seconds_bucket{path="/x",le="0.1"} 1' in text
+    assert 't_seconds_bucket{path="/x",le="1"} 2' in text
+    assert 't_seconds_bucket{path="/x",le="+Inf"} 2' in text
+    assert 't_seconds_count{path="/x"} 2' in text
+
+    with pytest.raises(ValueError):
+        requests_total.inc(other='x')
+    with pytest.raises(ValueError):
+        Counter('t_requests_total', 'Duplicate.', registry=registry)
+
+
+def test_stage_records_duration_outcome_and_nested_spans():
+    with stage('t_outer', run=1):
+        with stage('t_inner'):
+            pass
+        observe_stage('t_summed', 0.25)
+    with pytest.raises(RuntimeError):
+        with stage('t_inner'):
+            raise RuntimeError('boom')
+
+    assert metrics.STAGE_TOTAL.get(stage='t_inner', outcome='ok') == 1
+    assert metrics.STAGE_TOTAL.get(stage='t_inner', outcome='error') == 1
+    assert metrics.STAGE_SECONDS.get(stage='t_inner')['count'] == 2
+    assert metrics.STAGE_SECONDS.get(stage='t_summed')['sum'] == 0.25
+    assert metrics.STAGE_IN_FLIGHT.get(stage='t_outer') == 0
+
+    outer = recent_spans(stage_name='t_outer')[0]
+    inner_ok, = [s for s in recent_spans(stage_name='t_inner') if s['outcome'] == 'ok']
+    summed = recent_spans(stage_name='t_summed')[0]
+    assert outer['attrs'] == {'run': 1} and outer['parent'] is None
+    assert inner_ok['parent'] == 't_outer' and inner_ok['trace'] == outer['trace']
+    assert summed['trace'] == outer['trace']
+    assert recent_spans(stage_name='t_inner')[0]['attrs']['error'] == 'RuntimeError'
+    assert 'pipeline_stage_seconds_bucket{stage="t_outer",le="+Inf"} 1' in metrics.render()
+
+
+def test_submit_with_context_parents_worker_spans():
+    from concurrent.futures import ThreadPoolExecutor
+
+    from metrics import submit_with_context
+
+    def work():
+        with stage('t_worker'):
+            pass
+
+    with stage('t_batch'), ThreadPoolExecutor(max_workers=2) as pool:
+        submit_with_context(pool, work).result()
+        pool.submit(work).result()
+
+    batch = recent_spans(stage_name='t_batch')[0]
+    plain, parented = recent_spans(stage_name='t_worker')
+    assert (parented['parent'], parented['trace']) == ('t_batch', batch['trace'])
+    assert plain['parent'] is None
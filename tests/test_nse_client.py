@@ -0,0 +1,146 @@
+import httpx
+
+from nse_client import NSEClient
+
+
+def make_transport(log, reject_first_api_call=False):
+    state = {'rejected': False}
+
+    def handler(request):
+        log.append(request.url.path)
+        if request.url.path.startswith('/companies-listing'):
+            return httpx.Response(200, text='<html></html>', headers={'Set-Cookie': 'nsit=abc; Path=/'})
+        if reject_first_api_call and not state['rejected']:
+            state['rejected'] = True
+            return httpx.Response(403, json={})
+        return httpx.Response(200, json={'data': [{'symbol': 'INFY'}]})
+
+    return httpx.MockTransport(handler)
+
+
+def test_cookies_are_reused_between_calls():
+    log = []
+    client = NSEClient(pool_size=1, cookie_ttl=300, warmup_delay=0, transport=make_transport(log))
+    try:
+        for _ in range(3):
+            assert client.get_json('/api/corporate-announcements', params={'index': 'equities'}) == {'data': [{'symbol': 'INFY'}]}
+        assert client.aio.warmups == 1
+        assert log.count('/api/corporate-announcements') == 3
+    finally:
+        client.close()
+
+
+def test_forbidden_response_rewarms_session():
+    log = []
+    client = NSEClient(pool_size=1, cookie_ttl=300, warmup_delay=0,
+                       transport=make_transport(log, reject_first_api_call=True))
+    try:
+        resp = client.get('/api/corporate-announcements')
+        assert resp.status_code == 200
+        assert client.aio.warmups == 2
+    finally:
+        client.close()
+
+
+def test_expired_cookies_are_refreshed():
+    log = []
+    client = NSEClient(pool_size=1, cookie_ttl=0, warmup_delay=0, transport=make_transport(log))
+    try:
+        client.get('/api/corporate-announcements')
+        client.get('/api/corporate-announcements')
+        assert client.aio.warmups == 2
+    finally:
+        client.close()
+
+
+def test_fetch_many_merges_and_dedupes_queries():
+    from nse_scrapper import NSEScraper
+
+    def item(symbol, when):
+        return {'symbol': symbol, 'sm_name': symbol, 'desc': 'Updates', 'an_dt': when, 'attchmntFile': ''}
+
+    def handler(request):
+        if request.url.path.startswith('/companies-listing'):
+            return httpx.Response(200, text='<html></html>')
+        index = request.url.params.get('index')
+        if index == 'sme':
+            return httpx.Response(200, json=[item('SME1', '07-Nov-2025 10:00:00')])
+        if index == 'debt':
+            return httpx.Response(500, json={})
+        # Both equities queries return the shared INFY filing
+        return httpx.Response(200, json=[item('INFY', '07-Nov-2025 09:00:00'),
+                                         item(request.url.params.get('symbol', 'TCS'), '07-Nov-2025 09:30:00')])
+
+    client = NSEClient(pool_size=2, warmup_delay=0, rate=0, transport=httpx.MockTransport(handler))
+    try:
+        scraper = NSEScraper(use_shared_client=False)
+        scraper.nse_client = client
+        df = scraper.fetch_many([
+            ('equities', None, '01-11-2025', '07-11-2025'),
+            {'index': 'equities', 'symbol': 'INFY'},
+            ('sme',),
+            ('debt',),
+        ])
+        assert sorted(zip(df['Symbol'], df['Timestamp'].dt.strftime('%d-%b-%Y %H:%M:%S'))) == [
+            ('INFY', '07-Nov-2025 09:00:00'), ('INFY', '07-Nov-2025 09:30:00'),
+            ('SME1', '07-Nov-2025 10:00:00'), ('TCS', '07-Nov-2025 09:30:00')]
+        assert list(df.columns) == ['Symbol', 'Company', 'Subject', 'Description', 'Attachment_URL',
+                                    'File_Size', 'Timestamp', 'XBRL_Link', 'an_dt', 'sm_size']
+    finally:
+        client.close()
+
+
+def test_rate_limiter_spaces_requests():
+    import asyncio
+    import time
+
+    from nse_client import AsyncRateLimiter
+
+    async def burst():
+        limiter = AsyncRateLimiter(rate=20, burst=1)
+        start = time.monotonic()
+        for _ in range(5):
+            await limiter.acquire()
+        return time.monotonic() - start
+
+    assert asyncio.run(burst()) >= 0.18
+
+
+class ChunkedBody(httpx.AsyncByteStream):
+    def __init__(self, body, size=100):
+        self.body = body
+        self.size = size
+
+    async def __aiter__(self):
+        for i in range(0, len(self.body), self.size):
+            yield self.body[i:i + self.size]
+
+
+def test_iter_corporate_filings_streams_brotli_payload():
+    import json
+
+    import brotli
+
+    from nse_scrapper import NSEScraper
+
+    items = [{'symbol': f'S{i}', 'sm_name': f'Company {i}', 'desc': 'Updates', 'an_dt': '07-Nov-2025 10:00:00',
+              'attchmntFile': f'https://example.com/{i}.pdf'} for i in range(500)]
+    body = brotli.compress(json.dumps({'data': items}).encode('utf-8'))
+
+    def handler(request):
+        if request.url.path.startswith('/companies-listing'):
+            return httpx.Response(200, text='<html></html>')
+        return httpx.Response(200, stream=ChunkedBody(body), headers={'Content-Encoding': 'br'})
+
+    client = NSEClient(pool_size=1, warmup_delay=0, rate=0, transport=httpx.MockTransport(handler))
+    try:
+        scraper = NSEScraper(use_shared_client=False)
+        scraper.nse_client = client
+        records = scraper.iter_corporate_filings(from_date='7-11-2025', to_date='7-11-2025', chunk_size=256)
+        first = next(records)
+        assert first['Symbol'] == 'S0' and first['Attachment_URL'] == 'https://example.com/0.pdf'
+        assert sum(1 for _ in records) == 499
+        # The session went back to the pool
+        assert client.aio._pool.qsize() == 1
+    finally:
+        client.close()
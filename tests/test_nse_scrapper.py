@@ -0,0 +1,311 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+from pymongo.errors import BulkWriteError
+
+from announcements import announcement_id, parse_announcement_time
+from mongo_bulk import bulk_write_chunks
+from nse_scrapper import NSEScraper, migrate_announcement_times
+
+
+def make_record(symbol, timestamp, subject='Updates'):
+    return {
+        'Symbol': symbol,
+        'Company': f'{symbol} Limited',
+        'Subject': subject,
+        'Description': '',
+        'Attachment_URL': '',
+        'File_Size': '',
+        'Timestamp': timestamp,
+        'XBRL_Link': '',
+    }
+
+
+def test_parse_announcement_time():
+    assert parse_announcement_time('07-Nov-2025 23:43:18') == datetime(2025, 11, 7, 23, 43, 18)
+    assert parse_announcement_time('') is None
+    assert parse_announcement_time('not a date') is None
+
+
+def test_announcement_id_is_stable():
+    rec = make_record('INFY', '07-Nov-2025 23:43:18')
+    same_time = dict(rec, Timestamp=datetime(2025, 11, 7, 23, 43, 18))
+    assert announcement_id(rec) == announcement_id(same_time)
+    assert announcement_id(rec) != announcement_id(make_record('INFY', '07-Nov-2025 23:43:19'))
+
+
+def test_filter_new_records_uses_high_water_mark(monkeypatch):
+    scraper = NSEScraper()
+    first = pd.DataFrame([
+        make_record('A', '07-Nov-2025 10:00:00'),
+        make_record('B', '07-Nov-2025 10:05:00'),
+    ])
+    monkeypatch.setattr(scraper, 'load_scrape_state', lambda index: (None, {}))
+    new_df, state = scraper.filter_new_records(first)
+    assert new_df['Symbol'].tolist() == ['A', 'B']
+
+    _, mark, seen = state
+    assert mark == datetime(2025, 11, 7, 10, 5)
+    monkeypatch.setattr(scraper, 'load_scrape_state', lambda index: (mark, dict(seen)))
+
+    second = pd.DataFrame([
+        make_record('C', '07-Nov-2025 10:07:00'),
+        make_record('A', '07-Nov-2025 10:00:00'),
+        make_record('B', '07-Nov-2025 10:05:00'),
+        # Late filing inside the lookback window is still picked up
+        make_record('D', '07-Nov-2025 10:01:00'),
+        # Older than the lookback window: already covered by earlier runs
+        make_record('E', '07-Nov-2025 09:00:00'),
+    ])
+    new_df, state = scraper.filter_new_records(second, lookback_minutes=10)
+    assert new_df['Symbol'].tolist() == ['C', 'D']
+    assert state[1] == datetime(2025, 11, 7, 10, 7)
+
+
+def test_filter_new_records_forgets_undated_ids_nse_dropped(monkeypatch):
+    scraper = NSEScraper()
+    undated = pd.DataFrame([make_record('U1', ''), make_record('U2', '')])
+    monkeypatch.setattr(scraper, 'load_scrape_state', lambda index: (None, {}))
+    _, (_, mark, seen) = scraper.filter_new_records(undated)
+    assert len(seen) == 2
+
+    monkeypatch.setattr(scraper, 'load_scrape_state', lambda index: (mark, dict(seen)))
+    new_df, (_, _, seen) = scraper.filter_new_records(undated.iloc[:1])
+    assert new_df.empty
+    assert list(seen) == [announcement_id(make_record('U1', ''))]
+
+
+class FakeBulkResult:
+    def __init__(self, upserted, modified):
+        self.upserted_count = upserted
+        self.modified_count = modified
+
+
+class FakeCollection:
+    def __init__(self, fail_index=None):
+        self.calls = []
+        self.fail_index = fail_index
+
+    def bulk_write(self, ops, ordered=True):
+        assert ordered is False
+        self.calls.append(list(ops))
+        if self.fail_index is not None and len(self.calls) == 2:
+            raise BulkWriteError({
+                'nUpserted': len(ops) - 1,
+                'nModified': 0,
+                'writeErrors': [{'index': self.fail_index, 'errmsg': 'E11000 duplicate key'}],
+            })
+        return FakeBulkResult(len(ops), 0)
+
+
+def test_bulk_write_chunks_reports_per_batch_counts():
+    coll = FakeCollection(fail_index=1)
+    batches = bulk_write_chunks(coll, list(range(7)), batch_size=3)
+
+    assert [len(call) for call in coll.calls] == [3, 3, 1]
+    assert [b['upserted'] for b in batches] == [3, 2, 1]
+    assert [b['errors'] for b in batches] == [0, 1, 0]
+    # Error index is relative to the full operation list
+    assert batches[1]['write_errors'][0]['index'] == 4
+
+
+def test_bulk_write_chunks_ignores_invalid_batch_size_env(monkeypatch):
+    monkeypatch.setenv('MONGO_BULK_BATCH_SIZE', 'lots')
+    coll = FakeCollection()
+    assert len(bulk_write_chunks(coll, list(range(3)))) == 1
+
+
+def test_save_keeps_the_newest_announcement_per_company():
+    scraper = NSEScraper()
+    scraper.collection = FakeCollection()
+    scraper.save_records_to_mongodb([
+        make_record('A', '07-Nov-2025 10:00:00', subject='newest'),
+        make_record('A', '01-Oct-2025 09:00:00', subject='backfilled'),
+    ])
+    (op,), = scraper.collection.calls
+    assert op._doc['$set']['announcement']['Subject'] == 'newest'
+    # The stored announcement is only replaced when it is not newer
+    assert op._filter['$or'][1] == {'announcement.announced_at': {'$lte': datetime(2025, 11, 7, 10)}}
+
+
+def test_save_to_mongodb_one_upsert_per_company():
+    scraper = NSEScraper()
+    scraper.collection = FakeCollection()
+    df = pd.DataFrame([
+        make_record('A', '07-Nov-2025 10:00:00'),
+        make_record('A', '07-Nov-2025 09:00:00'),
+        make_record('B', '07-Nov-2025 10:05:00'),
+    ])
+    result = scraper.save_to_mongodb(df, batch_size=500)
+
+    assert len(scraper.collection.calls) == 1
+    assert len(scraper.collection.calls[0]) == 2
+    assert result['upserted'] == 2
+    assert result['batches'] == [{'size': 2, 'upserted': 2, 'modified': 0, 'errors': 0}]
+
+
+def test_backfill_chunks_cover_range():
+    from datetime import date
+
+    from nse_scrapper import backfill_chunks
+
+    assert backfill_chunks(date(2025, 10, 30), date(2025, 11, 2)) == [
+        ('30-10-2025', '30-10-2025'), ('31-10-2025', '31-10-2025'),
+        ('1-11-2025', '1-11-2025'), ('2-11-2025', '2-11-2025'),
+    ]
+    assert backfill_chunks(date(2025, 11, 1), date(2025, 11, 10), chunk_days=7) == [
+        ('1-11-2025', '7-11-2025'), ('8-11-2025', '10-11-2025'),
+    ]
+
+
+class FakeStateCollection:
+    def __init__(self):
+        self.docs = {}
+
+    def find_one(self, query):
+        return self.docs.get(query['_id'])
+
+    def update_one(self, query, update, upsert=False):
+        doc = self.docs.setdefault(query['_id'], {'_id': query['_id']})
+        done = doc.setdefault('done_chunks', [])
+        if update['$addToSet']['done_chunks'] not in done:
+            done.append(update['$addToSet']['done_chunks'])
+
+
+def test_backfill_does_not_checkpoint_a_failed_fetch():
+    from datetime import date
+
+    import requests
+
+    scraper = NSEScraper(use_shared_client=False)
+    scraper.collection = FakeCollection()
+    scraper.db = {'scrape_state': FakeStateCollection()}
+
+    def failing_stream(index='equities', from_date=None, to_date=None, symbol=None):
+        raise requests.HTTPError('Status code 503')
+        yield
+
+    scraper.iter_corporate_filings = failing_stream
+    summary = scraper.backfill(date(2025, 11, 1), date(2025, 11, 1))
+    assert summary['failed'] == ['1-11-2025']
+    assert scraper.db['scrape_state'].docs == {}
+
+
+def test_backfill_resumes_from_checkpoints():
+    from datetime import date
+
+    scraper = NSEScraper(use_shared_client=False)
+    scraper.db = {'scrape_state': FakeStateCollection()}
+    calls, saved = [], []
+    flaky = {'2-11-2025'}
+
+    def fake_stream(index='equities', from_date=None, to_date=None, symbol=None):
+        calls.append(from_date)
+        if from_date in flaky:
+            raise ConnectionError('reset')
+        if from_date == '3-11-2025':
+            return  # a holiday: no announcements, but the chunk is done
+        yield {'Symbol': f'S{from_date}', 'Company': f'Co {from_date}', 'Subject': 'x',
+               'Timestamp': '07-Nov-2025 10:00:00'}
+
+    def fake_save(records):
+        records = list(records)
+        saved.extend(r['Symbol'] for r in records)
+        return {'records': len(records), 'errors': 0} if records else False
+
+    scraper.iter_corporate_filings = fake_stream
+    scraper.save_records_to_mongodb = fake_save
+    first = scraper.backfill(date(2025, 11, 1), date(2025, 11, 3), concurrency=2)
+    assert first['failed'] == ['2-11-2025']
+    assert first['fetched'] == 2
+
+    calls.clear()
+    flaky.clear()
+    second = scraper.backfill(date(2025, 11, 1), date(2025, 11, 3), concurrency=2)
+    assert calls == ['2-11-2025']
+    assert second['skipped'] == 2 and not second['failed']
+    assert sorted(saved) == ['S1-11-2025', 'S2-11-2025']
+
+
+def test_streaming_decode_matches_parse_to_dataframe():
+    import gzip
+    import json
+
+    from announcements import normalize_announcement, records_to_frame
+    from nse_scrapper import decompress_stream, iter_json_records
+
+    items = [{'symbol': 'INFY', 'sm_name': 'Infosys', 'desc': 'Results', 'an_dt': '07-Nov-2025 10:00:00',
+              'sm_size': 1.5},
+             {'symbol': 'TCS', 'sm_name': 'TCS', 'desc': 'Updates', 'an_dt': '07-Nov-2025 11:00:00'}]
+    payload = gzip.compress(json.dumps(items).encode('utf-8'))
+    chunks = [payload[i:i + 7] for i in range(0, len(payload), 7)]
+
+    records = [normalize_announcement(item) for item in iter_json_records(decompress_stream(chunks, 'gzip'))]
+    expected = NSEScraper(use_shared_client=False).parse_to_dataframe(items)
+    pd.testing.assert_frame_equal(records_to_frame(iter(records)), expected)
+
+
+@pytest.mark.parametrize('streaming', [True, False])
+def test_streaming_parser_accepts_the_same_body_shapes(monkeypatch, streaming):
+    import json
+
+    import nse_scrapper
+    from nse_scrapper import iter_json_records
+
+    if not streaming:
+        monkeypatch.setattr(nse_scrapper, 'ijson', None)
+    items = [{'symbol': 'INFY', 'an_dt': '07-Nov-2025 10:00:00', 'sm_size': 1.5}, {'symbol': 'TCS'}]
+    for body in (items, {'data': items}, {'records': items}, {'meta': {'records': 2}, 'records': items}):
+        payload = json.dumps(body).encode('utf-8')
+        assert list(iter_json_records(payload[i:i + 5] for i in range(0, len(payload), 5))) == items
+
+
+def test_parse_to_dataframe_types_columns():
+    from announcements import build_announcement
+
+    df = NSEScraper(use_shared_client=False).parse_to_dataframe([
+        {'symbol': 'INFY', 'sm_name': 'Infosys', 'desc': 'Results', 'an_dt': '07-Nov-2025 23:43:18', 'sm_size': '2 MB'},
+        {'symbol': 'TCS', 'sm_name': 'TCS', 'desc': 'Results', 'an_dt': 'garbled', 'sm_size': ''},
+    ])
+    assert str(df['Symbol'].dtype) == 'category' and str(df['Subject'].dtype) == 'category'
+    assert pd.api.types.is_datetime64_any_dtype(df['Timestamp'])
+    assert df['File_Size'].iloc[0] == 2 * 1024 * 1024
+    assert pd.isna(df['Timestamp'].iloc[1]) and pd.isna(df['File_Size'].iloc[1])
+
+    # Stored documents keep NSE's original strings, even unparseable ones
+    first, second = (build_announcement(rec) for rec in df.to_dict('records'))
+    assert first['Timestamp'] == '07-Nov-2025 23:43:18' and first['File_Size'] == '2 MB'
+    assert second['Timestamp'] == 'garbled' and second['File_Size'] == ''
+    assert first['announced_at'] == datetime(2025, 11, 7, 23, 43, 18) and second['announced_at'] is None
+    assert parse_announcement_time(df['Timestamp'].iloc[1]) is None
+    assert announcement_id(df.to_dict('records')[0]) == announcement_id(
+        make_record('INFY', '07-Nov-2025 23:43:18', subject='Results'))
+
+
+class FakeMigrationCollection:
+    name = 'company-map'
+
+    def __init__(self, docs):
+        self.docs = {d['_id']: d for d in docs}
+
+    def find(self, query, projection=None):
+        return [d for d in self.docs.values() if 'announced_at' not in d['announcement']]
+
+    def bulk_write(self, ops, ordered=True):
+        for op in ops:
+            field, value = next(iter(op._doc['$set'].items()))
+            self.docs[op._filter['_id']]['announcement'][field.split('.', 1)[1]] = value
+        return FakeBulkResult(0, len(ops))
+
+
+def test_migrate_announcement_times_is_rerunnable():
+    coll = FakeMigrationCollection([
+        {'_id': 'A', 'announcement': {'Timestamp': '07-Nov-2025 10:00:00'}},
+        {'_id': 'B', 'announcement': {'Timestamp': 'garbled'}},
+        {'_id': 'C', 'announcement': {'Timestamp': '08-Nov-2025 09:00:00', 'announced_at': datetime(2025, 11, 8, 9)}},
+    ])
+    assert migrate_announcement_times(coll) == 2
+    assert coll.docs['A']['announcement']['announced_at'] == datetime(2025, 11, 7, 10)
+    assert coll.docs['B']['announcement']['announced_at'] is None
+    assert migrate_announcement_times(coll) == 0
@@ -0,0 +1,102 @@
+import time
+
+import pytest
+
+from outbound_queue import EnqueueError, SqliteOutboundQueue, drain, message_key
+
+
+class FakeSender:
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.sent = []
+
+    def send_many(self, payloads, on_result=None):
+        results = []
+        for payload in payloads:
+            ok = payload['to'] not in self.fail
+            if ok:
+                self.sent.append(payload['to'])
+            results.append({'to': payload['to'], 'ok': ok, 'response': {}, 'error': None if ok else 'boom'})
+        return results
+
+
+def messages(filing, phones, template='alert'):
+    return [(filing, phone, template, {'to': phone, 'filing': filing}) for phone in phones]
+
+
+def test_enqueue_is_idempotent_and_drain_resumes(tmp_path):
+    queue = SqliteOutboundQueue(str(tmp_path / 'q.sqlite'), lease_seconds=60)
+    assert queue.enqueue_many(messages('F1', ['a', 'b', 'c'])) == 3
+    assert queue.enqueue_many(messages('F1', ['a', 'b', 'c', 'd'])) == 1
+    assert message_key('F1', 'a', 'alert') != message_key('F1', 'a', 'digest')
+
+    sender = FakeSender(fail={'c'})
+    assert drain(queue, sender, owner='w1', batch_size=2) == {'sent': 3, 'failed': 1}
+    assert queue.counts() == {'pending': 0, 'leased': 0, 'sent': 3, 'failed': 1}
+
+    # A re-run of the same broadcast sends nothing again
+    assert queue.enqueue_many(messages('F1', ['a', 'b', 'c', 'd'])) == 0
+    assert drain(queue, FakeSender(), owner='w2') == {'sent': 0, 'failed': 0}
+
+
+def test_expired_leases_are_reclaimed(tmp_path):
+    path = str(tmp_path / 'q.sqlite')
+    crashed = SqliteOutboundQueue(path, lease_seconds=0.05, max_attempts=2)
+    crashed.enqueue_many(messages('F2', ['a', 'b']))
+    assert len(crashed.claim('dead-worker', limit=10)) == 2
+
+    other = SqliteOutboundQueue(path, lease_seconds=60, max_attempts=2)
+    assert other.claim('w', limit=10) == []
+    time.sleep(0.1)
+    reclaimed = other.claim('w', limit=10)
+    assert sorted(m['phone'] for m in reclaimed) == ['a', 'b']
+    assert all(m['attempts'] == 2 for m in reclaimed)
+
+    # The dead worker can no longer finish messages it lost
+    crashed.mark_sent(reclaimed[0]['_id'], 'dead-worker')
+    assert other.counts()['leased'] == 2
+
+
+class CrashingSender:
+    """Sends the first payload, reports it, then dies mid-batch."""
+
+    def send_many(self, payloads, on_result=None):
+        on_result({'to': payloads[0]['to'], 'ok': True, 'response': {}, 'error': None, 'index': 0})
+        raise RuntimeError('worker crashed')
+
+
+def test_each_message_is_marked_as_its_send_finishes(tmp_path):
+    queue = SqliteOutboundQueue(str(tmp_path / 'q.sqlite'), lease_seconds=60)
+    queue.enqueue_many(messages('F3', ['a', 'b', 'c']))
+    try:
+        drain(queue, CrashingSender(), owner='w1')
+    except RuntimeError:
+        pass
+    assert queue.counts() == {'pending': 0, 'leased': 2, 'sent': 1, 'failed': 0}
+
+
+def test_leases_are_renewed_while_a_batch_is_sending(tmp_path):
+    path = str(tmp_path / 'q.sqlite')
+    queue = SqliteOutboundQueue(path, lease_seconds=0.15)
+    queue.enqueue_many(messages('F4', ['a', 'b']))
+    other = SqliteOutboundQueue(path, lease_seconds=0.15)
+    stolen = []
+
+    class Watcher(FakeSender):
+        def send_many(self, payloads, on_result=None):
+            time.sleep(0.3)
+            stolen.extend(other.claim('w2', limit=10))
+            return super().send_many(payloads, on_result)
+
+    assert drain(queue, Watcher(), owner='w1') == {'sent': 2, 'failed': 0}
+    assert stolen == []
+
+
+def test_failed_enqueue_rolls_back_and_raises(tmp_path):
+    queue = SqliteOutboundQueue(str(tmp_path / 'q.sqlite'), lease_seconds=60)
+    queue._conn.execute('CREATE TRIGGER no_b BEFORE INSERT ON outbound WHEN NEW.phone = \'b\''
+                        " BEGIN SELECT RAISE(ABORT, 'rejected'); END")
+    with pytest.raises(EnqueueError):
+        queue.enqueue_many(messages('F5', ['a', 'b']))
+    assert queue.counts()['pending'] == 0
+    assert queue.enqueue_many(messages('F5', ['a'])) == 1
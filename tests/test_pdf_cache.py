@@ -0,0 +1,52 @@
+import hashlib
+
+from pdf_cache import PdfTextCache, file_sha256
+
+
+def test_url_and_content_lookup(tmp_path):
+    cache = PdfTextCache(cache_dir=str(tmp_path), max_bytes=1024 * 1024, revalidate=False)
+    assert cache.get('https://example.com/a.pdf') is None
+
+    cache.put('https://example.com/a.pdf', 'abc123', 'hello world', page_count=3, etag='"e1"', content_length=42)
+    assert cache.get('https://example.com/a.pdf') == ('hello world', 3)
+
+    # Same bytes re-filed under a new URL reuse the parsed text
+    assert cache.get_by_hash('abc123', url='https://example.com/b.pdf') == ('hello world', 3)
+    assert cache.get('https://example.com/b.pdf') == ('hello world', 3)
+
+    stats = cache.stats()
+    assert stats['hits'] == 2
+    assert stats['content_hits'] == 1
+    assert stats['misses'] == 1
+    assert stats['entries'] == 1
+    cache.close()
+
+
+def test_persists_between_instances(tmp_path):
+    cache = PdfTextCache(cache_dir=str(tmp_path), revalidate=False)
+    cache.put('u', 'h', 'text', page_count=1)
+    cache.close()
+
+    reopened = PdfTextCache(cache_dir=str(tmp_path), revalidate=False)
+    assert reopened.get('u') == ('text', 1)
+    reopened.close()
+
+
+def test_lru_eviction(tmp_path):
+    cache = PdfTextCache(cache_dir=str(tmp_path), max_bytes=25, revalidate=False)
+    cache.put('u1', 'h1', 'x' * 10)
+    cache.put('u2', 'h2', 'y' * 10)
+    # Touch u1 so u2 becomes the least recently used entry
+    assert cache.get('u1') is not None
+    cache.put('u3', 'h3', 'z' * 10)
+
+    assert cache.get('u1') is not None
+    assert cache.get('u2') is None
+    assert cache.get('u3') is not None
+    cache.close()
+
+
+def test_file_sha256(tmp_path):
+    path = tmp_path / 'doc.pdf'
+    path.write_bytes(b'%PDF-1.4 test')
+    assert file_sha256(str(path)) == hashlib.sha256(b'%PDF-1.4 test').hexdigest()
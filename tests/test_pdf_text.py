@@ -0,0 +1,86 @@
+import os
+
+import pytest
+from PyPDF2 import PdfWriter
+
+from pdf_text import BACKENDS, extract_text, extract_texts_in_pool
+
+
+SAMPLE_PDF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'IXIGO_announcement.pdf')
+
+
+def available(name):
+    try:
+        __import__({'pypdfium2': 'pypdfium2', 'pdfminer': 'pdfminer', 'pypdf2': 'PyPDF2'}[name])
+        return True
+    except ImportError:
+        return False
+
+
+@pytest.mark.parametrize('backend', [b for b in BACKENDS if available(b)])
+def test_stops_once_enough_text_is_collected(backend):
+    full = extract_text(SAMPLE_PDF, max_chars=10 ** 7, backends=[backend])
+    assert full['backend'] == backend and full['error'] is None
+    assert full['pages_read'] == full['page_count'] == 8
+
+    short = extract_text(SAMPLE_PDF, max_chars=500, backends=[backend])
+    assert len(short['text']) == 500
+    assert short['pages_read'] == 1
+    assert full['text'].startswith(short['text'][:100])
+
+
+def test_falls_back_and_skips_pages_without_text(tmp_path, monkeypatch):
+    path = tmp_path / 'blank.pdf'
+    writer = PdfWriter()
+    writer.add_blank_page(width=200, height=200)
+    writer.add_blank_page(width=200, height=200)
+    with open(path, 'wb') as fh:
+        writer.write(fh)
+
+    def broken(path, max_pages):
+        raise ValueError('cannot open')
+
+    monkeypatch.setitem(BACKENDS, 'first', broken)
+    result = extract_text(str(path), backends=['first', 'pypdf2'])
+    assert result['backend'] == 'pypdf2' and result['error'] is None
+    assert result['text'] == ''
+    assert result['pages_skipped'] == 2
+
+    not_pdf = tmp_path / 'note.txt'
+    not_pdf.write_text('plain text')
+    result = extract_text(str(not_pdf), backends=['pypdf2'])
+    assert result['backend'] is None and result['text'] == '' and result['error'].startswith('pypdf2')
+
+
+def test_backend_without_text_falls_through(monkeypatch):
+    def empty(path, max_pages):
+        return 8, (text for text in ['', None, '   '])
+
+    monkeypatch.setitem(BACKENDS, 'empty', empty)
+    result = extract_text(SAMPLE_PDF, max_chars=500, backends=['empty', 'pypdf2'])
+    assert result['backend'] == 'pypdf2'
+    assert len(result['text']) == 500 and result['pages_read'] == 1
+
+
+def test_pdfium_skips_pages_without_text_objects(tmp_path, monkeypatch):
+    pdfium = pytest.importorskip('pypdfium2')
+    path = tmp_path / 'blank.pdf'
+    writer = PdfWriter()
+    writer.add_blank_page(width=200, height=200)
+    with open(path, 'wb') as fh:
+        writer.write(fh)
+
+    def no_textpage(self, *args, **kwargs):
+        raise AssertionError('textpage built for a page without text')
+
+    monkeypatch.setattr(pdfium.PdfPage, 'get_textpage', no_textpage)
+    result = extract_text(str(path), backends=['pypdfium2'])
+    assert result['backend'] == 'pypdfium2' and result['error'] is None
+    assert result['pages_skipped'] == 1
+
+
+def test_pool_extracts_every_path_in_order(tmp_path):
+    missing = str(tmp_path / 'missing.pdf')
+    results = extract_texts_in_pool([SAMPLE_PDF, missing, SAMPLE_PDF], max_chars=200)
+    assert [len(r['text']) for r in results] == [200, 0, 200]
+    assert results[1]['backend'] is None
@@ -0,0 +1,100 @@
+from datetime import date, datetime
+
+from scheduler import IST, MarketCalendar, PipelineScheduler, SingleFlightLock, parse_holidays
+
+
+def make_scheduler(results, calendar=None):
+    calls = []
+
+    def run_stage(stage):
+        calls.append(stage)
+        return results.get(stage, True)
+
+    scheduler = PipelineScheduler(
+        run_stage,
+        calendar=calendar or MarketCalendar(),
+        lock=SingleFlightLock(),
+        config={'scrape_seconds': 120, 'off_hours_seconds': 900, 'summarize_seconds': 300,
+                'send_seconds': 0, 'backoff_base': 60, 'backoff_max': 1800},
+    )
+    return scheduler, calls
+
+
+def test_calendar_weekends_and_holidays():
+    calendar = MarketCalendar(holidays=parse_holidays('2025-10-02'))
+    assert calendar.is_trading_day(date(2025, 10, 1))
+    assert not calendar.is_trading_day(date(2025, 10, 2))   # holiday
+    assert not calendar.is_trading_day(date(2025, 10, 4))   # Saturday
+    assert calendar.is_market_open(datetime(2025, 10, 1, 10, 0, tzinfo=IST))
+    assert not calendar.is_market_open(datetime(2025, 10, 1, 18, 0, tzinfo=IST))
+
+
+def test_holiday_loader_is_merged():
+    calendar = MarketCalendar(holiday_loader=lambda: {date(2025, 10, 21)})
+    assert not calendar.is_trading_day(date(2025, 10, 21))
+
+
+def test_scrape_success_triggers_summarize_and_send():
+    scheduler, calls = make_scheduler({})
+    now = datetime(2025, 10, 1, 10, 0, tzinfo=IST)
+    assert scheduler.run_once(now) == ['scrape', 'summarize', 'send']
+    assert calls == ['scrape', 'summarize', 'send']
+
+    # Nothing is due again until the scrape interval has elapsed
+    assert scheduler.run_once(datetime(2025, 10, 1, 10, 1, tzinfo=IST)) == []
+    assert scheduler.run_once(datetime(2025, 10, 1, 10, 2, tzinfo=IST)) == ['scrape', 'summarize', 'send']
+
+
+def test_nothing_runs_on_weekends():
+    scheduler, calls = make_scheduler({})
+    assert scheduler.run_once(datetime(2025, 10, 4, 10, 0, tzinfo=IST)) == []
+    assert calls == []
+
+
+def test_failed_scrape_backs_off():
+    scheduler, calls = make_scheduler({'scrape': False})
+    now = datetime(2025, 10, 1, 10, 0, tzinfo=IST)
+    scheduler.run_once(now)
+    assert scheduler.scrape_failures == 1
+    delay = (scheduler.next_run['scrape'] - now).total_seconds()
+    assert 30 <= delay <= 90
+    # The summarizer still runs on its own interval
+    assert calls == ['scrape', 'summarize', 'send']
+
+
+def test_busy_lock_skips_run():
+    scheduler, calls = make_scheduler({})
+    assert scheduler.lock.acquire()
+    try:
+        assert scheduler.run_once(datetime(2025, 10, 1, 10, 0, tzinfo=IST)) == []
+    finally:
+        scheduler.lock.release()
+    assert calls == []
+
+
+class FakeLeaseCollection:
+    def __init__(self):
+        self.renewals = 0
+
+    def find_one_and_update(self, query, update, upsert=False):
+        return None
+
+    def update_one(self, query, update):
+        self.renewals += 1
+
+    def delete_one(self, query):
+        pass
+
+
+def test_lease_is_renewed_while_held():
+    import time
+
+    collection = FakeLeaseCollection()
+    lock = SingleFlightLock(collection=collection, lease_seconds=0.06)
+    assert lock.acquire()
+    time.sleep(0.15)
+    lock.release()
+    renewals = collection.renewals
+    assert renewals >= 2
+    time.sleep(0.1)
+    assert collection.renewals == renewals
@@ -0,0 +1,35 @@
+from seen_store import SeenStore, announcement_id
+
+
+def _filing(symbol, subject='Board Meeting', broadcast_date='13-Nov-2025 10:00:00'):
+    return {'symbol': symbol, 'subject': subject, 'broadcast_date': broadcast_date}
+
+
+def test_filter_new_remembers_beyond_one_fetch(tmp_path):
+    store = SeenStore(path=str(tmp_path / 'seen.sqlite'), ttl_seconds=3600)
+    first = [_filing(f'SYM{i}') for i in range(60)]
+    assert store.filter_new(first) == first
+    # Items that dropped out of a later fetch window are still remembered
+    assert store.filter_new([_filing('NEW')]) == [_filing('NEW')]
+    assert store.filter_new(first[:5] + [_filing('NEW'), _filing('NEWER'), _filing('NEWER')]) == [_filing('NEWER')]
+    assert announcement_id(first[0]) in store
+    assert len(store) == 62
+    store.close()
+
+    reopened = SeenStore(path=str(tmp_path / 'seen.sqlite'), ttl_seconds=3600)
+    assert reopened.filter_new(first) == []
+    reopened.close()
+
+
+def test_prune_uses_last_seen(tmp_path):
+    now = [1000.0]
+    store = SeenStore(path=str(tmp_path / 'seen.sqlite'), ttl_seconds=100, clock=lambda: now[0])
+    store.filter_new([_filing('OLD'), _filing('KEPT')])
+    now[0] = 1080.0
+    store.filter_new([_filing('KEPT')])
+    now[0] = 1150.0
+
+    assert store.prune() == 1
+    assert announcement_id(_filing('OLD')) not in store
+    assert announcement_id(_filing('KEPT')) in store
+    store.close()
@@ -0,0 +1,20 @@
+import server
+
+
+def test_manual_pipeline_routes_are_rejected_while_the_pipeline_runs(monkeypatch):
+    client = server.app.test_client()
+    ran = []
+    monkeypatch.setattr(server, 'script_job', lambda module_name, args=None: ran.append(module_name) or {'success': True})
+
+    assert server.PIPELINE_LOCK.acquire()
+    try:
+        for route in ('/api/scrape', '/api/summarize', '/api/summarize_hour', '/api/run_all'):
+            assert client.post(route).status_code == 409
+    finally:
+        server.PIPELINE_LOCK.release()
+    assert ran == []
+
+    resp = client.post('/api/scrape?wait=true')
+    assert resp.get_json() == {'success': True}
+    assert ran == ['nse_scrapper']
+    assert not server.PIPELINE_LOCK.locked()
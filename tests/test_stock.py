@@ -1,4 +1,9 @@
+import threading
+import time
+
+import pytest
 from app import create_app
+from app.stock_cache import StockCache
 import json
 import requests
 
@@ -78,3 +83,63 @@ def test_firecrawl_upstream_error(monkeypatch):
     assert resp.status_code == 500 or resp.status_code == 500
     data = resp.get_json()
     assert data['error'] == 'upstream_error'
+
+
+def test_stock_responses_are_cached(monkeypatch):
+    calls = []
+
+    def fake_post(url, json=None, headers=None, timeout=None):
+        calls.append(json['url'])
+        return FakeResponse(status_code=200, json_data={'data': {'html': '<table></table>'}, 'crawledAt': 't'})
+
+    monkeypatch.setattr('requests.post', fake_post)
+    client = create_app({'TESTING': True}).test_client()
+
+    assert client.get('/stock').headers['X-Cache'] == 'MISS'
+    assert client.get('/stock').headers['X-Cache'] == 'HIT'
+    assert client.get('/stock?url=https://example.com').headers['X-Cache'] == 'MISS'
+    assert len(calls) == 2
+
+    stats = client.get('/stock/cache').get_json()
+    assert stats['results']['hit'] == 1 and stats['results']['miss'] == 2
+    assert stats['upstream']['calls'] == 2
+
+
+def test_stock_cache_coalesces_and_revalidates():
+    now = [0.0]
+    cache = StockCache(ttl=10, stale=100, clock=lambda: now[0])
+    release = threading.Event()
+    loads = []
+
+    def slow_loader():
+        loads.append(1)
+        release.wait(5)
+        return {'n': len(loads)}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get('u', slow_loader))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    while not cache._inflight:
+        time.sleep(0.001)
+    time.sleep(0.05)
+    release.set()
+    for t in threads:
+        t.join()
+    assert len(loads) == 1
+    assert sorted(r for _, r in results) == ['coalesced'] * 4 + ['miss']
+
+    # Stale: served immediately, refreshed once in the background
+    now[0] = 50
+    assert cache.get('u', slow_loader) == ({'n': 1}, 'stale')
+    while cache._inflight:
+        time.sleep(0.001)
+    assert cache.get('u', slow_loader) == ({'n': 2}, 'hit')
+
+    # Errors propagate and are not cached
+    def failing():
+        raise ValueError('upstream down')
+
+    with pytest.raises(ValueError):
+        cache.get('other', failing)
+    assert cache.stats()['upstream']['errors'] == 1
@@ -0,0 +1,173 @@
+from pymongo.errors import OperationFailure
+
+from subscriptions import SubscriptionIndex, alias_keys, normalize_alias
+
+
+class FakeChangeStream:
+    def __init__(self, changes, token):
+        self.changes = list(changes)
+        self.resume_token = token
+
+    def try_next(self):
+        if not self.changes:
+            return None
+        change = self.changes.pop(0)
+        self.resume_token = change['_id']
+        return change
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class FakeCollection:
+    """Just enough of a pymongo collection for the subscription index."""
+
+    def __init__(self, docs=(), change_streams=False):
+        self.docs = {d['_id']: dict(d) for d in docs}
+        self.writes = 0
+        self.scans = 0
+        self.change_streams = change_streams
+        self.changes = []
+        self.indexes = []
+
+    def create_index(self, keys):
+        self.indexes.append(keys)
+
+    def watch(self, full_document=None, resume_after=None):
+        if not self.change_streams:
+            raise OperationFailure('The $changeStream stage is only supported on replica sets')
+        if resume_after is None:
+            return FakeChangeStream([], str(len(self.changes) - 1))
+        return FakeChangeStream(self.changes[int(resume_after) + 1:], resume_after)
+
+    def record_change(self, op, doc_id):
+        doc = self.docs.get(doc_id)
+        self.changes.append({'_id': str(len(self.changes)), 'operationType': op, 'documentKey': {'_id': doc_id},
+                             'fullDocument': dict(doc) if doc else None})
+
+    def find(self, query=None, projection=None):
+        if not query:
+            self.scans += 1
+        ids = (query or {}).get('_id', {}).get('$in')
+        for doc in list(self.docs.values()):
+            if ids is None or doc['_id'] in ids:
+                yield dict(doc)
+
+    def find_one(self, query):
+        doc = self.docs.get(query['_id'])
+        return dict(doc) if doc else None
+
+    def update_one(self, query, update, upsert=False):
+        self.writes += 1
+        doc = self.docs.get(query['_id'])
+        if doc is None:
+            if not upsert:
+                return
+            doc = self.docs[query['_id']] = {'_id': query['_id']}
+        for key, value in update.get('$set', {}).items():
+            doc[key] = value
+        for key, value in update.get('$addToSet', {}).items():
+            if value not in doc.setdefault(key, []):
+                doc[key].append(value)
+        for key, value in update.get('$pull', {}).items():
+            doc[key] = [v for v in doc.get(key, []) if v != value]
+
+    def delete_one(self, query):
+        self.writes += 1
+        self.docs.pop(query['_id'], None)
+
+    def bulk_write(self, ops, ordered=True):
+        for op in ops:
+            if type(op).__name__ == 'DeleteOne':
+                self.delete_one(op._filter)
+            else:
+                self.update_one(op._filter, op._doc, upsert=op._upsert)
+
+        class Result:
+            upserted_count = modified_count = 0
+        return Result()
+
+
+class FakeDB(dict):
+    def __missing__(self, name):
+        self[name] = FakeCollection()
+        return self[name]
+
+
+def contact(cid, phone, *companies):
+    return {'_id': cid, 'phone': phone, 'name': cid, 'profile': {'selectedCompanies': list(companies)}}
+
+
+def test_normalize_alias_matches_name_variants():
+    assert normalize_alias('Infosys Ltd.') == normalize_alias('INFOSYS LIMITED') == 'INFOSYS'
+    assert normalize_alias('The Great Eastern Shipping Company Limited') == 'GREAT EASTERN SHIPPING COMPANY'
+    assert normalize_alias('infy') == 'INFY'
+    assert alias_keys('INFY', 'Infosys Limited', None, 'infy') == ['INFY', 'INFOSYS']
+
+
+def test_sync_and_lookup():
+    db = FakeDB()
+    db['nse data'] = FakeCollection([
+        contact('a', '+91 98765 43210', 'INFY'),
+        contact('b', '9876500000', 'Infosys Ltd', 'TCS'),
+        contact('c', '9876511111', 'Tata Consultancy Services Limited'),
+        contact('d', 'not-a-phone', 'INFY'),
+    ])
+    subs = SubscriptionIndex(db, sync_seconds=900)
+    subs.ensure_indexes()
+    assert db['nse data'].indexes == ['profile.selectedCompanies']
+    assert subs.sync()['added'] == 3
+
+    infy = subs.lookup(symbol='INFY', company='Infosys Limited')
+    assert sorted(r['phone'] for r in infy) == ['919876543210', '9876500000']
+    assert [r['name'] for r in subs.lookup(symbol='TCS', company='Tata Consultancy Services Ltd')] in (['b', 'c'], ['c', 'b'])
+    assert subs.lookup(symbol='WIPRO') == []
+
+    # Recent sync is skipped; a forced one only touches what changed
+    assert subs.sync() is None
+    db['nse data'].docs['b']['profile']['selectedCompanies'] = ['TCS']
+    del db['nse data'].docs['c']
+    writes = db['subscription_members'].writes
+    stats = subs.sync(force=True)
+    assert stats == {'contacts': 3, 'added': 0, 'updated': 1, 'removed': 1, 'mode': 'full'}
+    assert db['subscription_members'].writes - writes == 2
+    assert [r['phone'] for r in subs.lookup(symbol='INFY', company='Infosys Ltd')] == ['919876543210']
+
+
+def test_index_contact_updates_single_subscriber():
+    db = FakeDB()
+    subs = SubscriptionIndex(db)
+    assert subs.index_contact(contact('x', '9876543210', 'HDFC Bank Limited')) is True
+    assert subs.index_contact(contact('x', '9876543210', 'HDFC Bank Limited')) is False
+    assert [r['name'] for r in subs.lookup(company='HDFC Bank Ltd')] == ['x']
+    assert subs.remove_contact('x') is True
+    assert subs.lookup(company='HDFC Bank Ltd') == []
+
+
+def test_sync_reads_only_changed_contacts_from_the_change_stream():
+    db = FakeDB()
+    contacts = db['nse data'] = FakeCollection([contact('a', '9876543210', 'INFY'),
+                                                contact('b', '9876500000', 'TCS')], change_streams=True)
+    subs = SubscriptionIndex(db, sync_seconds=900)
+    assert subs.sync()['mode'] == 'full'
+    assert subs.sync() == {'contacts': 0, 'added': 0, 'updated': 0, 'removed': 0, 'mode': 'changes'}
+
+    contacts.docs['a']['profile']['selectedCompanies'] = ['TCS']
+    contacts.record_change('update', 'a')
+    contacts.docs['c'] = contact('c', '9876511111', 'Infosys Ltd')
+    contacts.record_change('insert', 'c')
+    del contacts.docs['b']
+    contacts.record_change('delete', 'b')
+
+    assert subs.sync() == {'contacts': 2, 'added': 1, 'updated': 1, 'removed': 1, 'mode': 'changes'}
+    assert contacts.scans == 1
+    assert [r['name'] for r in subs.lookup(symbol='TCS')] == ['a']
+    assert [r['name'] for r in subs.lookup(company='Infosys Limited')] == ['c']
+    # Already applied changes are not replayed
+    assert subs.sync()['contacts'] == 0
@@ -0,0 +1,36 @@
+from summary_cache import SummaryCache, text_hash
+
+
+def test_hit_after_put(tmp_path):
+    cache = SummaryCache(path=str(tmp_path / 'summaries.sqlite'), ttl_seconds=3600, max_entries=10)
+    assert cache.get('Board approved dividend', 'Infosys Limited', 'gpt-4o-mini', 'v1') is None
+
+    cache.put('Board approved dividend', 'Infosys Limited', 'gpt-4o-mini', 'v1', 'Dividend approved.')
+    # Whitespace differences in the extracted text map to the same entry
+    assert cache.get('Board  approved\ndividend ', 'Infosys Limited', 'gpt-4o-mini', 'v1') == 'Dividend approved.'
+    # Model and prompt variant are part of the key
+    assert cache.get('Board approved dividend', 'Infosys Limited', 'gpt-4o', 'v1') is None
+    assert cache.get('Board approved dividend', 'Infosys Limited', 'gpt-4o-mini', 'v2') is None
+
+    assert cache.stats() == {'hits': 1, 'misses': 3}
+    cache.close()
+
+
+def test_ttl_expiry(tmp_path):
+    cache = SummaryCache(path=str(tmp_path / 'summaries.sqlite'), ttl_seconds=0, max_entries=10)
+    cache.put('text', 'ACME', 'm', 'v1', 'summary')
+    assert cache.get('text', 'ACME', 'm', 'v1') is None
+    cache.close()
+
+
+def test_max_entries(tmp_path):
+    cache = SummaryCache(path=str(tmp_path / 'summaries.sqlite'), ttl_seconds=3600, max_entries=2)
+    for i in range(3):
+        cache.put(f'text {i}', 'ACME', 'm', 'v1', f'summary {i}')
+    assert cache.get('text 0', 'ACME', 'm', 'v1') is None
+    assert cache.get('text 2', 'ACME', 'm', 'v1') == 'summary 2'
+    cache.close()
+
+
+def test_company_is_part_of_hash():
+    assert text_hash('same text', 'A Ltd') != text_hash('same text', 'B Ltd')
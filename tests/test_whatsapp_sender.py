@@ -0,0 +1,103 @@
+import requests
+
+from whatsapp_sender import DeadLetterStore, TokenBucket, WhatsAppSender, retry_after_seconds
+
+
+class FakeResponse:
+    def __init__(self, status, body=None, headers=None):
+        self.status_code = status
+        self._body = body or {}
+        self.headers = headers or {}
+        self.text = str(self._body)
+
+    def json(self):
+        return self._body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f'{self.status_code}', response=self)
+
+
+class FakeSession:
+    """Returns scripted responses per recipient; records every post."""
+
+    def __init__(self, script):
+        self.script = {to: list(responses) for to, responses in script.items()}
+        self.headers = {}
+        self.posts = []
+
+    def post(self, url, json=None, timeout=None):
+        self.posts.append(json['to'])
+        responses = self.script.get(json['to']) or [FakeResponse(200, {'messages': [{'id': 'ok'}]})]
+        response = responses.pop(0) if len(responses) > 1 else responses[0]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def close(self):
+        pass
+
+
+def make_sender(script, tmp_path, sleeps):
+    return WhatsAppSender('token', '123', concurrency=4, rate=0, max_retries=2, session=FakeSession(script),
+                          dead_letters=DeadLetterStore(path=str(tmp_path / 'dead.sqlite')),
+                          sleep=sleeps.append)
+
+
+def test_retries_transient_errors_and_honors_retry_after(tmp_path):
+    sleeps = []
+    sender = make_sender({
+        'a': [FakeResponse(429, headers={'Retry-After': '7'}), FakeResponse(200, {'id': 'a'})],
+        'b': [requests.ConnectionError('reset'), FakeResponse(503), FakeResponse(200, {'id': 'b'})],
+    }, tmp_path, sleeps)
+
+    results = sender.send_many([{'to': 'a'}, {'to': 'b'}, {'to': 'c'}])
+    assert [r['ok'] for r in results] == [True, True, True]
+    assert [r['attempts'] for r in results] == [2, 3, 1]
+    assert 7.0 in sleeps and len(sleeps) == 3
+    assert sender.dead_letters.count() == 0
+
+
+def test_permanent_and_exhausted_failures_are_dead_lettered(tmp_path):
+    sleeps = []
+    sender = make_sender({
+        'bad': [FakeResponse(400, {'error': 'invalid number'})],
+        'busy': [FakeResponse(500)],
+    }, tmp_path, sleeps)
+    seen = []
+    results = sender.send_many([{'to': 'bad'}, {'to': 'busy'}], on_result=seen.append)
+
+    assert [r['ok'] for r in results] == [False, False]
+    assert [r['attempts'] for r in results] == [1, 3]
+    assert len(seen) == 2
+    letters = sorted(sender.dead_letters.list(), key=lambda d: d['to'])
+    assert [(d['to'], d['status'], d['attempts']) for d in letters] == [('bad', 400, 1), ('busy', 500, 3)]
+    assert letters[0]['payload'] == {'to': 'bad'}
+
+
+def test_read_timeout_is_not_retried(tmp_path):
+    sleeps = []
+    sender = make_sender({
+        'slow': [requests.ReadTimeout('read timed out'), FakeResponse(200, {'id': 'dup'})],
+        'down': [requests.ConnectTimeout('connect timed out'), FakeResponse(200, {'id': 'down'})],
+    }, tmp_path, sleeps)
+    slow, down = sender.send_many([{'to': 'slow'}, {'to': 'down'}])
+
+    assert (slow['ok'], slow['unknown'], slow['attempts']) == (False, True, 1)
+    assert 'unknown outcome' in slow['error']
+    assert (down['ok'], down['attempts']) == (True, 2)
+    assert sender.session.posts.count('slow') == 1
+    assert [d['to'] for d in sender.dead_letters.list()] == ['slow']
+
+
+def test_retry_after_parsing_and_token_bucket():
+    assert retry_after_seconds('3') == 3.0
+    assert retry_after_seconds('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
+    assert retry_after_seconds('soon') is None
+
+    import time
+    bucket = TokenBucket(rate=50, burst=1)
+    start = time.monotonic()
+    for _ in range(4):
+        bucket.acquire()
+    assert time.monotonic() - start >= 0.05
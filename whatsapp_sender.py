@@ -0,0 +1,269 @@
+"""Shared WhatsApp Cloud API sender for the broadcast/alert scripts.
+
+One `requests.Session` (connection pool sized to the concurrency) is
+reused for every message instead of opening a new TLS connection per
+recipient. Sends run on a thread pool behind a token-bucket rate limiter
+so throughput stays within the account's Graph API tier.
+
+Transient failures (429, 5xx, connection errors and connect timeouts) are
+retried with exponential backoff and jitter, honoring `Retry-After` when
+the API sends it. A read timeout is not retried: the request reached the
+API and the message may have been delivered, so it is reported (and
+dead-lettered) as an unknown outcome instead of risking a duplicate.
+Messages that still fail, or fail permanently (other 4xx), are
+written to a dead-letter store: the `whatsapp_dead_letters` MongoDB
+collection when a collection is given, otherwise a local SQLite file.
+
+Environment variables:
+- WHATSAPP_CONCURRENCY (default 8) parallel sends
+- WHATSAPP_RATE_PER_SEC (default 20) messages per second
+- WHATSAPP_MAX_RETRIES (default 4) retries after the first attempt
+- WHATSAPP_TIMEOUT (default 15) seconds per request
+- WHATSAPP_DEAD_LETTER_PATH (default .cache/whatsapp_dead_letters.sqlite)
+"""
+
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import stage, submit_with_context
+
+
+GRAPH_API_VERSION = 'v22.0'
+DEFAULT_DEAD_LETTER_PATH = os.path.join('.cache', 'whatsapp_dead_letters.sqlite')
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _env_number(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def retry_after_seconds(value):
+    """Parse a Retry-After header (seconds or HTTP date); None if absent/invalid."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class TokenBucket:
+    """Thread-safe token bucket; `acquire()` blocks until a token is free."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or max(1.0, self.rate))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class DeadLetterStore:
+    """Persisted list of messages that could not be delivered."""
+
+    def __init__(self, collection=None, path=None):
+        self.collection = collection
+        self._conn = None
+        self._lock = threading.Lock()
+        if collection is None:
+            self.path = path or os.environ.get('WHATSAPP_DEAD_LETTER_PATH') or DEFAULT_DEAD_LETTER_PATH
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            with self._conn:
+                self._conn.execute(
+                    'CREATE TABLE IF NOT EXISTS dead_letters ('
+                    ' id INTEGER PRIMARY KEY AUTOINCREMENT, recipient TEXT, payload TEXT NOT NULL,'
+                    ' status INTEGER, error TEXT, attempts INTEGER, created_at REAL NOT NULL)'
+                )
+
+    def add(self, payload, error, status=None, attempts=1):
+        recipient = payload.get('to')
+        if self.collection is not None:
+            self.collection.insert_one({
+                'to': recipient, 'payload': payload, 'status': status, 'error': error,
+                'attempts': attempts, 'created_at': datetime.utcnow(),
+            })
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT INTO dead_letters (recipient, payload, status, error, attempts, created_at)'
+                ' VALUES (?, ?, ?, ?, ?, ?)',
+                (recipient, json.dumps(payload), status, error, attempts, time.time()),
+            )
+
+    def list(self, limit=100):
+        if self.collection is not None:
+            return list(self.collection.find().sort('created_at', -1).limit(limit))
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT id, recipient, payload, status, error, attempts, created_at'
+                ' FROM dead_letters ORDER BY id DESC LIMIT ?', (limit,)
+            ).fetchall()
+        return [
+            {'id': r[0], 'to': r[1], 'payload': json.loads(r[2]), 'status': r[3],
+             'error': r[4], 'attempts': r[5], 'created_at': r[6]}
+            for r in rows
+        ]
+
+    def count(self):
+        if self.collection is not None:
+            return self.collection.count_documents({})
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM dead_letters').fetchone()[0]
+
+    def close(self):
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+
+
+def sender_from_env(token, phone_id, db=None, concurrency=None):
+    """Sender with dead letters in `db['whatsapp_dead_letters']` (or local SQLite)."""
+    collection = db['whatsapp_dead_letters'] if db is not None else None
+    return WhatsAppSender(token, phone_id, concurrency=concurrency, dead_letters=DeadLetterStore(collection))
+
+
+class WhatsAppSender:
+    """Pooled, rate-limited, retrying sender for Graph API message payloads."""
+
+    def __init__(self, token, phone_id, concurrency=None, rate=None, max_retries=None, timeout=None,
+                 backoff_base=1.0, backoff_max=60.0, dead_letters=None, session=None, sleep=time.sleep):
+        self.url = f"https://graph.facebook.com/{GRAPH_API_VERSION}/{phone_id}/messages"
+        self.concurrency = int(concurrency or _env_number('WHATSAPP_CONCURRENCY', 8))
+        self.limiter = TokenBucket(rate if rate is not None else _env_number('WHATSAPP_RATE_PER_SEC', 20))
+        self.max_retries = int(max_retries if max_retries is not None else _env_number('WHATSAPP_MAX_RETRIES', 4))
+        self.timeout = timeout or _env_number('WHATSAPP_TIMEOUT', 15)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.dead_letters = dead_letters
+        self._sleep = sleep
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+            session.mount('https://', adapter)
+        session.headers.update({'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'})
+        self.session = session
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(self.backoff_max, retry_after)
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)
+
+    def send(self, payload, stats=None):
+        """Send one payload, retrying transient errors.
+
+        Returns the API response JSON; raises requests.HTTPError (or the
+        last connection error) once retries are exhausted or the error is
+        permanent. `stats['attempts']` is set when a dict is passed. Timed
+        as the `whatsapp_send` stage, retries included.
+        """
+        with stage('whatsapp_send'):
+            return self._send_with_retries(payload, stats)
+
+    def _send_with_retries(self, payload, stats):
+        attempt = 0
+        while True:
+            if stats is not None:
+                stats['attempts'] = attempt + 1
+            self.limiter.acquire()
+            try:
+                resp = self.session.post(self.url, json=payload, timeout=self.timeout)
+            except requests.ConnectionError:
+                # Includes ConnectTimeout; a ReadTimeout propagates (unknown outcome)
+                if attempt >= self.max_retries:
+                    raise
+                self._sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+            if resp.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                self._sleep(self._backoff(attempt, retry_after_seconds(resp.headers.get('Retry-After'))))
+                attempt += 1
+                continue
+            resp.raise_for_status()
+            return resp.json()
+
+    def _send_one(self, payload):
+        result = {'to': payload.get('to'), 'ok': False, 'response': None, 'error': None, 'status': None,
+                  'attempts': 0, 'unknown': False}
+        try:
+            result['response'] = self.send(payload, stats=result)
+            result['ok'] = True
+        except requests.ReadTimeout as e:
+            result['unknown'] = True
+            result['error'] = f'unknown outcome, may have been delivered (read timeout): {e}'
+        except requests.HTTPError as he:
+            response = he.response
+            result['status'] = response.status_code if response is not None else None
+            result['error'] = response.text if response is not None else str(he)
+        except Exception as e:
+            result['error'] = str(e)
+        if not result['ok'] and self.dead_letters is not None:
+            try:
+                self.dead_letters.add(payload, result['error'], result['status'], attempts=result['attempts'])
+            except Exception as e:
+                print(f'✗ Could not record dead letter for {result["to"]}: {e}')
+        return result
+
+    def send_many(self, payloads, on_result=None):
+        """Send payloads concurrently; returns one result dict per payload, in order.
+
+        Each result has 'to', 'ok', 'response', 'error', 'status', 'attempts',
+        'unknown' (read timeout: maybe delivered) and 'index' (position in
+        `payloads`). `on_result(result)` is called
+        in the calling thread as each send finishes, so progress printed
+        there lands in job output.
+        """
+        payloads = list(payloads)
+        if not payloads:
+            return []
+        results = [None] * len(payloads)
+        with stage('whatsapp_batch', messages=len(payloads)), \
+                ThreadPoolExecutor(max_workers=min(self.concurrency, len(payloads))) as pool:
+            futures = {submit_with_context(pool, self._send_one, payload): i for i, payload in enumerate(payloads)}
+            for future in as_completed(futures):
+                result = dict(future.result(), index=futures[future])
+                results[result['index']] = result
+                if on_result is not None:
+                    on_result(result)
+        return results
+
+    def close(self):
+        self.session.close()